@@ -0,0 +1,284 @@
+"""
+Render many highlight clips in one go.
+
+A batch is a list of clip specs, plain dicts with a match_id, period_id and a
+period-relative start and end in seconds (plus an optional label), or is
+derived from the possession changes of a set of matches. The runner:
+
+- merges overlapping windows per match and period, so every stretch of
+  tracking data is fetched from the database once and sliced per clip
+- renders the clips in a process pool while the next match is being fetched
+- names every clip after a hash of its tracking data and render settings,
+  and skips clips whose file already exists
+- writes a manifest.json next to the clips with the status and timings of
+  every clip
+
+    python -m VisualisationTools.batch_render --matches <match_id> ... --out clips
+    python -m VisualisationTools.batch_render --specs specs.json --out clips --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Clips are rendered off-screen, in the workers as well
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import pandas as pd
+
+from connection_pool import get_manager
+from helperfunctions import fetch_possession_changes
+from instrumentation import summary
+from .encoders import ENCODER_PRESETS
+from .soccer_animation import SoccerAnimation
+
+# Bump when a change to the rendering makes earlier clips stale
+RENDER_VERSION = 1
+
+# Columns that determine what a clip looks like
+HASHED_COLUMNS = ["period_id", "frame_id", "player_id", "x", "y", "seconds"]
+
+MANIFEST_NAME = "manifest.json"
+
+
+def possession_clip_specs(match_ids, conn, before=3.0, after=7.0):
+    """
+    One clip spec per possession change of every match.
+
+    Args:
+        match_ids (list): The matches to take the possession changes of.
+        conn (psycopg2.extensions.connection): The database connection object.
+        before (float): Seconds of play before the change.
+        after (float): Seconds of play after the change.
+
+    Returns:
+        list: Clip specs (dicts), in match and time order.
+    """
+    specs = []
+    for match_id in match_ids:
+        changes = fetch_possession_changes(match_id, conn)
+        for change in changes.itertuples(index=False):
+            specs.append({
+                "match_id": match_id,
+                "period_id": int(change.period_id),
+                "start": max(0.0, float(change.seconds) - before),
+                "end": float(change.seconds) + after,
+                "label": f"{change.losing_team} -> {change.gaining_team}",
+            })
+    return specs
+
+
+def merge_windows(specs, gap=0.0):
+    """
+    Group clip specs into the stretches of tracking data to fetch.
+
+    Windows of the same match and period that overlap (or are less than `gap`
+    seconds apart) are merged into one fetch.
+
+    Args:
+        specs (list): Clip specs.
+        gap (float): Merge windows closer together than this many seconds.
+
+    Returns:
+        list: (match_id, period_id, start, end, specs) per fetch, the specs
+            being the clips that are cut from it.
+    """
+    fetches = []
+    ordered = sorted(specs, key=lambda s: (s["match_id"], s["period_id"], s["start"], s["end"]))
+    for spec in ordered:
+        last = fetches[-1] if fetches else None
+        if (last is not None and last[0] == spec["match_id"] and last[1] == spec["period_id"]
+                and spec["start"] <= last[3] + gap):
+            last[3] = max(last[3], spec["end"])
+            last[4].append(spec)
+        else:
+            fetches.append([spec["match_id"], spec["period_id"], spec["start"], spec["end"], [spec]])
+    return [tuple(fetch) for fetch in fetches]
+
+
+def _format_timestamp(seconds):
+    """Period-relative seconds as the 'HH:MM:SS.fff' text the timestamp column is compared with"""
+    minutes, rest = divmod(float(seconds), 60.0)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{rest:06.3f}"
+
+
+def clip_hash(spec, df_ball, df_home, df_away, fps, interpolate, encoder="standard"):
+    """
+    Content hash of a clip: its tracking rows and the render settings.
+
+    Returns:
+        str: Hex sha256 digest.
+    """
+    digest = hashlib.sha256()
+    settings = {"version": RENDER_VERSION, "fps": fps, "interpolate": interpolate, "encoder": encoder,
+                "match_id": spec["match_id"], "period_id": spec["period_id"]}
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    for df in (df_ball, df_home, df_away):
+        columns = [c for c in HASHED_COLUMNS if c in df.columns]
+        # Categoricals hash by value, so the same rows give the same hash across fetches
+        values = df[columns].astype({c: str for c in columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _stage_totals():
+    return {name: stage["total_s"] for name, stage in summary().items()}
+
+
+def render_clip(df_ball, df_home, df_away, output_file, fps=25, interpolate=True, encoder="standard"):
+    """
+    Render one clip, in a worker process.
+
+    Returns:
+        dict: Wall time of the render, the time per pipeline stage, the encode
+            throughput and the file size.
+    """
+    before = _stage_totals()
+    start = time.perf_counter()
+    throughput = SoccerAnimation().create_animation(df_ball, df_home, df_away, output_file=str(output_file),
+                                                    fps=fps, interpolate=interpolate, encoder=encoder)
+    render_s = time.perf_counter() - start
+    after = _stage_totals()
+    stages = {name: total - before.get(name, 0.0) for name, total in after.items()
+              if total - before.get(name, 0.0) > 0}
+    return {"render_s": render_s, "stages": stages, "encode": throughput,
+            "bytes": Path(output_file).stat().st_size}
+
+
+def load_manifest(out_dir):
+    """The clips of earlier runs in out_dir, keyed by content hash"""
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return {clip["hash"]: clip for clip in json.load(f).get("clips", [])}
+
+
+def write_manifest(out_dir, clips, totals):
+    path = Path(out_dir) / MANIFEST_NAME
+    with open(path, "w") as f:
+        json.dump({"totals": totals, "clips": clips}, f, indent=2, default=str)
+    return path
+
+
+def run_batch(specs, out_dir, db_config=None, workers=None, fps=25, interpolate=True, encoder="standard",
+              force=False):
+    """
+    Render a batch of clips.
+
+    Args:
+        specs (list): Clip specs, see the module docstring.
+        out_dir (str or Path): Directory for the clips and the manifest.
+        db_config (dict, optional): Connection parameters, read from the environment when not given.
+        workers (int, optional): Number of render processes, defaults to the number of CPUs.
+        fps (int): Frames per second of the clips.
+        interpolate (bool): Whether to add interpolated frames between the real ones.
+        encoder (str or dict): Encoder preset, see VisualisationTools.encoders.
+        force (bool): Render clips again even when their file already exists.
+
+    Returns:
+        dict: The manifest, with 'totals' and one entry per clip under 'clips'.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = load_manifest(out_dir)
+
+    # Drop duplicate specs before planning the fetches
+    unique = {(s["match_id"], s["period_id"], s["start"], s["end"]): s for s in specs}
+    fetches = merge_windows(unique.values())
+
+    clips = []
+    pending = {}
+    batch_start = time.perf_counter()
+    manager = get_manager(db_config)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        loader = SoccerAnimation()
+        teams_by_match = {}
+        for match_id, period_id, start, end, fetch_specs in fetches:
+            fetch_start = time.perf_counter()
+            with manager.connection() as conn:
+                loader.conn = conn
+                if match_id not in teams_by_match:
+                    teams_by_match[match_id] = loader.load_team_data(match_id)
+                # The end is exclusive in load_tracking_data, keep the last frame of the window
+                df_window = loader.load_tracking_data(match_id, _format_timestamp(start),
+                                                      _format_timestamp(end + 1.0), period_id)
+                loader.conn = None
+            # Every clip cut from this fetch carries an equal share of it
+            fetch_s = (time.perf_counter() - fetch_start) / len(fetch_specs)
+
+            for spec in fetch_specs:
+                clip = {**spec, "fetch_s": fetch_s}
+                in_window = (df_window["seconds"] >= spec["start"]) & (df_window["seconds"] <= spec["end"])
+                df_ball, df_home, df_away = loader.split_tracking_data(df_window[in_window],
+                                                                       teams_by_match[match_id])
+                if df_ball.empty:
+                    clips.append({**clip, "status": "empty"})
+                    continue
+
+                clip["hash"] = clip_hash(spec, df_ball, df_home, df_away, fps, interpolate, encoder)
+                output = out_dir / f"{match_id}_p{period_id}_{spec['start']:07.1f}_{clip['hash'][:12]}.mp4"
+                clip["output"] = str(output)
+                if not force and output.exists() and output.stat().st_size > 0:
+                    earlier = previous.get(clip["hash"], {})
+                    clips.append({**clip, "status": "skipped", "rendered_at": earlier.get("rendered_at")})
+                    continue
+
+                future = executor.submit(render_clip, df_ball.reset_index(drop=True),
+                                         df_home.reset_index(drop=True), df_away.reset_index(drop=True),
+                                         output, fps, interpolate, encoder)
+                pending[future] = clip
+
+        for future in as_completed(pending):
+            clip = pending[future]
+            try:
+                clip.update(future.result(), status="rendered", rendered_at=time.time())
+            except Exception as e:
+                clip.update(status="failed", error=f"{type(e).__name__}: {e}")
+            clips.append(clip)
+
+    clips.sort(key=lambda c: (c["match_id"], c["period_id"], c["start"]))
+    counts = {}
+    for clip in clips:
+        counts[clip["status"]] = counts.get(clip["status"], 0) + 1
+    totals = {
+        "clips": len(clips),
+        "fetches": len(fetches),
+        "wall_s": time.perf_counter() - batch_start,
+        "render_s": sum(c.get("render_s", 0.0) for c in clips),
+        **counts,
+    }
+    write_manifest(out_dir, clips, totals)
+    return {"totals": totals, "clips": clips}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a batch of highlight clips")
+    parser.add_argument("--matches", nargs="*", default=[], help="Render every possession change of these matches")
+    parser.add_argument("--specs", default=None, help="JSON file with a list of clip specs")
+    parser.add_argument("--out", default="clips", help="Output directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--before", type=float, default=3.0, help="Seconds before a possession change")
+    parser.add_argument("--after", type=float, default=7.0, help="Seconds after a possession change")
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--no-interpolate", action="store_true")
+    parser.add_argument("--encoder", default="standard", choices=sorted(ENCODER_PRESETS),
+                        help="Encoder preset: a quick preview or an archive-quality render")
+    parser.add_argument("--force", action="store_true", help="Render clips that already exist again")
+    args = parser.parse_args()
+
+    specs = []
+    if args.specs:
+        with open(args.specs) as f:
+            specs.extend(json.load(f))
+    if args.matches:
+        with get_manager().connection() as conn:
+            specs.extend(possession_clip_specs(args.matches, conn, args.before, args.after))
+
+    manifest = run_batch(specs, args.out, workers=args.workers, fps=args.fps,
+                         interpolate=not args.no_interpolate, encoder=args.encoder, force=args.force)
+    print(json.dumps(manifest["totals"], indent=2))
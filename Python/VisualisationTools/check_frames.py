@@ -0,0 +1,170 @@
+"""
+Check that the array-based animation core draws exactly the same frames as
+the DataFrame lookups it replaced, on a synthetic match.
+
+For every frame the artist data (ball, home, away, time and period text) of
+both implementations is compared, and a sample of frames is rendered with
+Agg and compared pixel by pixel. Also reports the time per frame update.
+
+    python -m VisualisationTools.check_frames
+    python -m VisualisationTools.check_frames --seconds 4 --interpolate --render-every 5
+"""
+import argparse
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from mplsoccer import Pitch
+
+from synthetic_match import AWAY_TEAM_ID, HOME_TEAM_ID, generate_match
+from tracking_schema import apply_timestamp_schema
+from .soccer_animation import SoccerAnimation, frame_arrays
+
+
+def legacy_frames(df_ball, df_home, df_away):
+    """The per-frame artist data as the DataFrame implementation computed it"""
+    frame_to_home = {}
+    frame_to_away = {}
+    for frame_id in df_ball['frame_id'].unique():
+        frame_to_home[frame_id] = df_home[df_home['frame_id'] == frame_id]
+        frame_to_away[frame_id] = df_away[df_away['frame_id'] == frame_id]
+
+    for i in range(len(df_ball)):
+        frame = df_ball.iloc[i]['frame_id']
+        timestamp = df_ball.iloc[i]['timestamp']
+        period_id = df_ball.iloc[i].get('period_id', 'N/A')
+        home_frame = frame_to_home.get(frame, pd.DataFrame({'x': [], 'y': []}))
+        away_frame = frame_to_away.get(frame, pd.DataFrame({'x': [], 'y': []}))
+        yield {
+            'ball': ([df_ball.iloc[i]['x']], [df_ball.iloc[i]['y']]),
+            'home': (home_frame['x'].values, home_frame['y'].values),
+            'away': (away_frame['x'].values, away_frame['y'].values),
+            'time': f'Time: {timestamp}',
+            'period': f'Period: {period_id}',
+        }
+
+
+def array_frames(df_ball, df_home, df_away):
+    """The per-frame artist data of the array implementation"""
+    frames = frame_arrays(df_ball, df_home, df_away)
+    for i in range(len(frames['ball_x'])):
+        home_start, home_end = frames['home_bounds'][i]
+        away_start, away_end = frames['away_bounds'][i]
+        yield {
+            'ball': (frames['ball_x'][i:i + 1], frames['ball_y'][i:i + 1]),
+            'home': (frames['home_x'][home_start:home_end], frames['home_y'][home_start:home_end]),
+            'away': (frames['away_x'][away_start:away_end], frames['away_y'][away_start:away_end]),
+            'time': frames['time_labels'][i],
+            'period': frames['period_labels'][i],
+        }
+
+
+def _frame_differences(expected, actual):
+    """Names of the artists that differ between two frames"""
+    differences = []
+    for name in ('ball', 'home', 'away'):
+        for want, got in zip(expected[name], actual[name]):
+            if not np.array_equal(np.asarray(want, dtype=np.float64), np.asarray(got, dtype=np.float64)):
+                differences.append(name)
+                break
+    differences.extend(name for name in ('time', 'period') if expected[name] != actual[name])
+    return differences
+
+
+class _Renderer:
+    """The pitch and artists of create_animation, drawn with Agg"""
+
+    def __init__(self):
+        pitch = Pitch(pitch_type='opta', goal_type='line', pitch_width=68, pitch_length=105)
+        self.fig, ax = pitch.draw(figsize=(16, 10.4))
+        self.time_text = ax.text(52.5, -5, '', ha='center', fontsize=12)
+        self.period_text = ax.text(52.5, -8, '', ha='center', fontsize=12)
+        marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
+        self.ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
+        self.away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)
+        self.home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)
+        self.canvas = FigureCanvasAgg(self.fig)
+        # The pitch figure's layout engine moves the axes a little on every draw, freeze it
+        self.canvas.draw()
+        self.fig.set_layout_engine('none')
+
+    def draw(self, frame):
+        self.ball.set_data(*frame['ball'])
+        self.home.set_data(*frame['home'])
+        self.away.set_data(*frame['away'])
+        self.time_text.set_text(frame['time'])
+        self.period_text.set_text(frame['period'])
+        self.canvas.draw()
+        return bytes(self.canvas.buffer_rgba())
+
+
+def synthetic_clip(seconds=4.0, interpolate=False, seed=0):
+    """Ball, home and away rows of the first seconds of a synthetic match"""
+    tables = generate_match(duration_minutes=max(1.0, seconds / 60), seed=seed)
+    tracking = apply_timestamp_schema(tables["player_tracking"])
+    tracking = tracking[(tracking["period_id"] == 1) & (tracking["seconds"] < seconds)]
+    teams = tables["players"].set_index("player_id")["team_id"]
+    tracking = tracking.assign(team_id=tracking["player_id"].map(teams))
+
+    df_ball = tracking[tracking["player_id"] == "ball"]
+    df_home = tracking[tracking["team_id"] == HOME_TEAM_ID]
+    df_away = tracking[tracking["team_id"] == AWAY_TEAM_ID]
+    if interpolate:
+        animation = SoccerAnimation()
+        df_ball, df_home, df_away = (animation.interpolate_frames(df) for df in (df_ball, df_home, df_away))
+    return df_ball, df_home, df_away
+
+
+def check_frames(df_ball, df_home, df_away, render_every=10):
+    """
+    Compare both implementations frame by frame.
+
+    Returns:
+        bool: True when every frame matches.
+    """
+    start = time.perf_counter()
+    expected = list(legacy_frames(df_ball, df_home, df_away))
+    legacy_s = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = list(array_frames(df_ball, df_home, df_away))
+    array_s = time.perf_counter() - start
+
+    ok = len(expected) == len(actual)
+    if not ok:
+        print(f"FAIL: {len(expected)} frames before, {len(actual)} now")
+
+    renderer = _Renderer() if render_every else None
+    rendered = 0
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        differences = _frame_differences(want, got)
+        if not differences and renderer is not None and i % render_every == 0:
+            rendered += 1
+            if renderer.draw(want) != renderer.draw(got):
+                differences.append("pixels")
+        if differences:
+            ok = False
+            print(f"FAIL: frame {i} differs in {', '.join(differences)}")
+
+    frames = max(len(expected), 1)
+    print(f"{len(expected)} frames compared, {rendered} rendered and compared pixel by pixel")
+    print(f"per frame: {legacy_s / frames * 1e6:.1f} us DataFrame lookups, {array_s / frames * 1e6:.1f} us arrays")
+    if ok:
+        print("OK")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=4.0, help="Length of the clip")
+    parser.add_argument("--interpolate", action="store_true", help="Compare interpolated frames as well")
+    parser.add_argument("--render-every", type=int, default=10, help="Render every Nth frame, 0 for none")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    clip = synthetic_clip(args.seconds, args.interpolate, args.seed)
+    sys.exit(0 if check_frames(*clip, render_every=args.render_every) else 1)
@@ -0,0 +1,144 @@
+"""
+Encoder presets for the ffmpeg stage of SoccerAnimation.
+
+A preset decides the codec settings and how much work goes into a clip:
+the dpi the figure is rendered at, whether every Nth frame is skipped and how
+many threads ffmpeg uses. 'preview' gets a draft clip out in seconds,
+'archive' is for the final render overnight, 'standard' is what
+create_animation always did (libx264, preset medium, crf 18).
+
+With codec='auto' a hardware H.264 encoder is used when this ffmpeg build
+has one (NVENC, Quick Sync, VideoToolbox), libx264 otherwise. When the
+hardware encoder fails at runtime (no GPU behind the driver), the clip is
+encoded again with libx264.
+"""
+import subprocess
+from functools import lru_cache
+
+from matplotlib import rcParams
+
+ENCODER_PRESETS = {
+    "preview": {
+        "codec": "libx264",
+        "speed": "ultrafast",
+        "crf": 30,
+        "dpi": 50,
+        "frame_step": 2,
+        "threads": 0,
+    },
+    "standard": {
+        "codec": "libx264",
+        "speed": "medium",
+        "crf": 18,
+        "dpi": None,
+        "frame_step": 1,
+        "threads": 0,
+    },
+    "archive": {
+        "codec": "libx264",
+        "speed": "slow",
+        "crf": 14,
+        "dpi": 150,
+        "frame_step": 1,
+        "threads": 0,
+    },
+}
+
+# Hardware H.264 encoders, in order of preference
+HARDWARE_CODECS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+# The libx264 speed presets a hardware encoder's own speed setting is mapped from
+_FAST_SPEEDS = ("ultrafast", "superfast", "veryfast", "faster", "fast")
+
+
+@lru_cache(maxsize=None)
+def available_encoders(ffmpeg_path=None):
+    """
+    The video encoders the ffmpeg build supports.
+
+    Returns:
+        frozenset: Encoder names, empty when ffmpeg cannot be run.
+    """
+    ffmpeg_path = ffmpeg_path or rcParams["animation.ffmpeg_path"]
+    try:
+        result = subprocess.run([ffmpeg_path, "-hide_banner", "-encoders"],
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return frozenset()
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # ' V....D libx264   libx264 H.264 ...', video encoders only
+        if len(parts) >= 2 and parts[0].startswith("V") and len(parts[0]) == 6:
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+
+def select_codec(codec="libx264"):
+    """
+    The codec to encode with.
+
+    Args:
+        codec (str): An encoder name, or 'auto' for the first available
+            hardware H.264 encoder with libx264 as the fallback.
+
+    Returns:
+        str: The encoder name.
+    """
+    if codec != "auto":
+        return codec
+    available = available_encoders()
+    for hardware_codec in HARDWARE_CODECS:
+        if hardware_codec in available:
+            return hardware_codec
+    return "libx264"
+
+
+def resolve_preset(encoder="standard", **overrides):
+    """
+    The settings of a preset, with overrides for single settings.
+
+    Args:
+        encoder (str or dict): A preset name from ENCODER_PRESETS or a dict of settings.
+        **overrides: Settings to replace; None values are ignored.
+
+    Returns:
+        dict: Complete encoder settings.
+    """
+    if isinstance(encoder, str):
+        if encoder not in ENCODER_PRESETS:
+            raise ValueError(f"Unknown encoder preset '{encoder}', choose from {', '.join(ENCODER_PRESETS)}")
+        settings = dict(ENCODER_PRESETS[encoder])
+    else:
+        settings = {**ENCODER_PRESETS["standard"], **encoder}
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    settings["frame_step"] = max(1, int(settings["frame_step"]))
+    return settings
+
+
+def encoder_args(settings, codec=None):
+    """
+    The ffmpeg output arguments for encoder settings.
+
+    Args:
+        settings (dict): Output of resolve_preset.
+        codec (str, optional): The (already selected) codec, defaults to the settings' codec.
+
+    Returns:
+        list: Arguments for matplotlib's FFMpegWriter `extra_args`.
+    """
+    codec = codec or settings["codec"]
+    fast = settings["speed"] in _FAST_SPEEDS
+    args = ["-vcodec", codec, "-pix_fmt", "yuv420p"]
+    if codec == "h264_nvenc":
+        args += ["-preset", "p1" if fast else "p6", "-cq", str(settings["crf"])]
+    elif codec == "h264_qsv":
+        args += ["-preset", "veryfast" if fast else "veryslow", "-global_quality", str(settings["crf"])]
+    elif codec == "h264_videotoolbox":
+        # Quality from 1 to 100, higher is better
+        args += ["-q:v", str(max(1, 100 - 2 * settings["crf"]))]
+    else:
+        args += ["-preset", settings["speed"], "-crf", str(settings["crf"])]
+    if settings.get("threads") is not None:
+        args += ["-threads", str(settings["threads"])]
+    return args
@@ -1,12 +1,73 @@
-from datetime import datetime, timedelta
+import os
+import time
+
 import numpy as np
 import pandas as pd
 from matplotlib import animation
 from matplotlib import pyplot as plt
 from mplsoccer import Pitch
-import psycopg2
 from tqdm import tqdm
 
+from connection_pool import get_manager
+from instrumentation import record_span, span
+from roster import attach_team, get_roster
+from statements import run
+from resample import resample, to_long
+from tracking_schema import apply_timestamp_schema, compact_tracking, format_clock
+
+from .encoders import encoder_args, resolve_preset, select_codec
+
+# Numeric columns that are interpolated linearly between real frames
+INTERPOLATED_COLUMNS = ['x', 'y', 'seconds', 'match_clock']
+
+
+def _frame_bounds(frame_ids, team):
+    """
+    Sort a team's rows by frame (stable, so the player order within a frame is
+    kept) and find the [start, end) rows of every requested frame.
+    """
+    order = np.argsort(team['frame_id'].to_numpy(), kind='stable')
+    team_frames = team['frame_id'].to_numpy()[order]
+    starts = np.searchsorted(team_frames, frame_ids, side='left')
+    ends = np.searchsorted(team_frames, frame_ids, side='right')
+    x = np.ascontiguousarray(team['x'].to_numpy(dtype=np.float64)[order])
+    y = np.ascontiguousarray(team['y'].to_numpy(dtype=np.float64)[order])
+    return x, y, np.column_stack([starts, ends])
+
+
+def frame_arrays(df_ball, df_home, df_away):
+    """
+    Precompute everything the animation draws, as contiguous arrays.
+
+    Every animation frame is a ball row. The players of a frame are a
+    contiguous slice of the sorted team arrays, found with one searchsorted
+    per team instead of masking the team DataFrame once per frame.
+
+    Returns:
+        dict: ball_x/ball_y per frame, home_x/home_y/home_bounds and
+            away_x/away_y/away_bounds ([start, end) rows per frame), and the
+            time and period labels of every frame.
+    """
+    frame_ids = df_ball['frame_id'].to_numpy()
+    home_x, home_y, home_bounds = _frame_bounds(frame_ids, df_home)
+    away_x, away_y, away_bounds = _frame_bounds(frame_ids, df_away)
+
+    if 'timestamp' in df_ball.columns:
+        time_labels = [f'Time: {t}' for t in df_ball['timestamp']]
+    else:
+        # Resampled grid frames have no timestamp of their own, show the clock of their seconds
+        seconds = df_ball['seconds'] if 'seconds' in df_ball.columns else pd.Series([None] * len(df_ball))
+        time_labels = [f'Time: {format_clock(t)}' for t in seconds]
+    periods = df_ball['period_id'] if 'period_id' in df_ball.columns else pd.Series(['N/A'] * len(df_ball))
+    return {
+        'ball_x': np.ascontiguousarray(df_ball['x'].to_numpy(dtype=np.float64)),
+        'ball_y': np.ascontiguousarray(df_ball['y'].to_numpy(dtype=np.float64)),
+        'home_x': home_x, 'home_y': home_y, 'home_bounds': home_bounds,
+        'away_x': away_x, 'away_y': away_y, 'away_bounds': away_bounds,
+        'time_labels': time_labels,
+        'period_labels': [f'Period: {p}' for p in periods],
+    }
+
 
 class SoccerAnimation:
     """
@@ -24,14 +85,23 @@ class SoccerAnimation:
         db_config : dict, optional
             A dictionary containing database connection parameters.
             If None, the user will need to provide tracking data directly.
+            The connection is checked out of the shared pool for these parameters.
         """
         self.conn = None
         if db_config:
-            self.conn = psycopg2.connect(**db_config)
+            self.conn = get_manager(db_config).checkout()
+
+    def close(self):
+        """
+        Return the database connection to the pool.
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
 
     def animate_from_database(self, game_id, start_time, end_time, 
                              period_id=None, output_file='tracking_animation.mp4', 
-                             fps=25, interpolate=True):
+                             fps=25, interpolate=True, encoder='standard'):
         """
         One-step method to create animation directly from database.
         
@@ -50,7 +120,10 @@ class SoccerAnimation:
         fps : int
             Frames per second for the animation.
         interpolate : bool
-            Whether to create interpolated frames for smoother animation.
+            Whether to resample the tracking data onto a uniform time grid at
+            `fps` (see resample.py), so the clip plays in real time.
+        encoder : str or dict
+            Encoder preset ('preview', 'standard', 'archive'), see create_animation.
             
         Returns:
         -------
@@ -88,7 +161,8 @@ class SoccerAnimation:
                 df_away, 
                 output_file=output_file, 
                 fps=fps,
-                interpolate=interpolate
+                interpolate=interpolate,
+                encoder=encoder
             )
             
             print(f"Animation saved to {output_file}")
@@ -102,7 +176,7 @@ class SoccerAnimation:
 
     def animate_from_dataframes(self, df_ball, df_home, df_away,
                                output_file='tracking_animation.mp4',
-                               fps=25, interpolate=True):
+                               fps=25, interpolate=True, encoder='standard'):
         """
         Create animation directly from provided DataFrames.
         
@@ -119,7 +193,10 @@ class SoccerAnimation:
         fps : int
             Frames per second for the animation.
         interpolate : bool
-            Whether to create interpolated frames for smoother animation.
+            Whether to resample the tracking data onto a uniform time grid at
+            `fps` (see resample.py), so the clip plays in real time.
+        encoder : str or dict
+            Encoder preset ('preview', 'standard', 'archive'), see create_animation.
             
         Returns:
         -------
@@ -133,7 +210,8 @@ class SoccerAnimation:
                 df_away, 
                 output_file=output_file, 
                 fps=fps,
-                interpolate=interpolate
+                interpolate=interpolate,
+                encoder=encoder
             )
             
             print(f"Animation saved to {output_file}")
@@ -161,22 +239,18 @@ class SoccerAnimation:
         Returns:
         -------
         pd.DataFrame
-            A DataFrame containing the tracking data.
+            A DataFrame containing the tracking data in the compact layout
+            (categorical ids, float32 coordinates), with numeric 'seconds'
+            and 'match_clock' columns parsed once from the timestamp.
         """
-        query = f"""
-        SELECT pt.*, p.team_id, pt.period_id
-        FROM player_tracking pt
-        LEFT JOIN players p ON pt.player_id = p.player_id
-        WHERE pt.timestamp >= '{start_time}' AND pt.timestamp < '{end_time}' 
-            AND pt.game_id = '{game_id}'
-        """
-
-        if period_id is not None:
-            query += f" AND pt.period_id = {period_id}"
-
-        query += " ORDER BY pt.timestamp, pt.frame_id ASC;"
-
-        df = pd.read_sql(query, self.conn)
+        # Team membership is looked up in the cached roster, not joined per row
+        if period_id is None:
+            df = run(self.conn, "tracking_window", (game_id, start_time, end_time))
+        else:
+            df = run(self.conn, "tracking_window_period", (game_id, start_time, end_time, period_id))
+        with span("deserialize", rows=len(df)):
+            df = compact_tracking(apply_timestamp_schema(df))
+            df = attach_team(df, get_roster(self.conn))
         
         # Validate that we have data
         if df.empty:
@@ -207,12 +281,7 @@ class SoccerAnimation:
         dict
             A dictionary containing home and away team IDs.
         """
-        query = f"""
-        SELECT m.home_team_id, m.away_team_id
-        FROM matches m
-        WHERE m.match_id = '{match_id}';
-        """
-        teams = pd.read_sql(query, self.conn)
+        teams = run(self.conn, "match_teams", (match_id,))
         return {
             "home_team_id": teams['home_team_id'].values[0],
             "away_team_id": teams['away_team_id'].values[0]
@@ -284,8 +353,8 @@ class SoccerAnimation:
                     # Create a new row as a copy of the current
                     interp_row = current_row.copy()
                     
-                    # Interpolate numeric values
-                    for col in ['x', 'y']:
+                    # Interpolate numeric values (timestamps are parsed into seconds on load)
+                    for col in INTERPOLATED_COLUMNS:
                         if col in df.columns:
                             interp_row[col] = current_row[col] + alpha * (next_row[col] - current_row[col])
                     
@@ -293,20 +362,6 @@ class SoccerAnimation:
                     frame_diff = next_row['frame_id'] - current_row['frame_id']
                     interp_row['frame_id'] = current_row['frame_id'] + (alpha * frame_diff)
                     
-                    # Interpolate timestamp if it's a datetime
-                    if 'timestamp' in df.columns:
-                        if isinstance(current_row['timestamp'], str):
-                            # Parse timestamps if they're strings
-                            try:
-                                current_time = datetime.strptime(current_row['timestamp'], '%H:%M:%S')
-                                next_time = datetime.strptime(next_row['timestamp'], '%H:%M:%S')
-                                time_diff = (next_time - current_time).total_seconds()
-                                new_time = current_time + timedelta(seconds=time_diff * alpha)
-                                interp_row['timestamp'] = new_time.strftime('%H:%M:%S')
-                            except:
-                                # If timestamp format is different, just copy the current one
-                                interp_row['timestamp'] = current_row['timestamp']
-                    
                     # Add the interpolated frame
                     new_df = pd.concat([new_df, pd.DataFrame([interp_row])], ignore_index=True)
             
@@ -319,7 +374,7 @@ class SoccerAnimation:
         
         # For multiple players, process each player separately
         else:
-            for player_id, player_df in df.groupby('player_id'):
+            for player_id, player_df in df.groupby('player_id', observed=True):
                 # Process one player at a time to avoid memory issues
                 interp_df = self.interpolate_single_player(player_df, num_interpolations)
                 result_dfs.append(interp_df)
@@ -353,8 +408,8 @@ class SoccerAnimation:
                 # Create a new row as a copy of the current
                 interp_row = current_row.copy()
                 
-                # Interpolate numeric values
-                for col in ['x', 'y']:
+                # Interpolate numeric values (timestamps are parsed into seconds on load)
+                for col in INTERPOLATED_COLUMNS:
                     if col in df.columns:
                         interp_row[col] = current_row[col] + alpha * (next_row[col] - current_row[col])
                 
@@ -362,18 +417,6 @@ class SoccerAnimation:
                 frame_diff = next_row['frame_id'] - current_row['frame_id']
                 interp_row['frame_id'] = current_row['frame_id'] + (alpha * frame_diff)
                 
-                # Interpolate timestamp if it's a datetime
-                if 'timestamp' in df.columns:
-                    if isinstance(current_row['timestamp'], str):
-                        try:
-                            current_time = datetime.strptime(current_row['timestamp'], '%H:%M:%S')
-                            next_time = datetime.strptime(next_row['timestamp'], '%H:%M:%S')
-                            time_diff = (next_time - current_time).total_seconds()
-                            new_time = current_time + timedelta(seconds=time_diff * alpha)
-                            interp_row['timestamp'] = new_time.strftime('%H:%M:%S')
-                        except:
-                            interp_row['timestamp'] = current_row['timestamp']
-                
                 # Add the interpolated frame
                 new_df = pd.concat([new_df, pd.DataFrame([interp_row])], ignore_index=True)
         
@@ -385,7 +428,8 @@ class SoccerAnimation:
         return new_df
         
 
-    def create_animation(self, df_ball, df_home, df_away, output_file='tracking_animation.mp4', fps=25, interpolate=True):
+    def create_animation(self, df_ball, df_home, df_away, output_file='tracking_animation.mp4', fps=25, interpolate=True,
+                         encoder='standard', frame_step=None, threads=None, dpi=None):
         """
         Create and save an animation of the tracking data.
         Parameters:
@@ -401,35 +445,53 @@ class SoccerAnimation:
         fps : int
             Frames per second for the animation.
         interpolate : bool
-            Whether to create interpolated frames for smoother animation.
+            Whether to resample the tracking data onto a uniform time grid at
+            `fps` (see resample.py), so the clip plays in real time.
+        encoder : str or dict
+            An encoder preset from encoders.ENCODER_PRESETS ('preview',
+            'standard', 'archive') or a dict of encoder settings.
+        frame_step : int, optional
+            Only draw every Nth frame, overrides the preset. The clip still
+            plays in real time, at fps / frame_step.
+        threads : int, optional
+            Number of ffmpeg threads (0 lets ffmpeg decide), overrides the preset.
+        dpi : int, optional
+            Resolution the figure is rendered at, overrides the preset.
+            
+        Returns:
+        -------
+        dict
+            Encode throughput: frames, seconds, frames per second, how many
+            times faster than real time, the codec and the file size.
         """
+        settings = resolve_preset(encoder, frame_step=frame_step, threads=threads, dpi=dpi)
         print(f"Creating animation with {len(df_ball)} original frames...")
         
-        # Interpolate frames if requested
+        # DataFrames passed in directly may still carry raw timestamps
+        if 'seconds' not in df_ball.columns:
+            df_ball = apply_timestamp_schema(df_ball.copy())
+            df_home = apply_timestamp_schema(df_home.copy())
+            df_away = apply_timestamp_schema(df_away.copy())
+        
+        # Resample onto the output frame rate if requested, so the clip plays in real time
         if interpolate:
             try:
-                # Interpolate ball frames
-                print("Interpolating ball frames...")
-                df_ball = self.interpolate_frames(df_ball)
-                print(f"After ball interpolation: {len(df_ball)} frames")
-                
-                # Interpolate player frames (home team)
-                print("Interpolating home team frames...")
-                df_home = self.interpolate_frames(df_home)
-                print(f"After home team interpolation: {len(df_home)} frames")
-                
-                # Interpolate player frames (away team)
-                print("Interpolating away team frames...")
-                df_away = self.interpolate_frames(df_away)
-                print(f"After away team interpolation: {len(df_away)} frames")
+                print(f"Resampling to {fps} fps...")
+                with span("interpolate", rows=len(df_ball) + len(df_home) + len(df_away), fps=fps):
+                    grid = resample({'ball': df_ball, 'home': df_home, 'away': df_away}, fps=fps)
+                    # Keep every grid frame, the ball is simply not drawn while it is not tracked
+                    df_ball = to_long(grid, 'ball', dropna=False)
+                    df_home = to_long(grid, 'home')
+                    df_away = to_long(grid, 'away')
+                print(f"After resampling: {len(df_ball)} frames")
             except Exception as e:
                 print(f"Error during interpolation: {e}. Continuing with original frames.")
                 import traceback
                 traceback.print_exc()
         
         # Start timestamp and end timestamp
-        start_time = df_ball.iloc[0]['timestamp'] if not df_ball.empty else 'N/A'
-        end_time = df_ball.iloc[-1]['timestamp'] if not df_ball.empty else 'N/A'
+        start_time = format_clock(df_ball.iloc[0].get('seconds')) if not df_ball.empty else 'N/A'
+        end_time = format_clock(df_ball.iloc[-1].get('seconds')) if not df_ball.empty else 'N/A'
         print(f"Time range: {start_time} to {end_time}")
         
         pitch = Pitch(pitch_type='opta', goal_type='line', pitch_width=68, pitch_length=105)
@@ -447,63 +509,91 @@ class SoccerAnimation:
         home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)
 
         # Create a progress bar
-        progress_bar = tqdm(total=len(df_ball), desc="Processing frames")
+        step = settings['frame_step']
+        progress_bar = tqdm(total=len(range(0, len(df_ball), step)), desc="Processing frames")
         
-        # Pre-process: Create a mapping of frame_id to player positions for efficiency
+        # Pre-process: contiguous coordinate arrays and the slice of every frame in them
         print("Pre-processing frames...")
-        frame_to_home = {}
-        frame_to_away = {}
-        
-        for frame_id in df_ball['frame_id'].unique():
-            frame_to_home[frame_id] = df_home[df_home['frame_id'] == frame_id]
-            frame_to_away[frame_id] = df_away[df_away['frame_id'] == frame_id]
+        with span("prepare_frames", frames=len(df_ball)):
+            frames = frame_arrays(df_ball, df_home, df_away)
+        ball_x, ball_y = frames['ball_x'], frames['ball_y']
+        home_x, home_y, home_bounds = frames['home_x'], frames['home_y'], frames['home_bounds']
+        away_x, away_y, away_bounds = frames['away_x'], frames['away_y'], frames['away_bounds']
+        time_labels, period_labels = frames['time_labels'], frames['period_labels']
         
         def animate(i):
-            if i >= len(df_ball):
+            with span("render.update"):
+                return update_frame(i)
+
+        def update_frame(i):
+            if i >= len(ball_x):
                 return ball, away, home, time_text, period_text
                 
             # Update progress bar
             progress_bar.update(1)
             
-            frame = df_ball.iloc[i]['frame_id']
-
             # Update timestamp and period display
-            timestamp = df_ball.iloc[i]['timestamp']
-            period_id = df_ball.iloc[i].get('period_id', 'N/A')
-            
-            time_text.set_text(f'Time: {timestamp}')
-            period_text.set_text(f'Period: {period_id}')
+            time_text.set_text(time_labels[i])
+            period_text.set_text(period_labels[i])
 
-            # Use arrays with single values for ball position
-            ball.set_data([df_ball.iloc[i]['x']], [df_ball.iloc[i]['y']])
-            
-            # Use cached frames for better performance
-            home_frame = frame_to_home.get(frame, pd.DataFrame({'x': [], 'y': []}))
-            away_frame = frame_to_away.get(frame, pd.DataFrame({'x': [], 'y': []}))
-            
-            # Use the x and y columns as arrays directly
-            away.set_data(away_frame['x'].values, away_frame['y'].values)
-            home.set_data(home_frame['x'].values, home_frame['y'].values)
+            # Only slicing of the precomputed arrays, no DataFrame work per frame
+            ball.set_data(ball_x[i:i + 1], ball_y[i:i + 1])
+            start, end = away_bounds[i]
+            away.set_data(away_x[start:end], away_y[start:end])
+            start, end = home_bounds[i]
+            home.set_data(home_x[start:end], home_y[start:end])
             
             return ball, away, home, time_text, period_text
 
-        # Create animation
+        # Create animation, a preview only draws every step-th frame
         print("Generating animation...")
-        anim = animation.FuncAnimation(fig, animate, frames=len(df_ball), blit=True)
+        frame_indices = range(0, len(ball_x), step)
+        anim = animation.FuncAnimation(fig, animate, frames=frame_indices, blit=True)
         
-        # Save with specified fps
-        print(f"Saving animation to {output_file} with {fps} fps...")
-        anim.save(output_file, writer='ffmpeg', fps=fps, extra_args=[
-            '-vcodec', 'libx264',
-            '-pix_fmt', 'yuv420p',
-            '-preset', 'medium',  # Use 'medium' for balance between speed and quality
-            '-crf', '18'
-        ])
+        # Keep real time when frames are skipped
+        output_fps = fps / step
+        print(f"Saving animation to {output_file} with {output_fps:g} fps...")
+        # Time every frame from the artist update until it is piped to ffmpeg
+        frame_start = [time.perf_counter()]
+
+        def frame_done(i, n):
+            now = time.perf_counter()
+            record_span("render.frame", frame_start[0], now - frame_start[0], frame=i)
+            frame_start[0] = now
+
+        codec = select_codec(settings['codec'])
+        encode_start = time.perf_counter()
+        with span("encode", output_file=output_file, frames=len(frame_indices), fps=output_fps, codec=codec):
+            try:
+                anim.save(output_file, writer='ffmpeg', fps=output_fps, dpi=settings['dpi'],
+                          progress_callback=frame_done, extra_args=encoder_args(settings, codec))
+            except Exception as e:
+                if codec == 'libx264':
+                    raise
+                # The build has the hardware encoder but the machine cannot use it
+                print(f"Encoding with {codec} failed ({e}), encoding with libx264 instead")
+                codec = 'libx264'
+                frame_start[0] = time.perf_counter()
+                anim.save(output_file, writer='ffmpeg', fps=output_fps, dpi=settings['dpi'],
+                          progress_callback=frame_done, extra_args=encoder_args(settings, codec))
+        encode_s = time.perf_counter() - encode_start
+        
+        throughput = {
+            'frames': len(frame_indices),
+            'encode_s': encode_s,
+            'frames_per_s': len(frame_indices) / encode_s if encode_s else 0.0,
+            'realtime_factor': (len(frame_indices) / output_fps) / encode_s if encode_s else 0.0,
+            'codec': codec,
+            'bytes': os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+        }
+        print(f"Encoded {throughput['frames']} frames in {encode_s:.1f}s with {codec}: "
+              f"{throughput['frames_per_s']:.1f} frames/s, {throughput['realtime_factor']:.2f}x real time")
         
         # Close the progress bar
         progress_bar.close()
         plt.close(fig)
         print("Animation completed!")
+        return throughput
 # Example usage:
 if __name__ == "__main__":
     try:
@@ -0,0 +1,243 @@
+"""
+Integer action sequences per possession, for sequence models over SPADL actions.
+
+The transformer notebooks ran BertTokenizer on every event's name with
+`.apply` and bert-base-uncased over a handful of distinct strings. Here an
+action is a token id looked up from (action type, result) with one array
+index, and a possession (the run of actions of one team within a period) is
+a row of token ids plus a few numeric features per action:
+
+    actions = apply_spadl_schema(run(conn, "transition_actions", (match_id,)))
+    windows = possession_windows(actions, window=16)
+    windows["tokens"]       # int64 (n_windows, 16), PAD_TOKEN after the end
+    windows["features"]     # float32 (n_windows, 16, len(FEATURE_NAMES))
+
+Possessions longer than `window` actions are cut into consecutive windows.
+build_sequence_cache stores the windows of a set of matches once as .npy
+files that training opens memory-mapped. Embeddings of the vocabulary are
+computed once per token with any text encoder (see bert_encoder) and cached
+by event_embeddings; sequence_model.py trains a small transformer on all of it.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from leaderboard import normalize_direction
+from match_summaries import PITCH_LENGTH, PITCH_WIDTH
+from spadl_schema import ACTION_TYPES as SPADL_ACTION_TYPES
+
+# SPADL action types, by id, spelled as words for the text encoder
+ACTION_TYPES = [name.replace("_", " ") for name in SPADL_ACTION_TYPES]
+# SPADL results 0 and 1; offside, own goal and cards share the last bucket
+RESULTS = ["fail", "success", "other"]
+
+PAD_TOKEN = 0
+UNKNOWN_TOKEN = 1
+FIRST_ACTION_TOKEN = 2
+VOCABULARY = ["<pad>", "<unknown>"] + [f"{action} {result}" for action in ACTION_TYPES for result in RESULTS]
+
+FEATURE_NAMES = ["start_x", "start_y", "end_x", "end_y", "seconds_since_previous"]
+# Gaps longer than this count as this long
+MAX_GAP_SECONDS = 10.0
+
+DEFAULT_CACHE_DIR = "sequence_cache"
+# Bump when tokens or features change, so old caches are not reused
+SEQUENCE_VERSION = 1
+
+
+def action_tokens(action_types, results):
+    """
+    The token id of every action, one lookup per array instead of one tokenizer call per row.
+
+    Args:
+        action_types (array-like): SPADL action type ids.
+        results (array-like): SPADL result ids.
+
+    Returns:
+        np.ndarray: int64 token ids into VOCABULARY, UNKNOWN_TOKEN for types outside SPADL.
+    """
+    action_types = np.nan_to_num(np.asarray(action_types, dtype=np.float64), nan=-1).astype(np.int64)
+    results = np.clip(np.nan_to_num(np.asarray(results, dtype=np.float64)).astype(np.int64), 0, len(RESULTS) - 1)
+    known = (action_types >= 0) & (action_types < len(ACTION_TYPES))
+    tokens = FIRST_ACTION_TOKEN + action_types * len(RESULTS) + results
+    return np.where(known, tokens, UNKNOWN_TOKEN)
+
+
+def possession_windows(actions, window=16, min_length=2):
+    """
+    Cut the actions of one or many matches into fixed-length windows per possession.
+
+    Args:
+        actions (pd.DataFrame): SPADL actions with match_id (or game_id), id,
+            period_id, seconds, team_id, start/end coordinates, action_type and result.
+        window (int): Actions per window.
+        min_length (int): Windows with fewer actions are dropped; a sequence
+            model needs at least two to predict anything.
+
+    Returns:
+        dict: 'tokens' (int64, n x window), 'features' (float32, n x window x
+            len(FEATURE_NAMES)), 'lengths' (int64, n) and 'match_ids' (n), the
+            match of every window.
+    """
+    n_features = len(FEATURE_NAMES)
+    empty = {"tokens": np.zeros((0, window), dtype=np.int64),
+             "features": np.zeros((0, window, n_features), dtype=np.float32),
+             "lengths": np.zeros(0, dtype=np.int64), "match_ids": np.zeros(0, dtype=object)}
+    if actions.empty:
+        return empty
+
+    match_col = "match_id" if "match_id" in actions.columns else "game_id"
+    actions = normalize_direction(actions)
+    actions = actions.sort_values([match_col, "period_id", "seconds", "id"], kind="stable", ignore_index=True)
+    match_ids = actions[match_col].to_numpy()
+    period_ids = actions["period_id"].to_numpy()
+    team_ids = actions["team_id"].to_numpy()
+    seconds = actions["seconds"].to_numpy(dtype=np.float64)
+
+    # A possession starts at every new match, period or team on the ball
+    starts = np.ones(len(actions), dtype=bool)
+    starts[1:] = (match_ids[1:] != match_ids[:-1]) | (period_ids[1:] != period_ids[:-1]) | (team_ids[1:] != team_ids[:-1])
+    possession_start = np.maximum.accumulate(np.where(starts, np.arange(len(actions)), 0))
+    position = np.arange(len(actions)) - possession_start
+
+    # A new window every `window` actions of a possession
+    window_starts = position % window == 0
+    row = np.cumsum(window_starts) - 1
+    column = position % window
+
+    gap = np.zeros(len(actions))
+    gap[1:] = seconds[1:] - seconds[:-1]
+    gap = np.where(starts, 0.0, np.clip(gap, 0.0, MAX_GAP_SECONDS)) / MAX_GAP_SECONDS
+    features = np.column_stack([
+        actions["start_x"].to_numpy(dtype=np.float64) / PITCH_LENGTH,
+        actions["start_y"].to_numpy(dtype=np.float64) / PITCH_WIDTH,
+        actions["end_x"].to_numpy(dtype=np.float64) / PITCH_LENGTH,
+        actions["end_y"].to_numpy(dtype=np.float64) / PITCH_WIDTH,
+        gap,
+    ])
+
+    n_rows = int(row[-1]) + 1
+    tokens = np.full((n_rows, window), PAD_TOKEN, dtype=np.int64)
+    values = np.zeros((n_rows, window, n_features), dtype=np.float32)
+    tokens[row, column] = action_tokens(actions["action_type"], actions["result"])
+    values[row, column] = np.nan_to_num(features)
+    lengths = np.bincount(row, minlength=n_rows)
+
+    keep = lengths >= min_length
+    return {"tokens": tokens[keep], "features": values[keep], "lengths": lengths[keep],
+            "match_ids": match_ids[window_starts][keep]}
+
+
+def cache_key(match_ids, window):
+    """Name of the sequence cache of these matches and window length"""
+    spec = json.dumps([SEQUENCE_VERSION, sorted(map(str, match_ids)), window])
+    return hashlib.sha1(spec.encode()).hexdigest()[:16]
+
+
+def build_sequence_cache(match_ids, fetch, cache_dir=DEFAULT_CACHE_DIR, window=16, force=False):
+    """
+    Compute the possession windows of a set of matches once and store them.
+
+    Args:
+        match_ids (list): The matches.
+        fetch (callable): Returns the actions of one match id, e.g.
+            `lambda m: apply_spadl_schema(run(conn, "transition_actions", (m,)))`.
+        cache_dir (str or Path): Parent directory of the caches.
+        window (int): Actions per window.
+        force (bool): Rebuild a cache that already exists.
+
+    Returns:
+        Path: The cache directory with tokens.npy, features.npy, lengths.npy and meta.json.
+    """
+    directory = Path(cache_dir) / cache_key(match_ids, window)
+    if (directory / "meta.json").exists() and not force:
+        return directory
+
+    parts = [possession_windows(fetch(match_id), window) for match_id in match_ids]
+    tmp = directory.with_name(directory.name + f".{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name in ("tokens", "features", "lengths"):
+        np.save(tmp / f"{name}.npy", np.concatenate([part[name] for part in parts]))
+    counts = [len(part["lengths"]) for part in parts]
+    with open(tmp / "meta.json", "w") as f:
+        json.dump({"version": SEQUENCE_VERSION, "window": window, "vocabulary": VOCABULARY,
+                   "features": FEATURE_NAMES, "matches": [[str(m), n] for m, n in zip(match_ids, counts)],
+                   "windows": int(sum(counts))}, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return directory
+
+
+def load_sequences(directory):
+    """
+    Open a sequence cache memory-mapped.
+
+    Returns:
+        tuple: (dict of 'tokens', 'features' and 'lengths' arrays, meta dict).
+    """
+    directory = Path(directory)
+    with open(directory / "meta.json") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in ("tokens", "features", "lengths")}
+    return arrays, meta
+
+
+def bert_encoder(model_name="bert-base-uncased"):
+    """
+    A text encoder for event_embeddings: BERT's pooled output per string.
+
+    Needs the transformers package; BERT runs once per vocabulary entry
+    when the cache is built, never per action.
+    """
+    def encode(texts):
+        import torch
+        from transformers import BertModel, BertTokenizer
+
+        tokenizer = BertTokenizer.from_pretrained(model_name)
+        model = BertModel.from_pretrained(model_name).eval()
+        with torch.no_grad():
+            inputs = tokenizer(list(texts), padding=True, return_tensors="pt")
+            return model(**inputs).pooler_output.numpy()
+    encode.name = model_name
+    return encode
+
+
+def event_embeddings(dim=32, encoder=None, cache_dir=DEFAULT_CACHE_DIR, seed=0):
+    """
+    One embedding vector per vocabulary entry, computed once and cached.
+
+    Args:
+        dim (int): Size of the vectors when no encoder is given.
+        encoder (callable, optional): Maps a list of strings to an array of
+            vectors, e.g. bert_encoder(). Without one the vectors are seeded
+            random values, the usual start for a learned embedding.
+        cache_dir (str or Path): Where the .npy file is kept.
+        seed (int): Seed of the random vectors.
+
+    Returns:
+        np.ndarray: float32 (len(VOCABULARY), dim or the encoder's size); the
+            padding row is all zeros.
+    """
+    source = getattr(encoder, "name", type(encoder).__name__) if encoder else f"random-{dim}-{seed}"
+    key = hashlib.sha1(json.dumps([VOCABULARY, source]).encode()).hexdigest()[:16]
+    path = Path(cache_dir) / f"embeddings-{key}.npy"
+    if path.exists():
+        return np.load(path)
+
+    if encoder is None:
+        vectors = np.random.default_rng(seed).normal(0.0, dim ** -0.5, (len(VOCABULARY), dim))
+    else:
+        vectors = np.asarray(encoder(VOCABULARY))
+    vectors = vectors.astype(np.float32)
+    vectors[PAD_TOKEN] = 0.0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp, path)
+    return vectors
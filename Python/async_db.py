@@ -0,0 +1,224 @@
+"""
+Async data-access layer for the match database.
+
+Coroutine versions of the match, tracking, event and possession fetches on
+top of a pooled psycopg 3 async connection, so dashboards and batch jobs can
+load dozens of matches concurrently instead of one blocking connection at a
+time. The blocking `fetch_many_matches` wrapper runs the event loop for
+callers that are not async themselves. The SQL is the named statements of
+statements.py and the rows are shaped by the same helpers as the sync
+loaders in helperfunctions.py, so the two layers return the same frames.
+
+The connection string is read from PG_DSN when set, otherwise it is built
+from the same PG_* variables as `helperfunctions.get_database_connection`.
+Set PG_SSLMODE=disable to point it at a local Postgres stand-in.
+"""
+import asyncio
+import os
+import sys
+
+import dotenv
+import pandas as pd
+from psycopg_pool import AsyncConnectionPool
+
+from helperfunctions import possession_changes, prepare_events, prepare_tracking
+from roster import cached_roster, set_roster
+from statements import pyformat
+
+def get_conninfo():
+    """
+    Build the libpq connection string for the async pool.
+
+    Returns:
+        str: PG_DSN if set, otherwise a connection string from the PG_* variables.
+    """
+    dotenv.load_dotenv()
+
+    dsn = os.getenv("PG_DSN")
+    if dsn:
+        return dsn
+    return (
+        f"host={os.getenv('PG_HOST')} port={os.getenv('PG_PORT')} "
+        f"dbname={os.getenv('PG_DB')} user={os.getenv('PG_USER')} "
+        f"password={os.getenv('PG_PASSWORD')} sslmode={os.getenv('PG_SSLMODE', 'require')}"
+    )
+
+
+async def open_pool(conninfo=None, min_size=1, max_size=10):
+    """
+    Open an async connection pool.
+
+    Args:
+        conninfo (str, optional): libpq connection string, defaults to `get_conninfo()`.
+        min_size (int): Connections kept open.
+        max_size (int): Upper bound of concurrent connections.
+
+    Returns:
+        psycopg_pool.AsyncConnectionPool: An opened pool, close it with `await pool.close()`.
+    """
+    pool = AsyncConnectionPool(conninfo or get_conninfo(), min_size=min_size,
+                               max_size=max_size, open=False)
+    await pool.open()
+    return pool
+
+
+async def _run(pool, name, params=()):
+    """Run a named statement of statements.py on a pooled connection and return the rows as a DataFrame."""
+    query, values = pyformat(name, params)
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, values or None)
+            rows = await cur.fetchall()
+            columns = [column.name for column in cur.description]
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+async def fetch_match(pool, match_id):
+    """
+    Fetch the matches row (teams and score) of one match.
+
+    Args:
+        pool (AsyncConnectionPool): The connection pool.
+        match_id (str): The ID of the match.
+
+    Returns:
+        pd.DataFrame: A single-row DataFrame, empty when the match is unknown.
+    """
+    return await _run(pool, "match_details", (match_id,))
+
+
+async def fetch_roster(pool, refresh=False):
+    """
+    Async version of `roster.get_roster`, sharing the same process-wide cache.
+
+    Args:
+        pool (AsyncConnectionPool): The connection pool.
+        refresh (bool): Reload even when a cached roster is available.
+
+    Returns:
+        pd.DataFrame: player_name, jersey_number and team_id, indexed by player_id.
+    """
+    roster = None if refresh else cached_roster()
+    if roster is None:
+        roster = set_roster(await _run(pool, "roster"))
+    return roster
+
+
+async def fetch_tracking_data(pool, game_id, compact=True):
+    """
+    Async version of `helperfunctions.fetch_tracking_data`.
+
+    Args:
+        pool (AsyncConnectionPool): The connection pool.
+        game_id (str): The ID of the game to fetch tracking data for.
+        compact (bool): Return the compact layout, see `tracking_schema.compact_tracking`.
+
+    Returns:
+        pd.DataFrame: The tracking data with numeric 'seconds' and 'match_clock' columns.
+    """
+    tracking_df, roster = await asyncio.gather(
+        _run(pool, "tracking_by_frame", (game_id,)), fetch_roster(pool))
+    return prepare_tracking(tracking_df, roster, compact)
+
+
+async def fetch_match_events(pool, match_id):
+    """
+    Async version of `helperfunctions.fetch_match_events`.
+
+    Args:
+        pool (AsyncConnectionPool): The connection pool.
+        match_id (str): The ID of the match to fetch events for.
+
+    Returns:
+        pd.DataFrame: The match events with numeric 'seconds', 'end_seconds' and 'match_clock' columns.
+    """
+    return prepare_events(await _run(pool, "match_events", (match_id,)))
+
+
+async def fetch_possession_changes(pool, match_id, team_id):
+    """
+    Async version of `helperfunctions.calculate_ball_possession`.
+
+    Args:
+        pool (AsyncConnectionPool): The connection pool.
+        match_id (str): The ID of the match.
+        team_id (str): The team whose possession is being calculated.
+
+    Returns:
+        pd.DataFrame: The possession changes of the match.
+    """
+    match_events = await fetch_match_events(pool, match_id)
+    if match_events.empty:
+        return match_events
+    return possession_changes(match_events, team_id)
+
+
+async def fetch_match_bundle(pool, match_id, tracking=True, events=True):
+    """
+    Fetch everything about one match, running the queries concurrently.
+
+    Args:
+        pool (AsyncConnectionPool): The connection pool.
+        match_id (str): The ID of the match.
+        tracking (bool): Whether to fetch the tracking data.
+        events (bool): Whether to fetch the match events.
+
+    Returns:
+        dict: 'match', and optionally 'tracking' and 'events' DataFrames.
+    """
+    names = ['match']
+    tasks = [fetch_match(pool, match_id)]
+    if tracking:
+        names.append('tracking')
+        tasks.append(fetch_tracking_data(pool, match_id))
+    if events:
+        names.append('events')
+        tasks.append(fetch_match_events(pool, match_id))
+    results = await asyncio.gather(*tasks)
+    return dict(zip(names, results))
+
+
+async def fetch_many(match_ids, fetch=fetch_match_bundle, pool=None, max_concurrency=10, **kwargs):
+    """
+    Run a per-match fetch coroutine for many matches concurrently.
+
+    Args:
+        match_ids (list): The IDs of the matches.
+        fetch (coroutine function): Called as `fetch(pool, match_id, **kwargs)`.
+        pool (AsyncConnectionPool, optional): An open pool; a temporary one is
+            opened (and closed) when not provided.
+        max_concurrency (int): Maximum number of matches fetched at the same time.
+
+    Returns:
+        dict: The result of `fetch` for every match ID.
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = await open_pool(max_size=max_concurrency)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_one(match_id):
+        async with semaphore:
+            return await fetch(pool, match_id, **kwargs)
+
+    try:
+        results = await asyncio.gather(*(fetch_one(match_id) for match_id in match_ids))
+    finally:
+        if own_pool:
+            await pool.close()
+    return dict(zip(match_ids, results))
+
+
+def fetch_many_matches(match_ids, **kwargs):
+    """
+    Blocking wrapper around `fetch_many` for scripts and notebooks.
+
+    Example:
+        >>> matches = fetch_many_matches(["5oc8drrbruovbuiriyhdyiyok"], tracking=False)
+        >>> matches["5oc8drrbruovbuiriyhdyiyok"]["events"].head()
+    """
+    if sys.platform == "win32":
+        # psycopg's async connections do not work with the default Proactor loop
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    return asyncio.run(fetch_many(match_ids, **kwargs))
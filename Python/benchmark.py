@@ -0,0 +1,376 @@
+"""
+Benchmarks of the hot paths on a synthetic match, no database needed.
+
+Every benchmark runs against the same generated match (see synthetic_match.py),
+loaded into an in-memory SQLite database for the functions that query.
+Save a run as a baseline and compare later runs against it to catch
+regressions:
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 1.25
+    python benchmark.py --filter interpolate --repeat 10
+
+A run with --compare prints every median as a multiple of the baseline's
+and exits with status 1 when one is more than --threshold times slower, so
+a CI step or a pre-merge check fails on a regression.
+
+This is a standalone script rather than a pytest-benchmark or asv suite:
+the repository has no test suite, pytest or packaging to hang either on,
+and the benchmarks import the viewer and the xT scripts from folders that
+are not packages. A benchmark whose optional dependency is missing (pygame,
+torch) reports 'skipped' instead of failing the run.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from synthetic_match import HOME_TEAM_ID, SYNTHETIC_MATCH_ID, generate_match, write_sqlite
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+# The pygame viewer and the xT scripts live outside of this folder
+sys.path.append(str(REPO_ROOT / "hal" / "pygame"))
+sys.path.append(str(REPO_ROOT / "edrik" / "group17_project"))
+
+# Length of the highlight-sized windows, like the viewer's -3s/+7s window
+WINDOW_SECONDS = 10
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark; the function gets the fixture and returns the callable to time"""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def make_fixture(minutes, seed):
+    """Generate the match once and cut out the pieces the benchmarks need"""
+    tables = generate_match(minutes, seed=seed)
+    tracking = tables["player_tracking"]
+
+    # A highlight window in the first period, with numeric seconds like the viewer uses
+    window = tracking[(tracking["period_id"] == 1)
+                      & (tracking["frame_id"] < WINDOW_SECONDS * 25)].copy()
+    window["timestamp"] = (window["frame_id"] / 25).astype("float64")
+    teams = window["player_id"].str.rsplit("-", n=1).str[0]
+
+    return {
+        "tables": tables,
+        "conn": write_sqlite(tables),
+        "ball": window[window["player_id"] == "ball"].reset_index(drop=True),
+        "home": window[teams == HOME_TEAM_ID].reset_index(drop=True),
+    }
+
+
+@benchmark("soccer_animation.interpolate_frames[ball]")
+def bench_interpolate_frames(fixture):
+    from VisualisationTools.soccer_animation import SoccerAnimation
+
+    ball = fixture["ball"].assign(seconds=fixture["ball"]["timestamp"])
+    animation = SoccerAnimation()
+    return lambda: animation.interpolate_frames(ball)
+
+
+@benchmark("soccer_animation.interpolate_frames[home]")
+def bench_interpolate_frames_players(fixture):
+    from VisualisationTools.soccer_animation import SoccerAnimation
+
+    home = fixture["home"].assign(seconds=fixture["home"]["timestamp"])
+    animation = SoccerAnimation()
+    return lambda: animation.interpolate_frames(home)
+
+
+@benchmark("viewer.interpolate_ball_data")
+def bench_interpolate_ball_data(fixture):
+    from functions import interpolate_ball_data
+
+    return lambda: interpolate_ball_data(fixture["ball"], frames_between=4)
+
+
+@benchmark("viewer.prepare_player_data")
+def bench_prepare_player_data(fixture):
+    from functions import prepare_player_data
+
+    return lambda: prepare_player_data(fixture["home"], "home")
+
+
+@benchmark("viewer.get_interpolated_positions")
+def bench_get_interpolated_positions(fixture):
+    from functions import get_interpolated_positions, prepare_player_data
+
+    frames, positions = prepare_player_data(fixture["home"], "home")
+    # Every interpolated frame of the highlight at 120 fps
+    frame_ids = np.linspace(frames[0], frames[-1], WINDOW_SECONDS * 120)
+
+    def run():
+        for frame_id in frame_ids:
+            get_interpolated_positions(frame_id, frames, positions)
+    return run
+
+
+@benchmark("resample[120fps]")
+def bench_resample(fixture):
+    from resample import resample
+
+    sources = {"ball": fixture["ball"], "home": fixture["home"]}
+    return lambda: resample(sources, fps=120, time_col="timestamp")
+
+
+@benchmark("helperfunctions.fetch_tracking_data")
+def bench_fetch_tracking_data(fixture):
+    from helperfunctions import fetch_tracking_data
+
+    return lambda: fetch_tracking_data(SYNTHETIC_MATCH_ID, fixture["conn"])
+
+
+@benchmark("helperfunctions.calculate_ball_possession")
+def bench_calculate_ball_possession(fixture):
+    from helperfunctions import calculate_ball_possession
+
+    return lambda: calculate_ball_possession(SYNTHETIC_MATCH_ID, fixture["conn"], HOME_TEAM_ID)
+
+
+@benchmark("xt.calculate_xt")
+def bench_calculate_xt(fixture):
+    from xt_model import calculate_xt, result_mapping
+
+    # Same columns as get_event_data returns
+    events = fixture["tables"]["matchevents"].rename(columns={
+        "x": "start_x", "y": "start_y", "eventtype_id": "action_type", "result": "outcome"})
+    events["result_name"] = events["outcome"].map(result_mapping)
+    return lambda: calculate_xt(events)
+
+
+@benchmark("timeline.xt_timeline")
+def bench_xt_timeline(fixture):
+    from timeline import xt_timeline
+    from tracking_schema import apply_timestamp_schema
+
+    events = apply_timestamp_schema(fixture["tables"]["matchevents"].copy())
+    events["xt"] = np.random.default_rng(0).random(len(events))
+    return lambda: xt_timeline(events, window=5)
+
+
+@benchmark("leaderboard.player_contributions")
+def bench_player_contributions(fixture):
+    from leaderboard import player_contributions
+    from match_summaries import xt_grid
+
+    actions = fixture["tables"]["spadl_actions"]
+    # The grid is the group's xT model, timed by xt.calculate_xt
+    grids = {SYNTHETIC_MATCH_ID: xt_grid(actions)}
+    return lambda: player_contributions(actions, grids=grids)
+
+
+@benchmark("sequences.possession_windows")
+def bench_possession_windows(fixture):
+    from action_sequences import possession_windows
+
+    actions = fixture["tables"]["spadl_actions"]
+    return lambda: possession_windows(actions)
+
+
+@benchmark("sequences.train_step")
+def bench_sequence_train_step(fixture):
+    import torch
+
+    from action_sequences import VOCABULARY, possession_windows
+    from sequence_model import ActionTransformer, next_action_loss
+
+    windows = possession_windows(fixture["tables"]["spadl_actions"])
+    tokens = torch.from_numpy(windows["tokens"][:256])
+    features = torch.from_numpy(windows["features"][:256])
+    torch.manual_seed(0)
+    embeddings = np.random.default_rng(0).normal(0.0, 0.2, (len(VOCABULARY), 32))
+    model = ActionTransformer(embeddings, tokens.shape[1])
+    optimizer = torch.optim.Adam(model.parameters())
+
+    def step():
+        loss, _, _ = next_action_loss(model, tokens, features)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+    return step
+
+
+def _xt_plot_benchmark(fixture, mode):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    from SoccerationV2 import plot_directional_xt
+
+    # Same columns as get_event_data returns
+    events = fixture["tables"]["matchevents"].rename(columns={
+        "x": "start_x", "y": "start_y", "end_coordinates_x": "end_x", "end_coordinates_y": "end_y",
+        "eventtype_id": "action_type", "result": "outcome"})
+
+    def run():
+        fig, _ = plot_directional_xt(events, mode=mode)
+        fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+@benchmark("xt.plot_directional_xt[arrows]")
+def bench_plot_directional_xt(fixture):
+    return _xt_plot_benchmark(fixture, "arrows")
+
+
+@benchmark("xt.plot_directional_xt[flow]")
+def bench_plot_directional_xt_flow(fixture):
+    return _xt_plot_benchmark(fixture, "flow")
+
+
+@benchmark("render.frame")
+def bench_render_frame(fixture):
+    ball = fixture["ball"]
+    home = fixture["home"]
+    first = home["frame_id"].iloc[0]
+    frame = home[home["frame_id"] == first]
+    ball_xy = (ball["x"].to_numpy()[:1], ball["y"].to_numpy()[:1])
+    home_xy = (frame["x"].to_numpy(), frame["y"].to_numpy())
+    away_xy = (100 - home_xy[0], home_xy[1])
+
+    # The viewer's own figure-to-surface path when pygame is available
+    try:
+        from game import draw_positions
+    except ImportError:
+        draw_positions = None
+    if draw_positions is not None:
+        return lambda: draw_positions(ball_xy, home_xy, away_xy)
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from mplsoccer import Pitch
+
+    pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
+    fig, ax = pitch.draw(figsize=(16, 10.4))
+    markers = [ax.plot([], [], marker='o', linestyle='None')[0] for _ in range(3)]
+    canvas = FigureCanvasAgg(fig)
+
+    def run():
+        for marker, (x, y) in zip(markers, (ball_xy, home_xy, away_xy)):
+            marker.set_data(x / 100, y / 100)
+        canvas.draw()
+        return canvas.buffer_rgba()
+    return run
+
+
+def tracking_memory_report(fixture):
+    """Bytes per frame of the loaded tracking data, as loaded and in the compact layout"""
+    from helperfunctions import fetch_tracking_data
+    from tracking_schema import memory_report
+
+    loaded = fetch_tracking_data(SYNTHETIC_MATCH_ID, fixture["conn"], compact=False)
+    compact = fetch_tracking_data(SYNTHETIC_MATCH_ID, fixture["conn"])
+    return memory_report(loaded, compact)
+
+
+def time_call(func, repeat):
+    """Run func once to warm up, then `repeat` times; returns the timings in seconds"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_benchmarks(minutes=2, seed=0, repeat=5, name_filter=None):
+    """
+    Run the registered benchmarks.
+
+    Returns:
+        dict: Per benchmark the min, median and mean time in seconds, or the
+            reason it was skipped.
+    """
+    fixture = make_fixture(minutes, seed)
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+        try:
+            func = setup(fixture)
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name}"}
+            continue
+        timings = time_call(func, repeat)
+        results[name] = {
+            "rounds": repeat,
+            "min_s": min(timings),
+            "median_s": statistics.median(timings),
+            "mean_s": statistics.fmean(timings),
+        }
+    results["memory"] = tracking_memory_report(fixture)
+    fixture["conn"].close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of the benchmarks whose median got slower than threshold x the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name, {})
+        if "median_s" in result and "median_s" in before:
+            ratio = result["median_s"] / before["median_s"]
+            result["vs_baseline"] = ratio
+            if ratio > threshold:
+                regressions.append(name)
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<46}{'min ms':>10}{'median ms':>12}{'vs base':>10}")
+    for name, result in results.items():
+        if name == "memory":
+            continue
+        if "skipped" in result:
+            print(f"{name:<46}  skipped ({result['skipped']})")
+            continue
+        ratio = f"{result['vs_baseline']:.2f}x" if "vs_baseline" in result else ""
+        print(f"{name:<46}{result['min_s'] * 1000:>10.2f}{result['median_s'] * 1000:>12.2f}{ratio:>10}")
+
+    memory = results.get("memory")
+    if memory:
+        print(f"tracking memory: {memory['bytes_per_frame_before']:.0f} -> "
+              f"{memory['bytes_per_frame_after']:.0f} bytes per frame ({memory['reduction']:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on a synthetic match")
+    parser.add_argument("--minutes", type=float, default=2, help="Length of the synthetic match")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default=None, help="Only run benchmarks containing this text")
+    parser.add_argument("--save", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Fail when a median is this many times slower than the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.minutes, args.seed, args.repeat, args.filter)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {"minutes": args.minutes, "seed": args.seed, "python": platform.python_version()},
+                "results": results,
+            }, f, indent=2)
+    if regressions:
+        print(f"Slower than {args.threshold}x the baseline: {', '.join(regressions)}")
+        sys.exit(1)
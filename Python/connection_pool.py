@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import dotenv
+from psycopg2 import OperationalError, InterfaceError, extensions
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+
+# TCP keepalives so idle pooled connections are not silently dropped by the hosted database
+KEEPALIVE_PARAMS = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 5,
+}
+
+
+def env_connection_params():
+    """
+    Read the database connection parameters from the environment (.env).
+
+    Returns:
+        dict: Keyword arguments for psycopg2.connect.
+    """
+    dotenv.load_dotenv()
+    return {
+        "host": os.getenv("PG_HOST"),
+        "database": os.getenv("PG_DB"),
+        "user": os.getenv("PG_USER"),
+        "password": os.getenv("PG_PASSWORD"),
+        "port": os.getenv("PG_PORT"),
+        "sslmode": os.getenv("PG_SSLMODE", "require"),
+    }
+
+
+class PooledConnection:
+    """
+    A checked-out connection that goes back to the pool when closed.
+
+    Behaves like a psycopg2 connection (attribute access is forwarded), so
+    existing code that calls `conn.close()` when done keeps working unchanged.
+    """
+
+    def __init__(self, conn, release):
+        self._conn = conn
+        self._release = release
+
+    def close(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release(self._conn)
+
+    @property
+    def closed(self):
+        return self._release is None or self._conn.closed
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Same semantics as a psycopg2 connection: end the transaction, keep the connection
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+
+class ConnectionManager:
+    """
+    A thread-safe pool of database connections shared by all loaders.
+
+    Checkouts block (up to `timeout`) when every connection is in use instead
+    of failing, connections idle for longer than `health_check_interval`
+    seconds are pinged before being handed out, and wait times and reuse
+    are recorded so `stats()` can show how well the pool is doing.
+    """
+
+    def __init__(self, minconn=1, maxconn=8, health_check_interval=30.0, timeout=30.0, **connect_params):
+        params = {**KEEPALIVE_PARAMS, **connect_params}
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **params)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._stats = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "reused": 0,
+            "health_check_failures": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+        }
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def _get_healthy_connection(self):
+        conn = self._pool.getconn()
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used > self.health_check_interval:
+            if not self._healthy(conn):
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+                last_used = None
+        with self._lock:
+            if last_used is None:
+                self._stats["connections_created"] += 1
+            else:
+                self._stats["reused"] += 1
+        return conn
+
+    def checkout(self, timeout=None):
+        """
+        Take a connection from the pool.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free connection.
+
+        Returns:
+            PooledConnection: Call `.close()` to return it to the pool.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"No database connection available after {timeout} seconds")
+        try:
+            conn = self._get_healthy_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_total_s"] += wait
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], wait)
+        return PooledConnection(conn, self._release)
+
+    def _release(self, conn):
+        try:
+            broken = conn.closed
+            if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand out a connection with a transaction left open
+                conn.rollback()
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context-managed checkout: `with manager.connection() as conn: ...`"""
+        conn = self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        """
+        Pool metrics since the manager was created.
+
+        Returns:
+            dict: Checkout count, new vs reused connections, failed health
+                checks and the total, mean and max wait for a connection.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["wait_mean_s"] = stats["wait_total_s"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        stats["reuse_ratio"] = stats["reused"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def close(self):
+        self._pool.closeall()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_config=None, **pool_kwargs):
+    """
+    The process-wide connection manager for a set of connection parameters.
+
+    Args:
+        db_config (dict, optional): psycopg2.connect parameters, read from the
+            environment when not provided.
+        **pool_kwargs: Passed to ConnectionManager when it is first created.
+
+    Returns:
+        ConnectionManager: The shared manager. A new one is created in forked
+            worker processes, as connections cannot be shared across processes.
+    """
+    params = db_config or env_connection_params()
+    key = (os.getpid(), tuple(sorted((k, str(v)) for k, v in params.items())))
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(**pool_kwargs, **params)
+            _managers[key] = manager
+        return manager
+
+
+@contextmanager
+def pooled_connection(db_config=None):
+    """Shortcut for `with get_manager(db_config).connection() as conn: ...`"""
+    with get_manager(db_config).connection() as conn:
+        yield conn
@@ -1,65 +1,100 @@
 import pandas as pd
-import psycopg2
-import dotenv
-import os
+
+from connection_pool import get_manager
+from match_catalog import team_name_pattern
+from roster import attach_players, attach_team, get_roster
+from statements import run
+from tracking_schema import apply_timestamp_schema, compact_tracking, timestamp_to_seconds
 
 def get_database_connection():
     """
-    Establish and return a connection to the PostgreSQL database.
+    Check out a connection to the PostgreSQL database from the shared pool.
+
+    Calling `.close()` on the returned connection hands it back to the pool
+    instead of tearing down the (SSL) connection.
 
     Returns:
-        psycopg2.extensions.connection: A connection object to the database.
+        connection_pool.PooledConnection: A pooled psycopg2 connection.
     """
-    dotenv.load_dotenv()
+    return get_manager().checkout()
 
-    PG_PASSWORD = os.getenv("PG_PASSWORD")
-    PG_USER = os.getenv("PG_USER")
-    PG_HOST = os.getenv("PG_HOST")
-    PG_PORT = os.getenv("PG_PORT")
-    PG_DATABASE = os.getenv("PG_DB")
+def prepare_tracking(tracking_df, roster, compact=True):
+    """
+    Shape freshly loaded tracking rows, shared by the sync and async loaders.
 
-    # Establish and return the database connection
-    return psycopg2.connect(
-        host=PG_HOST,
-        database=PG_DATABASE,
-        user=PG_USER,
-        password=PG_PASSWORD,
-        port=PG_PORT,
-        sslmode="require",
-    )
+    Args:
+        tracking_df (pd.DataFrame): Rows of the 'tracking' statements.
+        roster (pd.DataFrame): Output of `roster.get_roster`.
+        compact (bool): Return the compact layout, see `fetch_tracking_data`.
 
-def fetch_tracking_data(game_id, conn):
+    Returns:
+        pd.DataFrame: The tracking data with numeric 'seconds' and 'match_clock' columns.
+    """
+    tracking_df = apply_timestamp_schema(tracking_df)
+    if not compact:
+        return attach_players(tracking_df, roster)
+    return attach_team(compact_tracking(tracking_df), roster)
+
+def prepare_events(events_df):
+    """
+    Parse the timestamps of freshly loaded match events, shared by the sync and async loaders.
+
+    Returns:
+        pd.DataFrame: The events with numeric 'seconds', 'end_seconds' and 'match_clock' columns.
+    """
+    events_df = apply_timestamp_schema(events_df)
+    if 'end_timestamp' in events_df.columns:
+        events_df['end_seconds'] = timestamp_to_seconds(events_df['end_timestamp'])
+    return events_df
+
+def fetch_tracking_data(game_id, conn, compact=True):
     """
     Fetch tracking data for a specific game from the database.
 
     Args:
         game_id (str): The ID of the game to fetch tracking data for.
         conn (psycopg2.extensions.connection): The database connection object.
+        compact (bool): Return the compact layout (categorical ids, float32
+            coordinates, int32 frame ids) without the per-row player_name and
+            jersey_number; get those once per player from `fetch_player_dimension`
+            or `roster.get_roster`.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the tracking data.
+        pd.DataFrame: A DataFrame containing the tracking data, with numeric
+            'seconds' and 'match_clock' columns parsed from the timestamp.
     """
     # Ensure the connection is passed as a parameter
     if conn is None:
         raise ValueError("Database connection 'conn' must be provided.")
 
     try:
-        # Query to fetch tracking data
-        query = f"""
-        SELECT pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y, p.jersey_number, p.player_name, p.team_id
-        FROM player_tracking pt
-        JOIN players p ON pt.player_id = p.player_id
-        JOIN teams t ON p.team_id = t.team_id
-        WHERE pt.game_id = '{game_id}';
-        """
-        # Execute query and load data into a DataFrame
-        tracking_df = pd.read_sql_query(query, conn)
-        return tracking_df
+        # Only the tracking columns themselves; team membership comes from the
+        # cached roster instead of joining players and teams onto every row
+        tracking_df = run(conn, "tracking", (game_id,))
+        return prepare_tracking(tracking_df, get_roster(conn), compact)
     finally:
         # Close the connection
         # Ensure the caller handles connection closure
         pass
 
+def fetch_player_dimension(game_id, conn):
+    """
+    Fetch the players of both teams of a game, one row per player.
+
+    This is the small dimension table that goes with the compact tracking data.
+
+    Args:
+        game_id (str): The ID of the game.
+        conn (psycopg2.extensions.connection): The database connection object.
+
+    Returns:
+        pd.DataFrame: player_id, player_name, jersey_number and team_id.
+    """
+    if conn is None:
+        raise ValueError("Database connection 'conn' must be provided.")
+
+    return run(conn, "player_dimension", (game_id,))
+
 def fetch_match_events(match_id, conn):
     """
     Fetch match events for a specific match from the database.
@@ -69,33 +104,40 @@ def fetch_match_events(match_id, conn):
         conn (psycopg2.extensions.connection): The database connection object.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the match events.
+        pd.DataFrame: A DataFrame containing the match events, with numeric
+            'seconds', 'end_seconds' and 'match_clock' columns.
     """
     # Ensure the connection is passed as a parameter
     if conn is None:
         raise ValueError("Database connection 'conn' must be provided.")
 
     try:
-        # Query to fetch match events
-        query = f"""
-        SELECT me.match_id, me.event_id, me.eventtype_id, et.name AS eventtype_name, me.result, me.success, me.period_id, 
-                me.timestamp, me.end_timestamp, me.ball_state, me.ball_owning_team, 
-                me.team_id, me.player_id, me.x, me.y, me.end_coordinates_x, 
-                me.end_coordinates_y, me.receiver_player_id, rp.team_id AS receiver_team_id
-        FROM matchevents me
-        LEFT JOIN players rp ON me.receiver_player_id = rp.player_id
-        LEFT JOIN eventtypes et ON me.eventtype_id = et.eventtype_id
-        WHERE me.match_id = '{match_id}'
-        ORDER BY me.period_id ASC, me.timestamp ASC;
-        """
-        # Execute query and load data into a DataFrame
-        events_df = pd.read_sql_query(query, conn)
-        return events_df
+        return prepare_events(run(conn, "match_events", (match_id,)))
     finally:
         # Close the connection
         # Ensure the caller handles connection closure
         pass
 
+def fetch_possession_changes(match_id, conn):
+    """
+    Fetch the possession changes of a match: the last action of every spell of
+    at least three actions by one team before the other team gets the ball.
+
+    Args:
+        match_id (str): The ID of the match.
+        conn (psycopg2.extensions.connection): The database connection object.
+
+    Returns:
+        pd.DataFrame: One row per change with period_id, numeric 'seconds'
+            (period-relative), the losing and gaining team and the action's coordinates.
+    """
+    if conn is None:
+        raise ValueError("Database connection 'conn' must be provided.")
+
+    changes = run(conn, "possession_changes", (match_id,))
+    changes['seconds'] = timestamp_to_seconds(changes['seconds'])
+    return changes
+
 def fetch_team_matches(team_name, conn):
     """
     Fetch all matches for a team where the team name contains the specified string.
@@ -112,21 +154,9 @@ def fetch_team_matches(team_name, conn):
         raise ValueError("Database connection 'conn' must be provided.")
 
     try:
-        # Query to fetch matches for the team
-        query = f"""
-        SELECT m.match_id, m.match_date, m.home_team_id, ht.team_name AS home_team_name, 
-                m.away_team_id, at.team_name AS away_team_name,
-                CASE 
-                    WHEN ht.team_name ILIKE '%{team_name}%' THEN 1
-                    ELSE 0
-                END AS home
-        FROM matches m
-        JOIN teams ht ON m.home_team_id = ht.team_id
-        JOIN teams at ON m.away_team_id = at.team_id
-        WHERE ht.team_name ILIKE '%{team_name}%' OR at.team_name ILIKE '%{team_name}%';
-        """
-        # Execute query and load data into a DataFrame
-        matches_df = pd.read_sql_query(query, conn)
+        # The search text is a parameter, and the ILIKE is answered by the
+        # trigram index on team names (see match_catalog)
+        matches_df = run(conn, "team_matches", (team_name_pattern(team_name),))
         return matches_df
     finally:
         # Ensure the caller handles connection closure
@@ -159,44 +189,37 @@ def calculate_ball_possession(match_id, conn, team_id):
         >>> print(changes.head())
     """
 
-    # Fetch match events for the given match_id
+    # Fetch match events for the given match_id (timestamps already parsed)
     match_events = fetch_match_events(match_id, conn)
+    return possession_changes(match_events, team_id)
 
-    
-    # Initialize an empty list to store changes
-    changes_list = []
+def possession_changes(match_events, team_id):
+    """
+    Derive ball possession changes from already loaded match events.
 
-    # Start with the first row
-    previous_team = match_events.iloc[0]['ball_owning_team']
-    previous_match_id = match_events.iloc[0]['match_id']
-    previous_timestamp = match_events.iloc[0]['timestamp']
+    This is the database-free part of `calculate_ball_possession`, shared with
+    the async data-access layer.
 
-    # Add the first row as the starting point
-    changes_list.append({
-        'match_id': previous_match_id,
-        'team_id': previous_team,
-        'timestamp': previous_timestamp
-    })
+    Args:
+        match_events (pd.DataFrame): Events as returned by `fetch_match_events`.
+        team_id (int): The team whose possession is being calculated.
 
-    # Iterate over the rows of match_events
-    for _, row in match_events.iterrows():
-        current_team = row['ball_owning_team']
-        # Unused variable removed
-        current_timestamp = row['timestamp']
-
-        # Check if the ball_owning_team has changed
-        if current_team != previous_team:
-            # Append the change to the list
-            changes_list.append({
-                'match_id': previous_match_id,
-                'team_id': current_team,
-                'timestamp': current_timestamp
-            })
-            # Update the previous team
-            previous_team = current_team
+    Returns:
+        pandas.DataFrame: The possession changes, see `calculate_ball_possession`.
+    """
+    # A change point is every row whose owning team differs from the row before;
+    # the first row is always the starting point.
+    owning_team = match_events['ball_owning_team']
+    is_change = owning_team.ne(owning_team.shift())
+    is_change.iloc[0] = True
+    change_rows = match_events[is_change.to_numpy()]
 
     # Create the changes dataframe
-    changes = pd.DataFrame(changes_list)
+    changes = pd.DataFrame({
+        'match_id': match_events.iloc[0]['match_id'],
+        'team_id': change_rows['ball_owning_team'].to_numpy(),
+        'timestamp': change_rows['seconds'].to_numpy(),
+    })
 
     # Add ball_possession column
     changes['ball_possession'] = (changes['team_id'] == team_id).astype(int)
@@ -204,9 +227,9 @@ def calculate_ball_possession(match_id, conn, team_id):
     # Add end_time column as the timestamp of the next row
     changes['end_time'] = changes['timestamp'].shift(-1)
 
-    # Ensure timestamp and end_time are in datetime format, coercing errors to NaT
-    changes['timestamp'] = pd.to_timedelta(changes['timestamp'])
-    changes['end_time'] = pd.to_timedelta(changes['end_time'])
+    # Convert the numeric seconds to timedeltas once, for the whole column
+    changes['timestamp'] = pd.to_timedelta(changes['timestamp'], unit='s')
+    changes['end_time'] = pd.to_timedelta(changes['end_time'], unit='s')
 
     # Calculate the time difference between timestamp and end_time
     changes['time_difference'] = changes['end_time'] - changes['timestamp']
@@ -0,0 +1,205 @@
+"""
+Timing spans for the load -> interpolate -> render -> encode pipeline.
+
+Wrap a stage in `with span("db.fetch", rows=...)` or decorate it with
+`@timed("interpolate")`. Every span is added to an in-process summary
+(`summary()` / `print_summary()`), and optionally written out as:
+
+- JSON lines, one object per finished span (SOCCER_TRACE_JSONL=path)
+- a Chrome trace file for chrome://tracing or Perfetto (SOCCER_TRACE_CHROME=path)
+- cProfile stats for selected stages (SOCCER_PROFILE=render.frame,interpolate).
+  Append ':N' to a stage to only profile every Nth span of it, e.g.
+  SOCCER_PROFILE=render.frame:25. The stats are written to
+  SOCCER_PROFILE_DIR (default: the working directory) as <stage>.prof.
+
+The environment variables are read on import; `configure()` does the same
+from code. Output files are written when the process exits, or on `flush()`.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_lock = threading.Lock()
+_config = {"jsonl": None, "chrome_trace": None, "profile": {}, "profile_dir": Path(".")}
+_jsonl_file = None
+_events = []
+_totals = {}
+_profilers = {}
+_profile_counts = {}
+_origin_us = time.time() * 1e6 - time.perf_counter() * 1e6
+
+
+def _parse_profile_stages(stages):
+    """'a,b:10' or ['a', 'b:10'] -> {'a': 1, 'b': 10}"""
+    if not stages:
+        return {}
+    if isinstance(stages, str):
+        stages = stages.split(",")
+    parsed = {}
+    for stage in stages:
+        name, _, every = stage.strip().partition(":")
+        if name:
+            parsed[name] = max(1, int(every)) if every else 1
+    return parsed
+
+
+def configure(jsonl=None, chrome_trace=None, profile=None, profile_dir=None):
+    """
+    Choose where span timings go.
+
+    Args:
+        jsonl (str, optional): File to append one JSON object per span to.
+        chrome_trace (str, optional): File to write a Chrome trace to on flush/exit.
+        profile (str or list, optional): Stages to run under cProfile, 'stage' or 'stage:N'.
+        profile_dir (str, optional): Directory for the <stage>.prof files.
+    """
+    global _jsonl_file
+    with _lock:
+        if _jsonl_file is not None:
+            _jsonl_file.close()
+            _jsonl_file = None
+        _config["jsonl"] = jsonl
+        _config["chrome_trace"] = chrome_trace
+        _config["profile"] = _parse_profile_stages(profile)
+        if profile_dir:
+            _config["profile_dir"] = Path(profile_dir)
+        if jsonl:
+            _jsonl_file = open(jsonl, "a", buffering=1)
+
+
+def _start_profiler(name):
+    """The stage's profiler, enabled, when this span should be profiled"""
+    every = _config["profile"].get(name)
+    if every is None:
+        return None
+    with _lock:
+        count = _profile_counts.get(name, 0)
+        _profile_counts[name] = count + 1
+        if count % every:
+            return None
+        profiler = _profilers.setdefault(name, cProfile.Profile())
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active (nested or concurrent profiled span)
+        return None
+    return profiler
+
+
+def record_span(name, start, duration, **attrs):
+    """
+    Record a span that was timed elsewhere, e.g. between two callbacks.
+
+    Args:
+        name (str): The stage name.
+        start (float): `time.perf_counter()` at the start of the span.
+        duration (float): Duration in seconds.
+    """
+    thread = threading.current_thread()
+    with _lock:
+        total = _totals.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        total["count"] += 1
+        total["total_s"] += duration
+        total["max_s"] = max(total["max_s"], duration)
+
+        if _jsonl_file is None and not _config["chrome_trace"]:
+            return
+        ts_us = _origin_us + start * 1e6
+        if _jsonl_file is not None:
+            _jsonl_file.write(json.dumps({
+                "name": name, "ts_us": round(ts_us), "duration_ms": round(duration * 1000, 3),
+                "pid": os.getpid(), "thread": thread.name, **attrs,
+            }, default=str) + "\n")
+        if _config["chrome_trace"]:
+            _events.append({
+                "name": name, "cat": name.split(".")[0], "ph": "X",
+                "ts": ts_us, "dur": duration * 1e6,
+                "pid": os.getpid(), "tid": thread.ident, "args": attrs,
+            })
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block of code as one span of stage `name`.
+
+    The yielded dict holds the span attributes, so values only known inside
+    the block can still be recorded: `with span("db.fetch") as s: s["rows"] = len(df)`.
+    """
+    profiler = _start_profiler(name)
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        duration = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        record_span(name, start, duration, **attrs)
+
+
+def timed(name=None):
+    """Decorator version of `span`, named after the function by default"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary():
+    """
+    Totals per stage since the process started.
+
+    Returns:
+        dict: {stage: {'count', 'total_s', 'mean_s', 'max_s'}}, slowest stage first.
+    """
+    with _lock:
+        totals = {name: dict(t) for name, t in _totals.items()}
+    for t in totals.values():
+        t["mean_s"] = t["total_s"] / t["count"]
+    return dict(sorted(totals.items(), key=lambda item: item[1]["total_s"], reverse=True))
+
+
+def print_summary():
+    stages = summary()
+    if not stages:
+        return
+    print(f"{'stage':<24}{'count':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}")
+    for name, t in stages.items():
+        print(f"{name:<24}{t['count']:>8}{t['total_s']:>10.3f}{t['mean_s'] * 1000:>10.2f}{t['max_s'] * 1000:>10.2f}")
+
+
+def flush():
+    """Write the Chrome trace and the cProfile stats collected so far"""
+    with _lock:
+        chrome_trace = _config["chrome_trace"]
+        events = list(_events)
+        profilers = dict(_profilers)
+    if chrome_trace:
+        with open(chrome_trace, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    for name, profiler in profilers.items():
+        out_dir = _config["profile_dir"]
+        out_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(out_dir / f"{name}.prof"))
+    if _jsonl_file is not None:
+        _jsonl_file.flush()
+
+
+configure(
+    jsonl=os.getenv("SOCCER_TRACE_JSONL"),
+    chrome_trace=os.getenv("SOCCER_TRACE_CHROME"),
+    profile=os.getenv("SOCCER_PROFILE"),
+    profile_dir=os.getenv("SOCCER_PROFILE_DIR"),
+)
+atexit.register(flush)
@@ -0,0 +1,268 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+from scipy.signal import savgol_filter
+
+from helperfunctions import get_database_connection, fetch_tracking_data
+
+# Tracking coordinates are stored as percentages of the pitch
+PITCH_LENGTH = 105.0
+PITCH_WIDTH = 68.0
+FRAME_RATE = 25
+
+# Speed thresholds in m/s (19.8 km/h and 25.2 km/h)
+HIGH_INTENSITY_SPEED = 5.5
+SPRINT_SPEED = 7.0
+# An effort only counts when the player stays above the threshold this long
+MIN_EFFORT_SECONDS = 1.0
+
+SUMMARY_TABLE = "player_kinematics"
+SUMMARY_COLUMNS = [
+    "match_id", "player_id", "team_id", "frames", "minutes", "distance_m",
+    "high_intensity_distance_m", "sprint_distance_m", "max_speed_ms",
+    "max_acceleration_ms2", "max_deceleration_ms2", "high_intensity_runs", "sprints",
+]
+
+
+def _segment_starts(player_ids, frame_ids, period_ids=None):
+    """Boolean mask of rows that start a new contiguous run of one player's frames within a period."""
+    starts = np.ones(len(player_ids), dtype=bool)
+    if len(player_ids) > 1:
+        same_player = player_ids[1:] == player_ids[:-1]
+        consecutive = np.diff(frame_ids) == 1
+        if period_ids is not None:
+            # Frame ids may restart every period
+            consecutive &= period_ids[1:] == period_ids[:-1]
+        starts[1:] = ~(same_player & consecutive)
+    return starts
+
+
+def _smooth_segment(x, y, dt, window, polyorder):
+    """Smoothed position, velocity and acceleration for one contiguous segment."""
+    n = len(x)
+    if n >= window:
+        xs = savgol_filter(x, window, polyorder)
+        ys = savgol_filter(y, window, polyorder)
+        vx = savgol_filter(x, window, polyorder, deriv=1, delta=dt)
+        vy = savgol_filter(y, window, polyorder, deriv=1, delta=dt)
+        speed = np.hypot(vx, vy)
+        acc = savgol_filter(speed, window, polyorder, deriv=1, delta=dt)
+    elif n >= 2:
+        # Too short for the filter, fall back to plain finite differences
+        xs, ys = x, y
+        vx = np.gradient(x, dt)
+        vy = np.gradient(y, dt)
+        speed = np.hypot(vx, vy)
+        acc = np.gradient(speed, dt)
+    else:
+        xs, ys = x, y
+        vx = vy = speed = acc = np.zeros(n)
+    return xs, ys, vx, vy, speed, acc
+
+
+def compute_kinematics(tracking_df, frame_rate=FRAME_RATE, window=7, polyorder=2):
+    """
+    Derive smoothed per-frame kinematics for every player in a tracking DataFrame.
+
+    The rows are sorted into one contiguous array per player and period and
+    split wherever the period changes or the frame_id jumps, so the
+    Savitzky-Golay filter never smooths across a gap or the half-time break.
+
+    Args:
+        tracking_df (pd.DataFrame): Tracking data with player_id, period_id, frame_id, x and y
+            (x and y as percentages of the pitch). The ball is ignored.
+        frame_rate (int): Frames per second of the tracking data.
+        window (int): Savitzky-Golay window length in frames (odd).
+        polyorder (int): Savitzky-Golay polynomial order.
+
+    Returns:
+        pd.DataFrame: One row per player frame with x_m, y_m, vx, vy, speed (m/s),
+            acceleration (m/s^2), step distance and cumulative distance (m).
+    """
+    df = tracking_df[tracking_df["player_id"] != "ball"]
+    order = [c for c in ("player_id", "period_id", "frame_id") if c in df.columns]
+    df = df.sort_values(order, kind="stable").reset_index(drop=True)
+
+    player_ids = df["player_id"].to_numpy()
+    frame_ids = df["frame_id"].to_numpy()
+    period_ids = df["period_id"].to_numpy() if "period_id" in df.columns else None
+    x = df["x"].to_numpy(dtype=np.float64) * PITCH_LENGTH / 100
+    y = df["y"].to_numpy(dtype=np.float64) * PITCH_WIDTH / 100
+    dt = 1.0 / frame_rate
+
+    n = len(df)
+    xs, ys, vx, vy, speed, acc = (np.empty(n) for _ in range(6))
+    starts = _segment_starts(player_ids, frame_ids, period_ids)
+    bounds = np.append(np.flatnonzero(starts), n)
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        segment = slice(begin, end)
+        (xs[segment], ys[segment], vx[segment], vy[segment],
+         speed[segment], acc[segment]) = _smooth_segment(x[segment], y[segment], dt, window, polyorder)
+
+    # Distance covered between consecutive frames, zero at the start of a segment
+    step = np.zeros(n)
+    if n > 1:
+        step[1:] = np.hypot(np.diff(xs), np.diff(ys))
+    step[starts] = 0.0
+
+    out = df[[c for c in ("match_id", "game_id", "player_id", "team_id", "period_id", "frame_id") if c in df.columns]].copy()
+    out["segment_start"] = starts
+    out["x_m"] = xs
+    out["y_m"] = ys
+    out["vx"] = vx
+    out["vy"] = vy
+    out["speed"] = speed
+    out["acceleration"] = acc
+    out["step_distance"] = step
+    out["distance"] = out.groupby("player_id", sort=False, observed=True)["step_distance"].cumsum()
+    return out
+
+
+def _count_efforts(kin, threshold, min_frames):
+    """Count runs above a speed threshold lasting at least min_frames, per player."""
+    above = kin["speed"].to_numpy() >= threshold
+    previous = np.r_[False, above[:-1]]
+    run_start = above & (~previous | kin["segment_start"].to_numpy())
+    run_id = np.cumsum(run_start) * above
+    lengths = np.bincount(run_id)[1:]
+    run_players = kin["player_id"].to_numpy()[run_start]
+    runs = pd.Series(lengths >= min_frames, index=run_players)
+    return runs.groupby(level=0).sum()
+
+
+def summarize_kinematics(kin, match_id=None, frame_rate=FRAME_RATE):
+    """
+    Reduce per-frame kinematics to one summary row per player.
+
+    Args:
+        kin (pd.DataFrame): Output of compute_kinematics.
+        match_id (str, optional): Match id stored in the summary.
+        frame_rate (int): Frames per second of the tracking data.
+
+    Returns:
+        pd.DataFrame: A compact summary with the columns in SUMMARY_COLUMNS.
+    """
+    if kin.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    if "team_id" not in kin.columns:
+        kin = kin.assign(team_id=None)
+    speed = kin["speed"]
+    kin = kin.assign(
+        hi_step=kin["step_distance"].where(speed >= HIGH_INTENSITY_SPEED, 0.0),
+        sprint_step=kin["step_distance"].where(speed >= SPRINT_SPEED, 0.0),
+    )
+    grouped = kin.groupby("player_id", sort=True, observed=True)
+    summary = grouped.agg(
+        team_id=("team_id", "first"),
+        frames=("frame_id", "size"),
+        distance_m=("step_distance", "sum"),
+        high_intensity_distance_m=("hi_step", "sum"),
+        sprint_distance_m=("sprint_step", "sum"),
+        max_speed_ms=("speed", "max"),
+        max_acceleration_ms2=("acceleration", "max"),
+        max_deceleration_ms2=("acceleration", "min"),
+    )
+    summary["minutes"] = summary["frames"] / frame_rate / 60
+
+    min_frames = int(round(MIN_EFFORT_SECONDS * frame_rate))
+    summary["high_intensity_runs"] = _count_efforts(kin, HIGH_INTENSITY_SPEED, min_frames)
+    summary["sprints"] = _count_efforts(kin, SPRINT_SPEED, min_frames)
+    summary[["high_intensity_runs", "sprints"]] = summary[["high_intensity_runs", "sprints"]].fillna(0).astype(np.int32)
+
+    summary = summary.reset_index()
+    summary["match_id"] = match_id
+    float_cols = summary.select_dtypes("float64").columns
+    summary[float_cols] = summary[float_cols].astype(np.float32)
+    summary["frames"] = summary["frames"].astype(np.int32)
+    return summary[SUMMARY_COLUMNS]
+
+
+def match_kinematics(match_id, conn=None):
+    """
+    Load the tracking data of one match and summarize its player kinematics.
+
+    Args:
+        match_id (str): The ID of the match.
+        conn (psycopg2.extensions.connection, optional): An open connection.
+            A new connection is opened (and closed) when not provided, which
+            is what the worker processes do.
+
+    Returns:
+        pd.DataFrame: The per-player summary of the match.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_database_connection()
+    try:
+        tracking_df = fetch_tracking_data(match_id, conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+    return summarize_kinematics(compute_kinematics(tracking_df), match_id=match_id)
+
+
+def summarize_matches(match_ids, max_workers=None):
+    """
+    Summarize player kinematics for many matches in parallel.
+
+    Every match is loaded and processed in its own worker process.
+
+    Args:
+        match_ids (list): The IDs of the matches to process.
+        max_workers (int, optional): Number of worker processes.
+
+    Returns:
+        pd.DataFrame: The summaries of all matches concatenated.
+    """
+    match_ids = list(match_ids)
+    if not match_ids:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        summaries = list(executor.map(match_kinematics, match_ids))
+    return pd.concat(summaries, ignore_index=True)
+
+
+def write_summary_table(summary, conn, table=SUMMARY_TABLE):
+    """
+    Write kinematics summaries to the database, replacing earlier rows of the same matches.
+
+    Args:
+        summary (pd.DataFrame): Output of summarize_kinematics or summarize_matches.
+        conn (psycopg2.extensions.connection): The database connection object.
+        table (str): Name of the summary table.
+    """
+    if conn is None:
+        raise ValueError("Database connection 'conn' must be provided.")
+    if summary.empty:
+        return
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            match_id TEXT NOT NULL,
+            player_id TEXT NOT NULL,
+            team_id TEXT,
+            frames INTEGER,
+            minutes REAL,
+            distance_m REAL,
+            high_intensity_distance_m REAL,
+            sprint_distance_m REAL,
+            max_speed_ms REAL,
+            max_acceleration_ms2 REAL,
+            max_deceleration_ms2 REAL,
+            high_intensity_runs INTEGER,
+            sprints INTEGER,
+            PRIMARY KEY (match_id, player_id)
+        );
+        """)
+        cur.execute(f"DELETE FROM {table} WHERE match_id = ANY(%s);",
+                    (list(summary["match_id"].unique()),))
+        rows = summary[SUMMARY_COLUMNS].astype(object).where(summary[SUMMARY_COLUMNS].notna(), None)
+        execute_values(cur, f"INSERT INTO {table} ({', '.join(SUMMARY_COLUMNS)}) VALUES %s",
+                       rows.itertuples(index=False, name=None))
+    conn.commit()
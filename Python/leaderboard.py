@@ -0,0 +1,372 @@
+"""
+Per-player contribution leaderboards over any set of matches.
+
+From the SPADL actions of the matches every player gets:
+
+- xt: expected threat added by successful passes and carries, the xT of the
+  cell the ball ends in minus that of the cell it started in
+- vaep: the VAEP rating (Decroos et al.), the change in the team's chance of
+  scoring minus the change in its chance of conceding, split into an
+  offensive and a defensive part
+- passes, passes_completed and pass_completion
+- carries and progressive_carries
+- minutes on the pitch, counted from the player's tracking frames, and the
+  per 90 minutes values of PER_90_COLUMNS
+
+There is no trained VAEP model in this project: by default the chances of
+scoring and conceding are read from the match's xT grid (see
+action_probabilities). A trained model plugs in through `probabilities`.
+
+All actions are valued with array operations and all players of all matches
+are aggregated in one groupby. The per-match rows are cached by match_runner
+(analysis 'player_contributions'), so a season leaderboard only computes the
+matches it has not seen before:
+
+    python leaderboard.py --team ajax --sort vaep --min-minutes 270
+    python leaderboard.py --all --cache leaderboard_cache --top 25
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from kinematics import FRAME_RATE
+from match_summaries import PASS_TYPES, PITCH_LENGTH, PITCH_WIDTH, SHOT_TYPES, xt_grid
+
+ANALYSIS_NAME = "player_contributions"
+DEFAULT_CACHE_DIR = "leaderboard_cache"
+
+CARRY_TYPE = 21
+MOVE_TYPES = PASS_TYPES + [CARRY_TYPE]
+
+# A carry is progressive when it ends this much closer to the goal, or in the box
+PROGRESSIVE_METERS = 10.0
+BOX_LENGTH = 16.5
+BOX_HALF_WIDTH = 20.16
+
+CONTRIBUTION_COLUMNS = [
+    "match_id", "player_id", "team_id", "minutes", "actions", "xt", "vaep",
+    "vaep_offensive", "vaep_defensive", "passes", "passes_completed",
+    "carries", "progressive_carries",
+]
+SUM_COLUMNS = CONTRIBUTION_COLUMNS[3:]
+PER_90_COLUMNS = ["xt", "vaep", "passes_completed", "progressive_carries"]
+
+
+def _match_column(actions):
+    """spadl_actions calls the match id game_id"""
+    return "match_id" if "match_id" in actions.columns else "game_id"
+
+
+def attacking_right(actions):
+    """
+    Whether the team of every action attacks towards x = 105 in that period.
+
+    Event coordinates are not normalized to one playing direction; the side
+    a team attacks follows from where it and its opponent shoot from. Without
+    shots the team that plays most of its actions further left attacks right.
+
+    Returns:
+        np.ndarray: One boolean per action.
+    """
+    keys = [actions[_match_column(actions)], actions["period_id"]]
+    team_keys = keys + [actions["team_id"]]
+    start_x = actions["start_x"].astype(np.float64)
+    is_shot = actions["action_type"].isin(SHOT_TYPES)
+    # +1 for a shot from the right half, -1 for one from the left half
+    votes = np.sign(start_x - PITCH_LENGTH / 2).where(is_shot, 0.0).fillna(0.0)
+    own = votes.groupby(team_keys, sort=False, dropna=False).transform("sum")
+    everyone = votes.groupby(keys, sort=False, dropna=False).transform("sum")
+    # The opponents' shots count the other way: own votes minus theirs
+    shot_votes = (2 * own - everyone).to_numpy()
+    further_left = (start_x.groupby(keys, sort=False, dropna=False).transform("mean")
+                    - start_x.groupby(team_keys, sort=False, dropna=False).transform("mean")).to_numpy()
+    return np.where(shot_votes != 0, shot_votes > 0, ~(further_left < 0))
+
+
+def normalize_direction(actions):
+    """The actions with coordinates mirrored so that every team attacks towards x = 105"""
+    flip = ~attacking_right(actions)
+    actions = actions.copy()
+    for x_col, y_col in (("start_x", "start_y"), ("end_x", "end_y")):
+        actions[x_col] = np.where(flip, PITCH_LENGTH - actions[x_col], actions[x_col])
+        actions[y_col] = np.where(flip, PITCH_WIDTH - actions[y_col], actions[y_col])
+    return actions
+
+
+def _grid_values(grids, match_codes, x, y):
+    """The xT of the cell of every point, each from the grid of its own match"""
+    grid_size = grids.shape[1]
+    located = ~(np.isnan(x) | np.isnan(y))
+    x_idx = np.clip((np.nan_to_num(x) / PITCH_LENGTH * grid_size).astype(np.int64), 0, grid_size - 1)
+    y_idx = np.clip((np.nan_to_num(y) / PITCH_WIDTH * grid_size).astype(np.int64), 0, grid_size - 1)
+    return np.where(located, grids[match_codes, y_idx, x_idx], 0.0)
+
+
+def action_probabilities(actions, grids, match_codes):
+    """
+    Chances of scoring and conceding after every action, read from xT grids.
+
+    The stand-in for a trained VAEP model: after a successful action the team
+    has the ball where the action ended and scores with the xT of that cell;
+    after a failed one the opponents have it there and the team concedes
+    with the xT of the mirrored cell. The grids are rescaled to run from 0 to
+    1, the chance of a goal.
+
+    Args:
+        actions (pd.DataFrame): Actions normalized with normalize_direction.
+        grids (np.ndarray): One xT grid per match, [match, y cell, x cell].
+        match_codes (np.ndarray): The index into grids of every action.
+
+    Returns:
+        tuple: (scores, concedes) arrays, one value per action.
+    """
+    end_x = actions["end_x"].to_numpy(dtype=np.float64)
+    end_y = actions["end_y"].to_numpy(dtype=np.float64)
+    success = actions["result"].fillna(0).to_numpy() == 1
+    goal = success & actions["action_type"].isin(SHOT_TYPES).to_numpy()
+    # Rescaled to 0 in the match's least and 1 in its most threatening cell
+    low = grids.min(axis=(1, 2), keepdims=True)
+    span = np.ptp(grids, axis=(1, 2), keepdims=True)
+    chances = np.divide(grids - low, span, out=np.zeros_like(grids), where=span > 0)
+    kept = _grid_values(chances, match_codes, end_x, end_y)
+    lost = _grid_values(chances, match_codes, PITCH_LENGTH - end_x, PITCH_WIDTH - end_y)
+    scores = np.where(goal, 1.0, np.where(success, kept, 0.0))
+    concedes = np.where(success, 0.0, lost)
+    return scores, concedes
+
+
+def vaep_values(actions, scores, concedes):
+    """
+    The VAEP formula on per-action chances of scoring and conceding.
+
+    The chances before an action are those after the previous action of the
+    same match and period, swapped when the other team made it; they start
+    at 0 at kick-off and again after a goal.
+
+    Args:
+        actions (pd.DataFrame): Actions with period_id, seconds and team_id.
+        scores (np.ndarray): Chance that the acting team scores after each action.
+        concedes (np.ndarray): Chance that it concedes after each action.
+
+    Returns:
+        pd.DataFrame: 'vaep_offensive', 'vaep_defensive' and 'vaep' per action.
+    """
+    match_codes = pd.factorize(actions[_match_column(actions)])[0]
+    period_ids = actions["period_id"].to_numpy()
+    sort_keys = [actions["seconds"].to_numpy(dtype=np.float64), period_ids, match_codes]
+    if "id" in actions.columns:
+        sort_keys.insert(0, actions["id"].to_numpy())
+    order = np.lexsort(sort_keys)
+
+    m, p = match_codes[order], period_ids[order]
+    team = actions["team_id"].to_numpy()[order]
+    s, c = scores[order], concedes[order]
+    goal = (actions["result"].fillna(0).to_numpy() == 1) & actions["action_type"].isin(SHOT_TYPES).to_numpy()
+
+    prev_scores = np.zeros(len(order))
+    prev_concedes = np.zeros(len(order))
+    continues = (m[1:] == m[:-1]) & (p[1:] == p[:-1]) & ~goal[order][:-1]
+    same_team = team[1:] == team[:-1]
+    prev_scores[1:] = np.where(continues, np.where(same_team, s[:-1], c[:-1]), 0.0)
+    prev_concedes[1:] = np.where(continues, np.where(same_team, c[:-1], s[:-1]), 0.0)
+
+    offensive = np.empty(len(order))
+    defensive = np.empty(len(order))
+    offensive[order] = s - prev_scores
+    defensive[order] = -(c - prev_concedes)
+    return pd.DataFrame({"vaep_offensive": offensive, "vaep_defensive": defensive,
+                         "vaep": offensive + defensive}, index=actions.index)
+
+
+def _distance_to_goal(x, y):
+    return np.hypot(PITCH_LENGTH - x, PITCH_WIDTH / 2 - y)
+
+
+def _in_box(x, y):
+    return (x >= PITCH_LENGTH - BOX_LENGTH) & (np.abs(y - PITCH_WIDTH / 2) <= BOX_HALF_WIDTH)
+
+
+def player_contributions(actions, presence=None, grids=None, probabilities=None, frame_rate=FRAME_RATE):
+    """
+    Per match and player: xT, VAEP, passes, carries and minutes.
+
+    Args:
+        actions (pd.DataFrame): SPADL actions of one or many matches, as
+            returned by the 'match_actions' statement (match_id or game_id).
+        presence (pd.DataFrame, optional): Tracked frames per match and
+            player, the 'tracking_presence' statement plus a match_id column.
+            Players without actions are listed too; without it minutes are NaN.
+        grids (dict, optional): xT grid per match id, indexed [y cell, x cell]
+            with every team attacking towards x = 105. Built from the match's
+            own actions with match_summaries.xt_grid when not given.
+        probabilities (callable, optional): Takes the direction-normalized
+            actions and returns (scores, concedes) arrays, e.g. from a trained
+            VAEP model. The xT grids are used when not given.
+        frame_rate (int): Frames per second of the tracking data.
+
+    Returns:
+        pd.DataFrame: The columns of CONTRIBUTION_COLUMNS, one row per match and player.
+    """
+    match_col = _match_column(actions)
+    actions = normalize_direction(actions.rename(columns={match_col: "match_id"}))
+    match_codes, match_ids = pd.factorize(actions["match_id"])
+    grids = dict(grids or {})
+    for match_id in match_ids:
+        if match_id not in grids:
+            grids[match_id] = xt_grid(actions[actions["match_id"] == match_id])
+    stacked = np.stack([grids[match_id] for match_id in match_ids]) if len(match_ids) else np.zeros((0, 1, 1))
+
+    def values(x_col, y_col):
+        return _grid_values(stacked, match_codes, actions[x_col].to_numpy(dtype=np.float64),
+                            actions[y_col].to_numpy(dtype=np.float64))
+
+    success = actions["result"].fillna(0).to_numpy() == 1
+    action_type = actions["action_type"]
+    moved = action_type.isin(MOVE_TYPES).to_numpy() & success
+    is_pass = action_type.isin(PASS_TYPES).to_numpy()
+    carry = (action_type == CARRY_TYPE).to_numpy() & success
+
+    if probabilities is None:
+        scores, concedes = action_probabilities(actions, stacked, match_codes)
+    else:
+        scores, concedes = probabilities(actions)
+    vaep = vaep_values(actions, np.asarray(scores, dtype=np.float64), np.asarray(concedes, dtype=np.float64))
+
+    start_x, start_y = actions["start_x"].to_numpy(dtype=np.float64), actions["start_y"].to_numpy(dtype=np.float64)
+    end_x, end_y = actions["end_x"].to_numpy(dtype=np.float64), actions["end_y"].to_numpy(dtype=np.float64)
+    gained = _distance_to_goal(start_x, start_y) - _distance_to_goal(end_x, end_y)
+    progressive = carry & ((gained >= PROGRESSIVE_METERS) | (_in_box(end_x, end_y) & ~_in_box(start_x, start_y)))
+
+    rows = pd.DataFrame({
+        "match_id": actions["match_id"],
+        "player_id": actions["player_id"],
+        "team_id": actions["team_id"],
+        "actions": 1,
+        "xt": np.where(moved, values("end_x", "end_y") - values("start_x", "start_y"), 0.0),
+        "vaep": vaep["vaep"],
+        "vaep_offensive": vaep["vaep_offensive"],
+        "vaep_defensive": vaep["vaep_defensive"],
+        "passes": is_pass.astype(np.int64),
+        "passes_completed": (is_pass & success).astype(np.int64),
+        "carries": carry.astype(np.int64),
+        "progressive_carries": progressive.astype(np.int64),
+    })
+    rows = rows[rows["player_id"].notna()]
+    summed = [c for c in SUM_COLUMNS if c != "minutes"]
+    result = rows.groupby(["match_id", "player_id"], sort=False, observed=True).agg(
+        team_id=("team_id", "first"), **{c: (c, "sum") for c in summed})
+
+    if presence is not None and not presence.empty:
+        minutes = presence.assign(minutes=presence["frames"] / frame_rate / 60)
+        minutes = minutes.set_index(["match_id", "player_id"])[["team_id", "minutes"]]
+        result = result.join(minutes, how="outer", rsuffix="_tracked")
+        result["team_id"] = result["team_id"].fillna(result.pop("team_id_tracked"))
+        result[summed] = result[summed].fillna(0)
+    else:
+        result["minutes"] = np.nan
+    result = result.reset_index().reindex(columns=CONTRIBUTION_COLUMNS)
+    count_columns = ["actions", "passes", "passes_completed", "carries", "progressive_carries"]
+    result[count_columns] = result[count_columns].astype(np.int64)
+    return result
+
+
+def leaderboard(contributions, per_90=True, min_minutes=0, sort_by="vaep"):
+    """
+    Sum per-match contributions into one row per player.
+
+    Args:
+        contributions (pd.DataFrame): Rows of player_contributions, any number of matches.
+        per_90 (bool): Add '<column>_p90' for the columns of PER_90_COLUMNS.
+        min_minutes (float): Leave out players with fewer minutes; players
+            without tracking have no minutes and are left out when this is set.
+        sort_by (str): Column to rank by, highest first.
+
+    Returns:
+        pd.DataFrame: One row per player with team_id, matches, the summed
+            columns and pass_completion, ranked by `sort_by`.
+    """
+    columns = ["player_id", "team_id", "matches"] + SUM_COLUMNS + ["pass_completion"]
+    if per_90:
+        columns += [f"{c}_p90" for c in PER_90_COLUMNS]
+    if contributions.empty:
+        return pd.DataFrame(columns=columns)
+
+    # The team of the player's latest match
+    board = contributions.groupby("player_id", sort=False).agg(
+        team_id=("team_id", "last"),
+        matches=("match_id", "nunique"),
+        **{c: (c, "sum") for c in SUM_COLUMNS},
+    )
+    # Minutes sum to 0 when no match was tracked
+    tracked = contributions["minutes"].notna().groupby(contributions["player_id"]).any()
+    board["minutes"] = board["minutes"].where(tracked.reindex(board.index))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        board["pass_completion"] = np.where(board["passes"] > 0, board["passes_completed"] / board["passes"], np.nan)
+        if per_90:
+            minutes = board["minutes"].where(board["minutes"] > 0)
+            for c in PER_90_COLUMNS:
+                board[f"{c}_p90"] = board[c] / minutes * 90
+    if min_minutes:
+        board = board[board["minutes"] >= min_minutes]
+    board = board.sort_values(sort_by, ascending=False, na_position="last", kind="stable")
+    return board.reset_index().reindex(columns=columns)
+
+
+def season_leaderboard(match_ids, cache_dir=DEFAULT_CACHE_DIR, workers=None, db_config=None, force=False,
+                       **options):
+    """
+    The leaderboard of a set of matches, computing only the matches not in the cache.
+
+    Args:
+        match_ids (list): The matches, e.g. a season.
+        cache_dir (str or Path): Where match_runner keeps the per-match rows.
+        workers (int, optional): Number of worker processes for new matches.
+        db_config (dict, optional): Connection parameters, read from the environment when not given.
+        force (bool): Compute every match again.
+        **options: per_90, min_minutes and sort_by, see leaderboard.
+
+    Returns:
+        tuple: (leaderboard DataFrame, list of (analysis, match_id, error) of failed matches).
+    """
+    # match_runner registers the per-match analysis from this module
+    from match_runner import run_analyses
+
+    results = run_analyses([ANALYSIS_NAME], match_ids, cache_dir, db_config=db_config,
+                           workers=workers, force=force)
+    return leaderboard(results[ANALYSIS_NAME], **options), results["failed"]
+
+
+if __name__ == "__main__":
+    from connection_pool import get_manager
+    from match_runner import select_matches
+    from roster import get_roster
+
+    parser = argparse.ArgumentParser(description="Rank players by their contributions over a set of matches")
+    parser.add_argument("--matches", nargs="*", default=None, help="Match ids to include")
+    parser.add_argument("--team", default=None, help="Every match of teams whose name contains this text")
+    parser.add_argument("--all", action="store_true", help="Every match in the database")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Directory of the per-match cache")
+    parser.add_argument("--sort", default="vaep", help="Column to rank by, e.g. xt or vaep_p90")
+    parser.add_argument("--min-minutes", type=float, default=0)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Recompute cached matches")
+    parser.add_argument("--csv", default=None, help="Also write the full leaderboard here")
+    args = parser.parse_args()
+
+    if not (args.matches or args.team or args.all):
+        parser.error("give --matches, --team or --all")
+    with get_manager().connection() as conn:
+        match_ids = select_matches(conn, args.matches, args.team)
+        names = get_roster(conn)["player_name"]
+
+    board, failed = season_leaderboard(match_ids, args.cache, workers=args.workers, force=args.force,
+                                       min_minutes=args.min_minutes, sort_by=args.sort)
+    board.insert(1, "player_name", board["player_id"].map(names))
+    if args.csv:
+        board.to_csv(args.csv, index=False)
+    print(f"{len(match_ids)} matches, {len(board)} players")
+    print(board.head(args.top).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    for name, match_id, error in failed:
+        print(f"failed: {match_id}: {error}")
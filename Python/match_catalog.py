@@ -0,0 +1,133 @@
+"""
+Paginated catalog of matches, searchable by team name.
+
+Pages are fetched with keyset pagination on match_id: a page is "the next
+`page_size` matches after this match_id", which costs the same for the first
+page as for the thousandth, unlike LIMIT/OFFSET or loading every match.
+Team name search uses a parameterized ILIKE that a pg_trgm GIN index on
+teams.team_name answers without scanning the table; `ensure_catalog_indexes`
+creates that index.
+
+Fetched pages are kept in a small in-process LRU cache, so paging back and
+forth or retyping a search does not go back to the database.
+
+    catalog = MatchCatalog(page_size=10)
+    page = catalog.page()                               # first page
+    page = catalog.page(after=page["next_cursor"])      # next page
+    page = catalog.page(search="ajax")                  # matches of teams named like 'ajax'
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from connection_pool import get_manager
+from statements import run
+
+CATALOG_INDEXES = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_teams_name_trgm ON teams USING gin (team_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_matches_home_team ON matches (home_team_id, match_id);
+CREATE INDEX IF NOT EXISTS idx_matches_away_team ON matches (away_team_id, match_id);
+"""
+
+# Pages are reloaded after this many seconds, new matches show up without a restart
+CATALOG_MAX_AGE = 5 * 60
+
+
+def team_name_pattern(text):
+    """
+    The ILIKE pattern matching team names that contain `text`.
+
+    The LIKE wildcards in the text itself are escaped, so a search for '100%'
+    does not match everything.
+    """
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def ensure_catalog_indexes(conn):
+    """Create the trigram index on team names and the match lookup indexes (PostgreSQL)"""
+    with conn.cursor() as cur:
+        cur.execute(CATALOG_INDEXES)
+    conn.commit()
+
+
+class MatchCatalog:
+    """
+    Keyset-paginated, cached access to the matches table.
+
+    Every page is a dict with the page's matches as a DataFrame ('matches'),
+    the cursor to pass as `after` for the next page ('next_cursor', None on
+    the last page) and the search text it was fetched for.
+    """
+
+    def __init__(self, page_size=10, max_cached=128, max_age=CATALOG_MAX_AGE, db_config=None):
+        self.page_size = page_size
+        self.max_cached = max_cached
+        self.max_age = max_age
+        self.db_config = db_config
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            loaded_at, page = entry
+            if time.monotonic() - loaded_at > self.max_age:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return page
+
+    def _store(self, key, page):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), page)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def page(self, after=None, search=None, conn=None):
+        """
+        One page of matches.
+
+        Args:
+            after (str, optional): Cursor of the previous page, None for the first page.
+            search (str, optional): Only matches of teams whose name contains this text.
+            conn (psycopg2.extensions.connection, optional): Checked out of the pool when not given.
+
+        Returns:
+            dict: 'matches' (pd.DataFrame), 'next_cursor' (str or None) and 'search'.
+        """
+        search = (search or "").strip() or None
+        key = (search, after, self.page_size)
+        page = self._cached(key)
+        if page is not None:
+            return page
+
+        # The match_page statements in statements.STATEMENTS
+        name, params = "match_page", (after or "", self.page_size + 1)
+        if search is not None:
+            name, params = "match_page_search", params + (team_name_pattern(search),)
+
+        if conn is None:
+            with get_manager(self.db_config).connection() as conn:
+                matches = run(conn, name, params)
+        else:
+            matches = run(conn, name, params)
+
+        # One row more than a page tells whether there is a next page without a COUNT(*)
+        has_next = len(matches) > self.page_size
+        matches = matches.iloc[:self.page_size].reset_index(drop=True)
+        page = {
+            "matches": matches,
+            "next_cursor": matches["match_id"].iloc[-1] if has_next else None,
+            "search": search,
+        }
+        self._store(key, page)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
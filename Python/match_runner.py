@@ -0,0 +1,280 @@
+"""
+Run per-match analyses over many matches in parallel.
+
+An analysis is a function that takes a MatchData (the match id plus its
+events and tracking rows, loaded lazily and at most once per match) and
+returns a DataFrame. Register one with the `analysis` decorator:
+
+    @analysis("possession")
+    def possession(match):
+        return ...
+
+`run_analyses` runs a set of analyses over a list of matches:
+
+- in a process pool whose workers each keep their own small connection pool
+- largest matches first: workers take the next match from one shared queue
+  as soon as they are done, so a long match started last cannot hold up the
+  run and the small ones fill in the gaps at the end
+- with a checkpoint: the result of every (analysis, match) is written to
+  <out>/parts as soon as it is done, a rerun after a crash only does what is
+  missing
+- with the results of every analysis over all matches concatenated into
+  <out>/<analysis>.csv
+
+    python match_runner.py --analyses xt_grid possession --matches <id> <id> --out results
+    python match_runner.py --analyses kinematics --all --workers 8
+    python match_runner.py --analyses possession --team ajax
+
+leaderboard.py keeps its per-match player contributions the same way.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from connection_pool import get_manager
+from helperfunctions import fetch_match_events, fetch_tracking_data
+from kinematics import compute_kinematics, summarize_kinematics
+from leaderboard import ANALYSIS_NAME as CONTRIBUTIONS, player_contributions
+from match_catalog import team_name_pattern
+from match_summaries import possession_seconds, xt_grid
+from spadl_schema import apply_spadl_schema
+from statements import run
+
+ANALYSES = {}
+
+CHECKPOINT_NAME = "checkpoint.json"
+
+
+def analysis(name):
+    """Register a per-match analysis; the function gets a MatchData and returns a DataFrame"""
+    def register(func):
+        ANALYSES[name] = func
+        return func
+    return register
+
+
+class MatchData:
+    """The rows of one match, fetched on first use and shared by all analyses of the match"""
+
+    def __init__(self, match_id, conn):
+        self.match_id = match_id
+        self.conn = conn
+
+    @cached_property
+    def events(self):
+        return fetch_match_events(self.match_id, self.conn)
+
+    @cached_property
+    def tracking(self):
+        return fetch_tracking_data(self.match_id, self.conn)
+
+    @cached_property
+    def teams(self):
+        return run(self.conn, "match_teams", (self.match_id,))
+
+    @cached_property
+    def actions(self):
+        return apply_spadl_schema(run(self.conn, "match_actions", (self.match_id,)))
+
+    @cached_property
+    def presence(self):
+        return run(self.conn, "tracking_presence", (self.match_id,)).assign(match_id=self.match_id)
+
+
+@analysis("xt_grid")
+def xt_grid_analysis(match):
+    """The match's xT grid, one row per cell"""
+    if match.events.empty:
+        return pd.DataFrame(columns=["match_id", "y_cell", "x_cell", "xt"])
+    grid = xt_grid(match.events)
+    y_cell, x_cell = np.indices(grid.shape)
+    return pd.DataFrame({"match_id": match.match_id, "y_cell": y_cell.ravel(),
+                         "x_cell": x_cell.ravel(), "xt": grid.ravel()})
+
+
+@analysis("possession")
+def possession_analysis(match):
+    """Seconds and share of ball possession per team"""
+    seconds = possession_seconds(match.events) if not match.events.empty else pd.Series(dtype="float64")
+    total = seconds.sum()
+    return pd.DataFrame({
+        "match_id": match.match_id,
+        "team_id": seconds.index.astype(str),
+        "possession_s": seconds.to_numpy(),
+        "possession_share": seconds.to_numpy() / total if total else np.nan,
+    })
+
+
+@analysis("kinematics")
+def kinematics_analysis(match):
+    """Distance, speed and effort summary per player, see kinematics.py"""
+    return summarize_kinematics(compute_kinematics(match.tracking), match_id=match.match_id)
+
+
+@analysis(CONTRIBUTIONS)
+def contributions_analysis(match):
+    """xT, VAEP, passes, carries and minutes per player, see leaderboard.py"""
+    return player_contributions(match.actions, match.presence)
+
+
+def _part_path(out_dir, name, match_id):
+    return Path(out_dir) / "parts" / name / f"{match_id}.pkl"
+
+
+def _write_atomic(path, write):
+    """Write through a temporary file, so a crash never leaves half a file behind"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _init_worker(db_config):
+    # Every worker opens its own pool once; get_manager keys pools by process
+    get_manager(db_config, minconn=1, maxconn=2)
+
+
+def run_match(match_id, names, out_dir, db_config=None):
+    """
+    Run analyses on one match, in a worker process, and store every result as a part.
+
+    Returns:
+        tuple: (match_id, {analysis: status dict}).
+    """
+    statuses = {}
+    with get_manager(db_config).connection() as conn:
+        match = MatchData(match_id, conn)
+        for name in names:
+            start = time.perf_counter()
+            try:
+                result = ANALYSES[name](match)
+                _write_atomic(_part_path(out_dir, name, match_id), result.to_pickle)
+                statuses[name] = {"status": "done", "rows": len(result)}
+            except Exception as e:
+                statuses[name] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+            statuses[name]["seconds"] = time.perf_counter() - start
+    return match_id, statuses
+
+
+def load_checkpoint(out_dir):
+    """Per analysis, the matches already done by earlier runs"""
+    path = Path(out_dir) / CHECKPOINT_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_checkpoint(out_dir, checkpoint):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f, indent=2, default=str)
+    _write_atomic(Path(out_dir) / CHECKPOINT_NAME, write)
+
+
+def match_sizes(match_ids, conn):
+    """Events per match, the measure of how long a match takes to analyse"""
+    counts = run(conn, "match_event_counts", (list(match_ids),))
+    return counts.set_index("match_id")["events"].reindex(match_ids).fillna(0).astype(int)
+
+
+def select_matches(conn, match_ids=None, team=None):
+    """The given matches, the matches of teams named like `team`, or every match"""
+    if match_ids:
+        return list(match_ids)
+    if team:
+        return run(conn, "team_matches", (team_name_pattern(team),))["match_id"].tolist()
+    return run(conn, "all_matches")["match_id"].tolist()
+
+
+def run_analyses(names, match_ids, out_dir, db_config=None, workers=None, force=False):
+    """
+    Run registered analyses over many matches.
+
+    Args:
+        names (list): Names of registered analyses.
+        match_ids (list): The matches to analyse.
+        out_dir (str or Path): Directory for the parts, the checkpoint and the results.
+        db_config (dict, optional): Connection parameters, read from the environment when not given.
+        workers (int, optional): Number of worker processes, defaults to the number of CPUs.
+        force (bool): Run analyses again that the checkpoint has as done.
+
+    Returns:
+        dict: Per analysis the results of all matches in one DataFrame, and
+            under 'failed' the (analysis, match_id, error) of what did not work.
+    """
+    unknown = [name for name in names if name not in ANALYSES]
+    if unknown:
+        raise ValueError(f"Unknown analyses {unknown}, choose from {', '.join(ANALYSES)}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = {} if force else load_checkpoint(out_dir)
+    todo = {}
+    for match_id in match_ids:
+        missing = [name for name in names if match_id not in checkpoint.get(name, [])
+                   or not _part_path(out_dir, name, match_id).exists()]
+        if missing:
+            todo[match_id] = missing
+
+    failed = []
+    if todo:
+        with get_manager(db_config).connection() as conn:
+            sizes = match_sizes(list(todo), conn)
+        # Largest first, so the longest matches never end up last
+        order = sizes.sort_values(ascending=False, kind="stable").index
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db_config,)) as executor:
+            futures = [executor.submit(run_match, match_id, todo[match_id], str(out_dir), db_config)
+                       for match_id in order]
+            for future in as_completed(futures):
+                match_id, statuses = future.result()
+                for name, status in statuses.items():
+                    if status["status"] == "done":
+                        done = checkpoint.setdefault(name, [])
+                        if match_id not in done:
+                            done.append(match_id)
+                    else:
+                        failed.append((name, match_id, status["error"]))
+                write_checkpoint(out_dir, checkpoint)
+
+    results = {}
+    for name in names:
+        parts = [pd.read_pickle(path) for path in
+                 (_part_path(out_dir, name, match_id) for match_id in match_ids) if path.exists()]
+        results[name] = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        results[name].to_csv(out_dir / f"{name}.csv", index=False)
+    results["failed"] = failed
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run per-match analyses over many matches")
+    parser.add_argument("--analyses", nargs="+", default=list(ANALYSES), choices=sorted(ANALYSES))
+    parser.add_argument("--matches", nargs="*", default=None, help="Match ids to analyse")
+    parser.add_argument("--team", default=None, help="Every match of teams whose name contains this text")
+    parser.add_argument("--all", action="store_true", help="Every match in the database")
+    parser.add_argument("--out", default="analysis_results", help="Output directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Ignore the checkpoint of an earlier run")
+    args = parser.parse_args()
+
+    if not (args.matches or args.team or args.all):
+        parser.error("give --matches, --team or --all")
+    with get_manager().connection() as conn:
+        match_ids = select_matches(conn, args.matches, args.team)
+
+    start = time.perf_counter()
+    results = run_analyses(args.analyses, match_ids, args.out, workers=args.workers, force=args.force)
+    print(f"{len(match_ids)} matches in {time.perf_counter() - start:.1f}s")
+    for name in args.analyses:
+        print(f"{name}: {len(results[name])} rows -> {Path(args.out) / (name + '.csv')}")
+    for name, match_id, error in results["failed"]:
+        print(f"failed: {name} {match_id}: {error}")
@@ -0,0 +1,396 @@
+"""
+Materialized per-match, per-team and per-player summary tables.
+
+Dashboards and menus keep asking the same questions of the raw rows: how much
+of the ball each team had, how many passes and shots, how much xT, how far
+everybody ran. This module answers them once per match and stores the
+answers in three small tables:
+
+- match_summary: one row per match (tracking frames, events, duration)
+- team_match_summary: one row per team per match (possession time and
+  share, passes, shots, xT, distance covered)
+- player_match_summary: one row per player per match (minutes, passes,
+  shots, xT, distance covered)
+
+`refresh_summaries` only summarizes matches that have no summary yet, so it
+can run after every import; pass `match_ids` with `force=True` to rebuild
+matches whose raw data changed. The read functions below are what the menus
+and reports use instead of the raw tables.
+
+    python match_summaries.py                   # summarize new matches
+    python match_summaries.py --matches <id> --force
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from connection_pool import get_manager
+from helperfunctions import fetch_match_events, fetch_tracking_data
+from statements import run
+
+MATCH_SUMMARY_TABLE = "match_summary"
+TEAM_SUMMARY_TABLE = "team_match_summary"
+PLAYER_SUMMARY_TABLE = "player_match_summary"
+
+MATCH_COLUMNS = ["match_id", "home_team_id", "away_team_id", "frames", "events", "duration_s", "refreshed_at"]
+TEAM_COLUMNS = [
+    "match_id", "team_id", "possession_s", "possession_share", "events", "passes",
+    "passes_completed", "shots", "shots_successful", "xt", "distance_m",
+]
+PLAYER_COLUMNS = [
+    "match_id", "player_id", "team_id", "minutes", "events", "passes",
+    "passes_completed", "shots", "xt", "distance_m",
+]
+
+SUMMARY_TABLES = f"""
+CREATE TABLE IF NOT EXISTS {MATCH_SUMMARY_TABLE} (
+    match_id TEXT PRIMARY KEY,
+    home_team_id TEXT,
+    away_team_id TEXT,
+    frames INTEGER,
+    events INTEGER,
+    duration_s REAL,
+    refreshed_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS {TEAM_SUMMARY_TABLE} (
+    match_id TEXT NOT NULL,
+    team_id TEXT NOT NULL,
+    possession_s REAL,
+    possession_share REAL,
+    events INTEGER,
+    passes INTEGER,
+    passes_completed INTEGER,
+    shots INTEGER,
+    shots_successful INTEGER,
+    xt REAL,
+    distance_m REAL,
+    PRIMARY KEY (match_id, team_id)
+);
+CREATE TABLE IF NOT EXISTS {PLAYER_SUMMARY_TABLE} (
+    match_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    team_id TEXT,
+    minutes REAL,
+    events INTEGER,
+    passes INTEGER,
+    passes_completed INTEGER,
+    shots INTEGER,
+    xt REAL,
+    distance_m REAL,
+    PRIMARY KEY (match_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS idx_team_match_summary_team ON {TEAM_SUMMARY_TABLE} (team_id);
+CREATE INDEX IF NOT EXISTS idx_player_match_summary_player ON {PLAYER_SUMMARY_TABLE} (player_id);
+"""
+
+# SPADL action types counted as passes (pass, cross, throw-in, free kicks, corners) and shots
+PASS_TYPES = [0, 1, 2, 3, 4, 5, 6]
+SHOT_TYPES = [11, 12, 13]
+
+# Event coordinates are in meters, the xT grid is 16 x 16
+PITCH_LENGTH = 105.0
+PITCH_WIDTH = 68.0
+XT_GRID_SIZE = 16
+
+def xt_grid(events, grid_size=XT_GRID_SIZE):
+    """
+    The xT grid of a match, from the group's xT model (xt_model.calculate_xt).
+
+    Args:
+        events (pd.DataFrame): Events as returned by fetch_match_events, or
+            SPADL actions with a numeric result.
+
+    Returns:
+        np.ndarray: The normalized 'total' grid, indexed [y cell, x cell].
+    """
+    # Imported here, the xT model pulls in scipy
+    from xt_model import calculate_xt, result_mapping
+
+    actions = events.rename(columns={"x": "start_x", "y": "start_y", "eventtype_id": "action_type"})
+    if "success" in actions.columns:
+        # Match events: result is free text, success is the boolean outcome
+        actions["result_name"] = np.where(actions["success"].fillna(False).astype(bool), "success", "fail")
+    else:
+        actions["result_name"] = actions["result"].map(result_mapping)
+    return calculate_xt(actions, grid_size=grid_size)["total"]
+
+
+def event_xt(events, grid, x_col="x", y_col="y"):
+    """
+    The xT of the cell every event starts in, with one vectorized grid lookup.
+
+    Args:
+        events (pd.DataFrame): Events with start coordinates in meters.
+        grid (np.ndarray): An xT grid indexed [y cell, x cell], see xt_grid.
+        x_col (str): The start x column, 'start_x' in the xT scripts.
+        y_col (str): The start y column.
+
+    Returns:
+        np.ndarray: xT per event, 0 for events without coordinates.
+    """
+    grid_size = grid.shape[0]
+    x = events[x_col].to_numpy(dtype=np.float64)
+    y = events[y_col].to_numpy(dtype=np.float64)
+    located = ~(np.isnan(x) | np.isnan(y))
+    x_idx = np.clip((np.nan_to_num(x) / PITCH_LENGTH * grid_size).astype(np.int64), 0, grid_size - 1)
+    y_idx = np.clip((np.nan_to_num(y) / PITCH_WIDTH * grid_size).astype(np.int64), 0, grid_size - 1)
+    return np.where(located, grid[y_idx, x_idx], 0.0)
+
+
+def possession_seconds(events):
+    """
+    Seconds of ball possession per team.
+
+    Every event's owning team has the ball until the next event of the same
+    period, the same spells calculate_ball_possession derives, without the
+    gap between periods counting towards anyone.
+
+    Args:
+        events (pd.DataFrame): Events in time order with period_id, numeric
+            seconds and ball_owning_team.
+
+    Returns:
+        pd.Series: Seconds per ball_owning_team.
+    """
+    next_seconds = events.groupby("period_id", sort=False)["seconds"].shift(-1)
+    held = (next_seconds - events["seconds"]).fillna(0.0).clip(lower=0.0)
+    return held.groupby(events["ball_owning_team"]).sum()
+
+
+def _event_counts(events, by):
+    """Event, pass, completed pass, shot and xT totals per group"""
+    # result is free text in matchevents, success is the boolean outcome
+    completed = events["success"].fillna(False).astype(bool)
+    is_pass = events["eventtype_id"].isin(PASS_TYPES)
+    is_shot = events["eventtype_id"].isin(SHOT_TYPES)
+    counts = pd.DataFrame({
+        by: events[by],
+        "events": 1,
+        "passes": is_pass.astype(int),
+        "passes_completed": (is_pass & completed).astype(int),
+        "shots": is_shot.astype(int),
+        "shots_successful": (is_shot & completed).astype(int),
+        "xt": events["xt"],
+    })
+    return counts.groupby(by, observed=True).sum()
+
+
+def summarize_match(match_id, conn=None):
+    """
+    Compute the match, team and player summary rows of one match.
+
+    Args:
+        match_id (str): The ID of the match.
+        conn (psycopg2.extensions.connection, optional): An open connection.
+            One is checked out of the pool when not given, which is what the
+            worker processes do.
+
+    Returns:
+        dict: 'match', 'teams' and 'players' DataFrames with the columns of
+            MATCH_COLUMNS, TEAM_COLUMNS and PLAYER_COLUMNS.
+    """
+    # Imported here so that the read functions stay light, kinematics pulls in scipy
+    from kinematics import compute_kinematics, summarize_kinematics
+
+    if conn is None:
+        with get_manager().connection() as conn:
+            return summarize_match(match_id, conn)
+
+    teams = run(conn, "match_teams", (match_id,))
+    events = fetch_match_events(match_id, conn)
+    tracking = fetch_tracking_data(match_id, conn)
+    home_team_id, away_team_id = (teams.iloc[0].tolist() if not teams.empty else (None, None))
+
+    events = events.assign(xt=event_xt(events, xt_grid(events)) if not events.empty else 0.0)
+    kin = summarize_kinematics(compute_kinematics(tracking), match_id=match_id)
+    kin["team_id"] = kin["team_id"].astype(object)
+
+    # Teams: possession from the owning team of every event, the rest from the acting team
+    possession = possession_seconds(events) if not events.empty else pd.Series(dtype="float64")
+    team_ids = [t for t in (home_team_id, away_team_id) if t is not None]
+    team_rows = pd.DataFrame(index=pd.Index(team_ids, name="team_id"))
+    team_rows["possession_s"] = possession.reindex(team_rows.index).fillna(0.0)
+    total_possession = team_rows["possession_s"].sum()
+    team_rows["possession_share"] = team_rows["possession_s"] / total_possession if total_possession else np.nan
+    if not events.empty:
+        team_rows = team_rows.join(_event_counts(events, "team_id"))
+    team_rows["distance_m"] = kin.groupby("team_id")["distance_m"].sum()
+    team_rows = team_rows.reset_index().assign(match_id=match_id).reindex(columns=TEAM_COLUMNS)
+
+    # Players: everybody who was tracked or made an event
+    player_rows = kin[["player_id", "team_id", "minutes", "distance_m"]].set_index("player_id")
+    if not events.empty:
+        counts = _event_counts(events[events["player_id"].notna()], "player_id")
+        counts = counts.drop(columns="shots_successful")
+        player_rows = player_rows.join(counts, how="outer")
+        acting_team = events.groupby("player_id")["team_id"].first()
+        player_rows["team_id"] = player_rows["team_id"].fillna(acting_team.reindex(player_rows.index))
+    player_rows = player_rows.reset_index().assign(match_id=match_id).reindex(columns=PLAYER_COLUMNS)
+
+    count_columns = ["events", "passes", "passes_completed", "shots", "shots_successful"]
+    for rows in (team_rows, player_rows):
+        present = [c for c in count_columns if c in rows.columns]
+        rows[present] = rows[present].fillna(0).astype(np.int32)
+        rows["xt"] = rows["xt"].fillna(0.0)
+
+    duration = events.groupby("period_id")["seconds"].max().sum() if not events.empty else 0.0
+    match_row = pd.DataFrame([{
+        "match_id": match_id,
+        "home_team_id": home_team_id,
+        "away_team_id": away_team_id,
+        "frames": int(tracking["frame_id"].nunique()) if not tracking.empty else 0,
+        "events": len(events),
+        "duration_s": float(duration),
+        "refreshed_at": pd.Timestamp.now(tz="UTC").tz_localize(None),
+    }], columns=MATCH_COLUMNS)
+    return {"match": match_row, "teams": team_rows, "players": player_rows}
+
+
+def _replace_rows(cur, table, columns, df, match_ids):
+    """Delete the rows of these matches from a summary table and insert the new ones"""
+    cur.execute(f"DELETE FROM {table} WHERE match_id = ANY(%s);", (list(match_ids),))
+    if df.empty:
+        return
+    rows = df[columns].astype(object).where(df[columns].notna(), None)
+    execute_values(cur, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+                   rows.itertuples(index=False, name=None))
+
+
+def ensure_summary_tables(conn):
+    """Create the summary tables and their lookup indexes when they do not exist yet"""
+    with conn.cursor() as cur:
+        cur.execute(SUMMARY_TABLES)
+    conn.commit()
+
+
+def write_summaries(summaries, conn):
+    """
+    Store summaries, replacing earlier rows of the same matches, in one transaction.
+
+    Args:
+        summaries (list): Outputs of summarize_match.
+        conn (psycopg2.extensions.connection): The database connection object.
+    """
+    if conn is None:
+        raise ValueError("Database connection 'conn' must be provided.")
+    if not summaries:
+        return
+
+    match_rows = pd.concat([s["match"] for s in summaries], ignore_index=True)
+    match_ids = match_rows["match_id"].tolist()
+    with conn.cursor() as cur:
+        cur.execute(SUMMARY_TABLES)
+        _replace_rows(cur, TEAM_SUMMARY_TABLE, TEAM_COLUMNS,
+                      pd.concat([s["teams"] for s in summaries], ignore_index=True), match_ids)
+        _replace_rows(cur, PLAYER_SUMMARY_TABLE, PLAYER_COLUMNS,
+                      pd.concat([s["players"] for s in summaries], ignore_index=True), match_ids)
+        # The match row last: a match counts as summarized once it is in match_summary
+        _replace_rows(cur, MATCH_SUMMARY_TABLE, MATCH_COLUMNS, match_rows, match_ids)
+    conn.commit()
+
+
+def pending_matches(conn):
+    """The IDs of the matches that have no summary yet"""
+    return run(conn, "unsummarized_matches")["match_id"].tolist()
+
+
+def refresh_summaries(match_ids=None, force=False, max_workers=None, batch_size=8, db_config=None):
+    """
+    Summarize the matches that need it and store the results.
+
+    Args:
+        match_ids (list, optional): Matches to consider, all matches when not given.
+        force (bool): Summarize the matches again even when they already have a summary.
+        max_workers (int, optional): Number of worker processes.
+        batch_size (int): Matches written per transaction, so a crash keeps
+            the batches that were already done.
+        db_config (dict, optional): Connection parameters, read from the environment when not given.
+
+    Returns:
+        list: The IDs of the matches that were summarized.
+    """
+    manager = get_manager(db_config)
+    with manager.connection() as conn:
+        ensure_summary_tables(conn)
+        if force:
+            todo = list(match_ids) if match_ids is not None else run(conn, "all_matches")["match_id"].tolist()
+        else:
+            todo = pending_matches(conn)
+            if match_ids is not None:
+                wanted = set(match_ids)
+                todo = [match_id for match_id in todo if match_id in wanted]
+    if not todo:
+        return []
+
+    done = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        summaries = executor.map(summarize_match, todo)
+        batch = []
+        for summary in summaries:
+            batch.append(summary)
+            if len(batch) == batch_size:
+                with manager.connection() as conn:
+                    write_summaries(batch, conn)
+                done.extend(s["match"]["match_id"].iloc[0] for s in batch)
+                batch = []
+        if batch:
+            with manager.connection() as conn:
+                write_summaries(batch, conn)
+            done.extend(s["match"]["match_id"].iloc[0] for s in batch)
+    return done
+
+
+def get_match_summary(match_id, conn):
+    """The match_summary row of a match, an empty DataFrame when it was not summarized yet"""
+    return run(conn, "match_summary", (match_id,))
+
+
+def get_team_summaries(match_id, conn):
+    """Both teams' summary rows of a match"""
+    return run(conn, "team_match_summaries", (match_id,))
+
+
+def get_player_summaries(match_id, conn):
+    """Every player's summary row of a match, by team and xT"""
+    return run(conn, "player_match_summaries", (match_id,))
+
+
+def get_player_history(player_id, conn):
+    """One summary row per match a player played in"""
+    return run(conn, "player_summaries", (player_id,))
+
+
+def get_page_summaries(matches, conn):
+    """
+    Possession share, shots and xT of the home and away team of every match
+    in a page of matches (e.g. a MatchCatalog page).
+
+    Args:
+        matches (pd.DataFrame): match_id, home_team_id and away_team_id.
+
+    Returns:
+        pd.DataFrame: Indexed by match_id, with home_/away_ possession_share,
+            shots and xt. Matches without a summary are left out.
+    """
+    rows = run(conn, "team_match_summaries_for", (matches["match_id"].tolist(),))
+    sides = matches[["match_id", "home_team_id", "away_team_id"]].melt(
+        id_vars="match_id", var_name="side", value_name="team_id")
+    sides["side"] = sides["side"].str.replace("_team_id", "", regex=False)
+    rows = rows.merge(sides, on=["match_id", "team_id"])
+    wide = rows.pivot(index="match_id", columns="side", values=["possession_share", "shots", "xt"])
+    wide.columns = [f"{side}_{value}" for value, side in wide.columns]
+    return wide
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize the per-match summary tables")
+    parser.add_argument("--matches", nargs="*", default=None, help="Only these matches")
+    parser.add_argument("--force", action="store_true", help="Summarize matches that already have a summary again")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    refreshed = refresh_summaries(args.matches, force=args.force, max_workers=args.workers)
+    print(f"Summarized {len(refreshed)} matches")
@@ -0,0 +1,435 @@
+"""
+Score the actions of matches with persisted models, in batches.
+
+A fitted model is saved once as a bundle with save_model: the estimator, the
+feature set it was trained on and what its output means. Scoring loads a
+bundle once per process and then, per batch of matches:
+
+1. fetches the SPADL actions of the matches
+2. builds the feature matrix of the whole batch with the model's feature set
+3. predicts all rows in one call
+4. replaces the model's earlier predictions for those matches in
+   action_predictions, streamed in with COPY
+
+Every batch reports its size and the seconds spent in each step, and the
+steps are timed as instrumentation spans (score.fetch, score.features,
+score.predict, score.write). A backfill over whole seasons runs the batches
+in a process pool whose workers each load the model and open their
+connection pool once:
+
+    python model_scoring.py --model transition_rf.joblib --matches <id> <id>
+    python model_scoring.py --model transition_rf.joblib --all --workers 8 --batch-matches 20
+
+Feature sets are registered with the `feature_set` decorator; 'transition'
+(transition_model.py) and 'actions' come with this module. joblib and
+scikit-learn are only needed by this module.
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from connection_pool import get_manager
+from instrumentation import span
+from leaderboard import normalize_direction
+from spadl_schema import apply_spadl_schema
+from statements import is_postgres, raw_connection, run
+from tracking_schema import match_clock
+from transition_model import FEATURE_COLUMNS as TRANSITION_COLUMNS, transition_features
+
+PREDICTIONS_TABLE = "action_predictions"
+PREDICTION_COLUMNS = ["model", "version", "match_id", "action_id", "score", "label", "scored_at"]
+
+PREDICTIONS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {PREDICTIONS_TABLE} (
+    model TEXT NOT NULL,
+    version TEXT NOT NULL,
+    match_id TEXT NOT NULL,
+    action_id BIGINT NOT NULL,
+    score REAL,
+    label TEXT,
+    scored_at TIMESTAMP,
+    PRIMARY KEY (model, version, match_id, action_id)
+);
+"""
+
+# What the score and label of a prediction are, per kind of model
+OUTPUTS = {
+    "proba": "score: probability of the last class, label: the predicted class",
+    "value": "score: the predicted value (regressors)",
+    "cluster": "score: distance to the nearest centre, label: the cluster",
+}
+
+ACTION_COLUMNS = ["period_id", "minute", "start_x", "start_y", "end_x", "end_y", "action_type", "result", "bodypart"]
+
+FEATURE_SETS = {}
+
+# The bundles this process has loaded, per path
+_models = {}
+# The bundle and pool of a backfill worker process
+_worker = {}
+
+
+def feature_set(name, columns):
+    """
+    Register a feature set; the function gets the actions of a batch and
+    returns (keys, X): a DataFrame with match_id and action_id per row and the
+    float32 feature matrix in the order of `columns`.
+    """
+    def register(func):
+        FEATURE_SETS[name] = {"build": func, "columns": list(columns)}
+        return func
+    return register
+
+
+@feature_set("transition", TRANSITION_COLUMNS)
+def transition_feature_set(actions):
+    """Ball-winning defensive actions, see transition_model.py"""
+    features = transition_features(actions)
+    return features[["match_id", "action_id"]], features[TRANSITION_COLUMNS].to_numpy(dtype=np.float32)
+
+
+@feature_set("actions", ACTION_COLUMNS)
+def action_feature_set(actions):
+    """Every action: where it starts and ends (attacking towards x = 105), when, its type and result"""
+    actions = normalize_direction(actions)
+    features = actions.assign(minute=match_clock(actions["seconds"].astype(np.float64), actions["period_id"]) / 60)
+    keys = actions[["match_id", "id"]].rename(columns={"id": "action_id"})
+    return keys, features[ACTION_COLUMNS].to_numpy(dtype=np.float32)
+
+
+def save_model(model, path, feature_set_name, output="proba", name=None, version=None):
+    """
+    Persist a fitted model with what scoring needs to know about it.
+
+    Args:
+        model: A fitted estimator with predict (and predict_proba or transform for those outputs).
+        path (str or Path): The bundle file.
+        feature_set_name (str): The registered feature set the model was trained on.
+        output (str): A key of OUTPUTS.
+        name (str, optional): Model name in action_predictions, the file name by default.
+        version (str, optional): Model version, the save time by default.
+
+    Returns:
+        dict: The saved bundle.
+    """
+    if feature_set_name not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set '{feature_set_name}', choose from {', '.join(FEATURE_SETS)}")
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output '{output}', choose from {', '.join(OUTPUTS)}")
+    bundle = {
+        "model": model,
+        "name": name or Path(path).stem,
+        "version": version or time.strftime("%Y%m%d%H%M%S"),
+        "feature_set": feature_set_name,
+        "columns": FEATURE_SETS[feature_set_name]["columns"],
+        "output": output,
+    }
+    joblib.dump(bundle, path)
+    return bundle
+
+
+def load_model(path):
+    """A saved bundle, loaded from disk only once per process (and again when the file changes)"""
+    path = Path(path).resolve()
+    key = (str(path), path.stat().st_mtime_ns)
+    bundle = _models.get(key)
+    if bundle is None:
+        bundle = joblib.load(path)
+        if bundle["columns"] != FEATURE_SETS[bundle["feature_set"]]["columns"]:
+            raise ValueError(f"{path} was trained on other '{bundle['feature_set']}' features than this code builds")
+        _models[key] = bundle
+    return bundle
+
+
+def predict(bundle, X):
+    """(score, label) arrays of a feature matrix, as the bundle's output defines them"""
+    model = bundle["model"]
+    if bundle["output"] == "proba":
+        proba = model.predict_proba(X)
+        return proba[:, -1], model.classes_[proba.argmax(axis=1)].astype(str)
+    if bundle["output"] == "cluster":
+        distances = model.transform(X)
+        return distances.min(axis=1), distances.argmin(axis=1).astype(str)
+    return np.asarray(model.predict(X), dtype=np.float64), np.full(len(X), None, dtype=object)
+
+
+def score_actions(bundle, actions):
+    """
+    Predictions for the actions of a batch of matches, in one predict call.
+
+    Returns:
+        pd.DataFrame: The columns of PREDICTION_COLUMNS, one row per scored action.
+    """
+    with span("score.features", feature_set=bundle["feature_set"]) as s:
+        keys, X = FEATURE_SETS[bundle["feature_set"]]["build"](actions)
+        s["rows"] = len(keys)
+    if not len(keys):
+        return pd.DataFrame(columns=PREDICTION_COLUMNS)
+    with span("score.predict", model=bundle["name"], rows=len(keys)):
+        score, label = predict(bundle, X)
+    return pd.DataFrame({
+        "model": bundle["name"],
+        "version": bundle["version"],
+        "match_id": keys["match_id"].to_numpy(),
+        "action_id": keys["action_id"].to_numpy(dtype=np.int64),
+        "score": score,
+        "label": label,
+        "scored_at": pd.Timestamp.now(tz="UTC").tz_localize(None),
+    }, columns=PREDICTION_COLUMNS)
+
+
+def ensure_predictions_table(conn):
+    """Create action_predictions when it does not exist yet"""
+    raw = raw_connection(conn)
+    cur = raw.cursor()
+    cur.execute(PREDICTIONS_DDL)
+    cur.close()
+    raw.commit()
+
+
+def write_predictions(predictions, conn, model, version, match_ids):
+    """
+    Replace a model version's predictions for some matches, in one transaction.
+
+    On PostgreSQL the rows are streamed in with COPY; other connections (the
+    SQLite copy of the synthetic match) insert them with executemany.
+    """
+    raw = raw_connection(conn)
+    match_ids = [str(m) for m in match_ids]
+    rows = predictions[PREDICTION_COLUMNS]
+    cur = raw.cursor()
+    try:
+        if is_postgres(raw):
+            cur.execute(f"DELETE FROM {PREDICTIONS_TABLE} WHERE model = %s AND version = %s AND match_id = ANY(%s);",
+                        (model, version, match_ids))
+            buffer = io.StringIO()
+            rows.to_csv(buffer, index=False, header=False, quoting=csv.QUOTE_MINIMAL, na_rep="")
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {PREDICTIONS_TABLE} ({', '.join(PREDICTION_COLUMNS)}) "
+                            "FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ", ".join("?" * len(match_ids))
+            cur.execute(f"DELETE FROM {PREDICTIONS_TABLE} WHERE model = ? AND version = ? "
+                        f"AND match_id IN ({placeholders});", (model, version, *match_ids))
+            values = rows.astype(object).where(rows.notna(), None)
+            values["scored_at"] = values["scored_at"].astype(str)
+            cur.executemany(f"INSERT INTO {PREDICTIONS_TABLE} VALUES ({', '.join('?' * len(PREDICTION_COLUMNS))});",
+                            values.itertuples(index=False, name=None))
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def score_batch(bundle, match_ids, conn, write=True):
+    """
+    Fetch, score and store one batch of matches.
+
+    Returns:
+        tuple: (predictions DataFrame, metrics dict with the batch's matches,
+            actions and predictions, the seconds per step, the total and the
+            actions scored per second).
+    """
+    start = time.perf_counter()
+    metrics = {"matches": len(match_ids), "pid": os.getpid()}
+    with span("score.fetch", matches=len(match_ids)) as s:
+        actions = apply_spadl_schema(pd.concat(
+            [run(conn, "transition_actions", (match_id,)) for match_id in match_ids], ignore_index=True))
+        s["rows"] = len(actions)
+    metrics["fetch_s"] = time.perf_counter() - start
+
+    step = time.perf_counter()
+    predictions = score_actions(bundle, actions)
+    metrics["score_s"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    if write:
+        with span("score.write", rows=len(predictions)):
+            write_predictions(predictions, conn, bundle["name"], bundle["version"], match_ids)
+    metrics["write_s"] = time.perf_counter() - step
+
+    metrics["total_s"] = time.perf_counter() - start
+    metrics["actions"] = len(actions)
+    metrics["predictions"] = len(predictions)
+    metrics["actions_per_s"] = len(actions) / metrics["total_s"] if metrics["total_s"] else np.nan
+    return predictions, metrics
+
+
+def summarize_metrics(metrics):
+    """
+    Throughput and latency over the batches of a run.
+
+    Returns:
+        dict: batches, matches, actions, predictions, busy seconds per step,
+            batch latency p50 / p95 / max and actions per busy second.
+    """
+    if not metrics:
+        return {"batches": 0}
+    df = pd.DataFrame(metrics)
+    busy = df["total_s"].sum()
+    return {
+        "batches": len(df),
+        "matches": int(df["matches"].sum()),
+        "actions": int(df["actions"].sum()),
+        "predictions": int(df["predictions"].sum()),
+        "fetch_s": float(df["fetch_s"].sum()),
+        "score_s": float(df["score_s"].sum()),
+        "write_s": float(df["write_s"].sum()),
+        "batch_p50_s": float(df["total_s"].quantile(0.5)),
+        "batch_p95_s": float(df["total_s"].quantile(0.95)),
+        "batch_max_s": float(df["total_s"].max()),
+        "actions_per_busy_s": float(df["actions"].sum() / busy) if busy else np.nan,
+    }
+
+
+def _batches(match_ids, batch_matches):
+    return [match_ids[i:i + batch_matches] for i in range(0, len(match_ids), batch_matches)]
+
+
+def score_matches(model_path, match_ids, batch_matches=10, conn=None, write=True):
+    """
+    Score matches batch by batch in this process.
+
+    Args:
+        model_path (str or Path): A bundle written by save_model.
+        match_ids (list): The matches to score.
+        batch_matches (int): Matches per batch.
+        conn (optional): An open connection; one is checked out of the pool when not given.
+        write (bool): Store the predictions in action_predictions.
+
+    Returns:
+        tuple: (all predictions in one DataFrame, list of per-batch metrics).
+    """
+    if conn is None:
+        with get_manager().connection() as conn:
+            return score_matches(model_path, match_ids, batch_matches, conn, write)
+
+    bundle = load_model(model_path)
+    if write:
+        ensure_predictions_table(conn)
+    parts, metrics = [], []
+    for batch in _batches(list(match_ids), batch_matches):
+        predictions, batch_metrics = score_batch(bundle, batch, conn, write)
+        parts.append(predictions)
+        metrics.append(batch_metrics)
+    predictions = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=PREDICTION_COLUMNS)
+    return predictions, metrics
+
+
+def _init_worker(model_path, db_config):
+    # Load the model and open the pool once per worker, not once per batch
+    _worker["bundle"] = load_model(model_path)
+    _worker["manager"] = get_manager(db_config, minconn=1, maxconn=2)
+
+
+def _score_worker_batch(match_ids):
+    with _worker["manager"].connection() as conn:
+        try:
+            _, metrics = score_batch(_worker["bundle"], match_ids, conn)
+        except Exception as e:
+            return match_ids, {"error": f"{type(e).__name__}: {e}"}
+    return match_ids, metrics
+
+
+def backfill(model_path, match_ids, workers=None, batch_matches=10, db_config=None, force=False, progress=True):
+    """
+    Score many matches, e.g. full seasons, in a process pool.
+
+    Matches the model version already has predictions for are skipped unless
+    `force` is set, so an interrupted backfill continues where it stopped.
+    The largest matches go first, so a long match never ends up last.
+
+    Args:
+        model_path (str or Path): A bundle written by save_model.
+        match_ids (list): The matches to score.
+        workers (int, optional): Number of worker processes, defaults to the number of CPUs.
+        batch_matches (int): Matches per batch; one batch is fetched, scored and written at a time.
+        db_config (dict, optional): Connection parameters, read from the environment when not given.
+        force (bool): Score matches again that already have predictions.
+        progress (bool): Print a line per finished batch.
+
+    Returns:
+        tuple: (list of per-batch metrics, list of (match_ids, error) of failed batches).
+    """
+    from match_runner import match_sizes
+
+    bundle = load_model(model_path)
+    with get_manager(db_config).connection() as conn:
+        ensure_predictions_table(conn)
+        done = set() if force else set(run(conn, "scored_matches", (bundle["name"], bundle["version"]))["match_id"])
+        todo = [match_id for match_id in match_ids if str(match_id) not in done]
+        if not todo:
+            return [], []
+        sizes = match_sizes(todo, conn)
+    order = sizes.sort_values(ascending=False, kind="stable").index.tolist()
+
+    metrics, failed = [], []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(model_path), db_config)) as executor:
+        futures = [executor.submit(_score_worker_batch, batch) for batch in _batches(order, batch_matches)]
+        for future in as_completed(futures):
+            batch, batch_metrics = future.result()
+            if "error" in batch_metrics:
+                failed.append((batch, batch_metrics["error"]))
+                continue
+            metrics.append(batch_metrics)
+            if progress:
+                scored = sum(m["matches"] for m in metrics)
+                elapsed = time.perf_counter() - start
+                print(f"{scored}/{len(order)} matches, batch of {batch_metrics['actions']} actions "
+                      f"in {batch_metrics['total_s']:.2f}s, "
+                      f"{sum(m['actions'] for m in metrics) / elapsed:.0f} actions/s overall")
+    return metrics, failed
+
+
+def print_metrics(summary, wall_s=None):
+    print(f"{summary['batches']} batches, {summary.get('matches', 0)} matches, "
+          f"{summary.get('actions', 0)} actions, {summary.get('predictions', 0)} predictions")
+    if not summary["batches"]:
+        return
+    print(f"busy s: fetch {summary['fetch_s']:.2f}  score {summary['score_s']:.2f}  write {summary['write_s']:.2f}")
+    print(f"batch latency s: p50 {summary['batch_p50_s']:.3f}  p95 {summary['batch_p95_s']:.3f}  "
+          f"max {summary['batch_max_s']:.3f}")
+    print(f"throughput: {summary['actions_per_busy_s']:.0f} actions per busy second per process")
+    if wall_s:
+        print(f"wall clock: {wall_s:.1f}s, {summary['actions'] / wall_s:.0f} actions/s")
+
+
+if __name__ == "__main__":
+    from match_runner import select_matches
+
+    parser = argparse.ArgumentParser(description="Score the actions of matches with a saved model")
+    parser.add_argument("--model", required=True, help="Bundle written by save_model")
+    parser.add_argument("--matches", nargs="*", default=None, help="Match ids to score")
+    parser.add_argument("--team", default=None, help="Every match of teams whose name contains this text")
+    parser.add_argument("--all", action="store_true", help="Every match in the database")
+    parser.add_argument("--batch-matches", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="More than 1 runs a multi-process backfill")
+    parser.add_argument("--force", action="store_true", help="Score matches that already have predictions again")
+    args = parser.parse_args()
+
+    if not (args.matches or args.team or args.all):
+        parser.error("give --matches, --team or --all")
+    with get_manager().connection() as conn:
+        match_ids = select_matches(conn, args.matches, args.team)
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        metrics, failed = backfill(args.model, match_ids, args.workers, args.batch_matches, force=args.force)
+    else:
+        _, metrics = score_matches(args.model, match_ids, args.batch_matches)
+        failed = []
+    print_metrics(summarize_metrics(metrics), time.perf_counter() - start)
+    for batch, error in failed:
+        print(f"failed: {', '.join(map(str, batch))}: {error}")
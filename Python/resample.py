@@ -0,0 +1,199 @@
+"""
+Resample tracking data onto a uniform time grid at any frame rate.
+
+Tracking rows come in at the provider's native rate, with the occasional
+dropout. Both the video export (SoccerAnimation) and the pygame viewer want
+positions at their own frame rate, spaced by real time rather than by row
+index or frame_id. `resample` builds one grid per period, from the first to
+the last tracked moment at `fps` frames per second, and linearly
+interpolates every player and the ball onto it in one vectorized step:
+
+    grid = resample({"ball": df_ball, "home": df_home, "away": df_away}, fps=120)
+    grid["home"]["x"]          # (n_frames, n_players), NaN where not tracked
+
+Stretches where consecutive real frames are more than `max_gap` seconds apart
+(the frame_id jumps load_tracking_data warns about) are not bridged: grid
+frames inside them are NaN, so players disappear instead of gliding across
+the dropout.
+"""
+import numpy as np
+import pandas as pd
+
+from tracking_schema import PERIOD_OFFSETS
+
+# Native frame rate of the tracking data
+TRACKING_FPS = 25
+# Never interpolate between two real frames further apart than this (seconds)
+MAX_GAP_SECONDS = 0.5
+
+
+def _time_column(df, time_col=None):
+    """'seconds' when the library schema was applied, else the viewer's float 'timestamp'"""
+    if time_col is not None:
+        return time_col
+    return "seconds" if "seconds" in df.columns else "timestamp"
+
+
+def time_grid(dfs, fps, time_col=None):
+    """
+    The uniform time grid covering a set of tracking DataFrames.
+
+    Args:
+        dfs (iterable): DataFrames with a period_id and a numeric time column.
+        fps (float): Frames per second of the grid.
+        time_col (str, optional): The period-relative time column in seconds.
+
+    Returns:
+        tuple: (period_ids, seconds) arrays, one entry per grid frame.
+    """
+    spans = []
+    for df in dfs:
+        if df is None or df.empty:
+            continue
+        column = _time_column(df, time_col)
+        spans.append(df.groupby("period_id", observed=True)[column].agg(["min", "max"]))
+    if not spans:
+        return np.zeros(0, dtype=np.int8), np.zeros(0)
+
+    bounds = pd.concat(spans).groupby(level=0).agg({"min": "min", "max": "max"})
+    period_ids, seconds = [], []
+    for period_id, (start, end) in bounds.iterrows():
+        # Rounding guards against 9.999999 s windows losing their last frame
+        n_frames = int(np.floor(round((end - start) * fps, 6))) + 1
+        seconds.append(start + np.arange(n_frames) / fps)
+        period_ids.append(np.full(n_frames, period_id, dtype=np.int8))
+    return np.concatenate(period_ids), np.concatenate(seconds)
+
+
+def resample_positions(df, grid_periods, grid_seconds, max_gap=MAX_GAP_SECONDS, time_col=None):
+    """
+    Linearly interpolate the x and y of every player onto a time grid.
+
+    Args:
+        df (pd.DataFrame): Long tracking rows: period_id, player_id, a time column, x and y.
+        grid_periods (np.ndarray): Period of every grid frame, see time_grid.
+        grid_seconds (np.ndarray): Period-relative time of every grid frame.
+        max_gap (float): Do not interpolate between real frames further apart than this.
+        time_col (str, optional): The period-relative time column in seconds.
+
+    Returns:
+        dict: 'player_ids' (pd.Index) and 'x' / 'y' arrays of shape
+            (n_frames, n_players), NaN where a player is not tracked.
+    """
+    n_frames = len(grid_seconds)
+    if df is None or df.empty:
+        empty = np.full((n_frames, 0), np.nan)
+        return {"player_ids": pd.Index([]), "x": empty, "y": empty.copy()}
+
+    column = _time_column(df, time_col)
+    player_ids = df["player_id"]
+    if isinstance(player_ids.dtype, pd.CategoricalDtype):
+        player_ids = player_ids.cat.remove_unused_categories()
+    # Dense (real frames, players) arrays, one row per tracked moment
+    wide = (df.assign(player_id=player_ids)
+              .pivot_table(index=["period_id", column], columns="player_id", values=["x", "y"],
+                           aggfunc="first", observed=True)
+              .sort_index())
+    players = wide["x"].columns
+    wide_periods = wide.index.get_level_values(0).to_numpy()
+    wide_times = wide.index.get_level_values(1).to_numpy(dtype=np.float64)
+    real_x = wide["x"].to_numpy(dtype=np.float64)
+    real_y = wide["y"].to_numpy(dtype=np.float64)
+
+    x = np.full((n_frames, len(players)), np.nan)
+    y = np.full((n_frames, len(players)), np.nan)
+    for period_id in np.unique(grid_periods):
+        grid_rows = np.flatnonzero(grid_periods == period_id)
+        real_rows = np.flatnonzero(wide_periods == period_id)
+        if len(real_rows) == 0:
+            continue
+        times = wide_times[real_rows]
+        t = grid_seconds[grid_rows]
+
+        # Real frames at or before and after every grid time
+        before = np.searchsorted(times, t, side="right") - 1
+        inside = (before >= 0) & ((before < len(times) - 1) | (t == times[-1]))
+        before = before.clip(0, len(times) - 1)
+        after = np.minimum(before + 1, len(times) - 1)
+        gap = times[after] - times[before]
+        factor = np.where(gap > 0, (t - times[before]) / np.where(gap > 0, gap, 1.0), 0.0)
+        # Not across a dropout (a real frame right before one is fine), and
+        # not before the first or after the last real frame
+        usable = inside & ((gap <= max_gap) | (t == times[before]))
+
+        rows_before = real_rows[before]
+        rows_after = real_rows[after]
+        for real, out in ((real_x, x), (real_y, y)):
+            values = real[rows_before] + factor[:, None] * (real[rows_after] - real[rows_before])
+            values[~usable] = np.nan
+            out[grid_rows] = values
+    return {"player_ids": pd.Index(players), "x": x, "y": y}
+
+
+def resample(dfs, fps, max_gap=MAX_GAP_SECONDS, time_col=None):
+    """
+    Resample several tracking sources onto one shared time grid.
+
+    Args:
+        dfs (dict): Name -> long tracking DataFrame, e.g. ball, home and away.
+        fps (float): Target frames per second.
+        max_gap (float): Do not interpolate across dropouts longer than this (seconds).
+        time_col (str, optional): The period-relative time column in seconds,
+            'seconds' or the viewer's float 'timestamp' by default.
+
+    Returns:
+        dict: 'fps', 'period_id' and 'seconds' per grid frame, 'match_clock'
+            and per source name the output of resample_positions.
+    """
+    grid_periods, grid_seconds = time_grid(dfs.values(), fps, time_col)
+    offsets = pd.Series(grid_periods).map(PERIOD_OFFSETS).fillna(0.0).to_numpy()
+    resampled = {
+        "fps": fps,
+        "period_id": grid_periods,
+        "seconds": grid_seconds,
+        "match_clock": grid_seconds + offsets,
+    }
+    for name, df in dfs.items():
+        resampled[name] = resample_positions(df, grid_periods, grid_seconds, max_gap, time_col)
+    return resampled
+
+
+def frame_positions(resampled, name, i):
+    """The (x, y) arrays of the tracked players of one source in grid frame i"""
+    source = resampled[name]
+    x, y = source["x"][i], source["y"][i]
+    visible = ~(np.isnan(x) | np.isnan(y))
+    return x[visible], y[visible]
+
+
+def to_long(resampled, name, dropna=True):
+    """
+    One source of a resampled grid as long tracking rows.
+
+    The grid frame number becomes the frame_id, so the rows of different
+    sources of the same grid line up frame by frame.
+
+    Args:
+        resampled (dict): Output of resample.
+        name (str): The source to convert.
+        dropna (bool): Drop the rows of frames in which a player is not tracked.
+            Keep them for the ball when every grid frame has to be shown.
+
+    Returns:
+        pd.DataFrame: frame_id, period_id, seconds, match_clock, player_id, x and y.
+    """
+    source = resampled[name]
+    n_frames, n_players = source["x"].shape
+    frame_ids = np.repeat(np.arange(n_frames, dtype=np.int32), n_players)
+    long = pd.DataFrame({
+        "frame_id": frame_ids,
+        "period_id": resampled["period_id"][frame_ids],
+        "seconds": resampled["seconds"][frame_ids],
+        "match_clock": resampled["match_clock"][frame_ids],
+        "player_id": np.tile(np.asarray(source["player_ids"], dtype=object), n_frames),
+        "x": source["x"].ravel(),
+        "y": source["y"].ravel(),
+    })
+    if dropna:
+        long = long[long["x"].notna() & long["y"].notna()].reset_index(drop=True)
+    return long
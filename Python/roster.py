@@ -0,0 +1,106 @@
+"""
+Process-wide cache of the players table.
+
+Tracking rows only carry a player_id; which team a player belongs to (and
+their name and shirt number) comes from this small roster instead of joining
+players and teams onto every tracking row in the database. The roster is
+loaded once per process and reloaded after `max_age` seconds, so a new
+season's transfers are picked up by long-running processes.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from statements import STATEMENTS, run
+
+ROSTER_QUERY = STATEMENTS["roster"]
+
+# Reload the roster after this many seconds
+ROSTER_MAX_AGE = 6 * 60 * 60
+
+_lock = threading.Lock()
+_roster = None
+_loaded_at = 0.0
+
+
+def set_roster(players):
+    """
+    Put an already loaded players table in the cache.
+
+    Args:
+        players (pd.DataFrame): player_id, player_name, jersey_number and team_id.
+
+    Returns:
+        pd.DataFrame: The cached roster, indexed by player_id.
+    """
+    global _roster, _loaded_at
+    roster = players.drop_duplicates("player_id").set_index("player_id")
+    with _lock:
+        _roster = roster
+        _loaded_at = time.monotonic()
+    return roster
+
+
+def cached_roster(max_age=ROSTER_MAX_AGE):
+    """The cached roster, or None when it was never loaded or is older than max_age."""
+    with _lock:
+        if _roster is None or time.monotonic() - _loaded_at > max_age:
+            return None
+        return _roster
+
+
+def get_roster(conn, refresh=False, max_age=ROSTER_MAX_AGE):
+    """
+    The roster of all players, loaded from the database on first use.
+
+    Args:
+        conn (psycopg2.extensions.connection): Used only when the roster has to be (re)loaded.
+        refresh (bool): Reload even when a cached roster is available.
+        max_age (float): Seconds after which the cached roster is reloaded.
+
+    Returns:
+        pd.DataFrame: player_name, jersey_number and team_id, indexed by player_id.
+    """
+    roster = None if refresh else cached_roster(max_age)
+    if roster is None:
+        roster = set_roster(run(conn, "roster"))
+    return roster
+
+
+def attach_team(df, roster, column="team_id"):
+    """
+    Add the team of every tracking row with a vectorized categorical lookup.
+
+    The team is looked up once per distinct player and then broadcast to all
+    rows through the categorical codes of player_id.
+
+    Args:
+        df (pd.DataFrame): Tracking rows with a player_id column (categorical or not).
+        roster (pd.DataFrame): Output of get_roster.
+        column (str): Name of the team column to add.
+
+    Returns:
+        pd.DataFrame: The same DataFrame with a categorical team column,
+            NaN for players that are not in the roster.
+    """
+    player_ids = df["player_id"]
+    if not isinstance(player_ids.dtype, pd.CategoricalDtype):
+        player_ids = player_ids.astype("category")
+
+    # Team of every player category, then the team code of every row
+    teams = roster["team_id"].reindex(player_ids.cat.categories)
+    team_categories = pd.Index(teams.dropna().unique())
+    team_codes = team_categories.get_indexer(teams)
+    codes = player_ids.cat.codes.to_numpy()
+    row_codes = np.where(codes >= 0, team_codes[codes], -1) if len(team_codes) else np.full(len(codes), -1)
+
+    df[column] = pd.Categorical.from_codes(row_codes, categories=team_categories)
+    return df
+
+
+def attach_players(df, roster):
+    """Add team_id, player_name and jersey_number from the roster, for the non-compact layout."""
+    players = roster[["player_name", "jersey_number", "team_id"]]
+    return df.join(players, on="player_id")
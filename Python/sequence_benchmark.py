@@ -0,0 +1,127 @@
+"""
+Throughput of every stage of the action sequence path, on synthetic matches.
+
+- tokenize: action token ids with one array lookup, and, when the
+  transformers package is installed, the notebooks' BertTokenizer `.apply`
+  per row for comparison
+- windows: actions cut into possession windows
+- loader: batches per second out of the DataLoader, per number of workers
+- train: windows and actions per second of training epochs, per number of
+  torch threads
+
+    python sequence_benchmark.py
+    python sequence_benchmark.py --matches 20 --workers 0 2 4 --threads 1 4
+
+The loader and train stages need PyTorch and are skipped without it.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from action_sequences import ACTION_TYPES, action_tokens, event_embeddings, possession_windows
+from synthetic_match import generate_match
+
+
+def synthetic_actions(matches, minutes, seed=0):
+    """SPADL actions of several generated matches, like the 'transition_actions' statement returns them"""
+    parts = []
+    for i in range(matches):
+        actions = generate_match(minutes, seed=seed + i, match_id=f"synthetic-{i}")["spadl_actions"]
+        parts.append(actions.rename(columns={"game_id": "match_id"}))
+    return pd.concat(parts, ignore_index=True)
+
+
+def rate(func, units, repeat=3):
+    """Best units per second of `repeat` calls"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return units / best
+
+
+def bench_tokenize(actions):
+    results = {"lookup": rate(lambda: action_tokens(actions["action_type"], actions["result"]), len(actions))}
+    try:
+        from transformers import BertTokenizer
+    except ImportError:
+        results["bert .apply"] = "skipped (transformers not installed)"
+        return results
+    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+    names = actions["action_type"].map(dict(enumerate(ACTION_TYPES)))
+    results["bert .apply"] = rate(lambda: names.apply(lambda name: tokenizer(
+        name, padding="max_length", truncation=True, return_tensors="pt")["input_ids"]), len(actions), repeat=1)
+    return results
+
+
+def bench_loader(windows, batch_size, workers):
+    from sequence_model import window_loader
+
+    results = {}
+    for n in workers:
+        loader = window_loader(windows, batch_size, workers=n)
+
+        def drain():
+            for _ in loader:
+                pass
+        drain()  # start the workers before timing
+        results[f"{n} workers"] = rate(drain, len(windows["tokens"]))
+    return results
+
+
+def bench_train(windows, window, batch_size, workers, threads):
+    import torch
+
+    from sequence_model import ActionTransformer, run_epoch, window_loader
+
+    results = {}
+    embeddings = event_embeddings()
+    for n in threads:
+        torch.set_num_threads(n)
+        torch.manual_seed(0)
+        model = ActionTransformer(embeddings, window)
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        loader = window_loader(windows, batch_size, workers=workers)
+        run_epoch(model, loader, optimizer)  # warm up
+        metrics = run_epoch(model, loader, optimizer)
+        results[f"{n} threads"] = (metrics["windows_per_s"], metrics["actions_per_s"])
+    return results
+
+
+def print_rates(stage, unit, results):
+    for name, value in results.items():
+        if isinstance(value, str):
+            print(f"{stage:<10}{name:<16}{value}")
+        elif isinstance(value, tuple):
+            print(f"{stage:<10}{name:<16}{value[0]:>12,.0f} windows/s{value[1]:>12,.0f} actions/s")
+        else:
+            print(f"{stage:<10}{name:<16}{value:>12,.0f} {unit}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the action sequence path")
+    parser.add_argument("--matches", type=int, default=10, help="Synthetic matches to generate")
+    parser.add_argument("--minutes", type=float, default=90)
+    parser.add_argument("--window", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    actions = synthetic_actions(args.matches, args.minutes)
+    print(f"{len(actions)} actions of {args.matches} synthetic matches")
+    print_rates("tokenize", "actions", bench_tokenize(actions))
+    windows = possession_windows(actions, args.window)
+    print_rates("windows", "actions", {"possessions": rate(lambda: possession_windows(actions, args.window),
+                                                          len(actions))})
+    print(f"{len(windows['tokens'])} windows of {args.window} actions")
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        print("loader, train: skipped (PyTorch not installed)")
+    else:
+        print_rates("loader", "windows", bench_loader(windows, args.batch_size, args.workers))
+        print_rates("train", "", bench_train(windows, args.window, args.batch_size, 0, args.threads))
@@ -0,0 +1,228 @@
+"""
+A small transformer over possession windows of SPADL actions, trained on the CPU.
+
+The model reads the windows of action_sequences.py: token embeddings (cached
+per vocabulary entry by event_embeddings) plus the numeric features of every
+action, and predicts the next action of the possession with a causal mask.
+At 64 dimensions and two layers it is small enough to train on a CPU.
+
+Batches come from a DataLoader whose sampler hands out whole lists of window
+rows, so a batch is one slice of the memory-mapped arrays instead of
+`batch_size` single-row reads and a collate, and `workers` processes prepare
+the next batches while the model trains on the current one:
+
+    python sequence_model.py --all --epochs 3 --workers 2 --threads 4 --out action_transformer.pt
+    python sequence_benchmark.py                  # throughput of every stage
+
+Needs PyTorch (CPU build is enough).
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from torch import nn
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+
+from action_sequences import (
+    DEFAULT_CACHE_DIR, FEATURE_NAMES, PAD_TOKEN, VOCABULARY, build_sequence_cache, event_embeddings,
+    load_sequences,
+)
+
+
+class WindowDataset(Dataset):
+    """Possession windows, indexed with a list of rows so that a batch is read as one slice"""
+
+    def __init__(self, arrays):
+        self.tokens = arrays["tokens"]
+        self.features = arrays["features"]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, rows):
+        # Sorted rows read the memory map front to back
+        rows = np.sort(np.asarray(rows))
+        return (torch.from_numpy(np.ascontiguousarray(self.tokens[rows])),
+                torch.from_numpy(np.ascontiguousarray(self.features[rows])))
+
+
+def window_loader(arrays, batch_size=256, shuffle=True, workers=0, seed=0):
+    """
+    A DataLoader of (tokens, features) batches.
+
+    Args:
+        arrays (dict): 'tokens' and 'features', see load_sequences.
+        batch_size (int): Windows per batch.
+        shuffle (bool): Random batches, reproducible through `seed`.
+        workers (int): Processes preparing batches; 0 prepares them in the training process.
+        seed (int): Seed of the shuffling.
+    """
+    dataset = WindowDataset(arrays)
+    if shuffle:
+        sampler = RandomSampler(dataset, generator=torch.Generator().manual_seed(seed))
+    else:
+        sampler = SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None,
+                      num_workers=workers, persistent_workers=workers > 0)
+
+
+class ActionTransformer(nn.Module):
+    """Next-action model: a causal transformer encoder over token embeddings and action features"""
+
+    def __init__(self, embeddings, window, n_features=len(FEATURE_NAMES), d_model=64, heads=4, layers=2,
+                 dropout=0.1, freeze_embeddings=False):
+        super().__init__()
+        embeddings = torch.as_tensor(np.asarray(embeddings), dtype=torch.float32)
+        self.token_embedding = nn.Embedding.from_pretrained(embeddings, freeze=freeze_embeddings,
+                                                            padding_idx=PAD_TOKEN)
+        self.token_projection = nn.Linear(embeddings.shape[1], d_model)
+        self.feature_projection = nn.Linear(n_features, d_model)
+        self.position = nn.Embedding(window, d_model)
+        layer = nn.TransformerEncoderLayer(d_model, heads, dim_feedforward=2 * d_model, dropout=dropout,
+                                           batch_first=True)
+        self.encoder = nn.TransformerEncoder(layer, layers, enable_nested_tensor=False)
+        self.head = nn.Linear(d_model, embeddings.shape[0])
+        causal = torch.triu(torch.ones(window, window, dtype=torch.bool), diagonal=1)
+        self.register_buffer("causal_mask", causal, persistent=False)
+
+    def forward(self, tokens, features):
+        n = tokens.shape[1]
+        x = (self.token_projection(self.token_embedding(tokens)) + self.feature_projection(features)
+             + self.position.weight[:n])
+        x = self.encoder(x, mask=self.causal_mask[:n, :n], src_key_padding_mask=tokens == PAD_TOKEN)
+        return self.head(x)
+
+
+def next_action_loss(model, tokens, features):
+    """Cross-entropy of every action's prediction of the next one; returns (loss, correct, predicted)"""
+    logits = model(tokens, features)[:, :-1]
+    targets = tokens[:, 1:]
+    loss = nn.functional.cross_entropy(logits.reshape(-1, logits.shape[-1]), targets.reshape(-1),
+                                       ignore_index=PAD_TOKEN)
+    scored = targets != PAD_TOKEN
+    correct = ((logits.argmax(dim=-1) == targets) & scored).sum().item()
+    return loss, correct, scored.sum().item()
+
+
+def run_epoch(model, loader, optimizer=None):
+    """
+    One pass over a loader, training when an optimizer is given.
+
+    Returns:
+        dict: windows, actions, seconds, windows_per_s, actions_per_s, mean loss and next-action accuracy.
+    """
+    model.train(optimizer is not None)
+    totals = {"windows": 0, "actions": 0, "loss": 0.0, "correct": 0, "predicted": 0}
+    start = time.perf_counter()
+    with torch.set_grad_enabled(optimizer is not None):
+        for tokens, features in loader:
+            loss, correct, predicted = next_action_loss(model, tokens, features)
+            if optimizer is not None:
+                optimizer.zero_grad(set_to_none=True)
+                loss.backward()
+                optimizer.step()
+            totals["windows"] += len(tokens)
+            totals["actions"] += int((tokens != PAD_TOKEN).sum())
+            totals["loss"] += loss.item() * predicted
+            totals["correct"] += correct
+            totals["predicted"] += predicted
+    seconds = time.perf_counter() - start
+    return {
+        "windows": totals["windows"],
+        "actions": totals["actions"],
+        "seconds": seconds,
+        "windows_per_s": totals["windows"] / seconds if seconds else np.nan,
+        "actions_per_s": totals["actions"] / seconds if seconds else np.nan,
+        "loss": totals["loss"] / totals["predicted"] if totals["predicted"] else np.nan,
+        "accuracy": totals["correct"] / totals["predicted"] if totals["predicted"] else np.nan,
+    }
+
+
+def train(arrays, window, epochs=3, batch_size=256, workers=0, threads=None, lr=1e-3, test_share=0.1,
+          embeddings=None, seed=0, progress=True, **model_args):
+    """
+    Train an ActionTransformer on possession windows.
+
+    The last `test_share` of the windows is held out; build the cache with
+    the matches in the order they should be split.
+
+    Args:
+        arrays (dict): 'tokens' and 'features', see load_sequences.
+        window (int): Actions per window of the arrays.
+        epochs (int): Passes over the training windows.
+        batch_size (int): Windows per batch.
+        workers (int): DataLoader worker processes.
+        threads (int, optional): Threads torch computes with, torch's default when not given.
+        lr (float): Adam learning rate.
+        test_share (float): Share of the windows held out.
+        embeddings (np.ndarray, optional): Starting token embeddings, event_embeddings() when not given.
+        seed (int): Seed of the weights and the shuffling.
+        progress (bool): Print a line per epoch.
+        **model_args: Further ActionTransformer arguments (d_model, heads, layers, ...).
+
+    Returns:
+        tuple: (trained model, list of per-epoch metrics with 'train' and 'test' entries).
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(seed)
+    n_test = int(len(arrays["tokens"]) * test_share)
+    cut = len(arrays["tokens"]) - n_test
+    train_arrays = {name: values[:cut] for name, values in arrays.items()}
+    test_arrays = {name: values[cut:] for name, values in arrays.items()}
+
+    model = ActionTransformer(event_embeddings() if embeddings is None else embeddings, window, **model_args)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    train_loader = window_loader(train_arrays, batch_size, shuffle=True, workers=workers, seed=seed)
+    test_loader = window_loader(test_arrays, batch_size, shuffle=False) if n_test else None
+
+    history = []
+    for epoch in range(epochs):
+        metrics = {"epoch": epoch + 1, "train": run_epoch(model, train_loader, optimizer)}
+        if test_loader is not None:
+            metrics["test"] = run_epoch(model, test_loader)
+        history.append(metrics)
+        if progress:
+            t = metrics["train"]
+            line = (f"epoch {epoch + 1}: loss {t['loss']:.3f}, {t['windows_per_s']:.0f} windows/s, "
+                    f"{t['actions_per_s']:.0f} actions/s")
+            if "test" in metrics:
+                line += f", test accuracy {metrics['test']['accuracy']:.3f}"
+            print(line)
+    return model, history
+
+
+if __name__ == "__main__":
+    from connection_pool import get_manager
+    from match_runner import select_matches
+    from spadl_schema import apply_spadl_schema
+    from statements import run
+
+    parser = argparse.ArgumentParser(description="Train the next-action transformer on possession windows")
+    parser.add_argument("--matches", nargs="*", default=None, help="Match ids to train on")
+    parser.add_argument("--team", default=None, help="Every match of teams whose name contains this text")
+    parser.add_argument("--all", action="store_true", help="Every match in the database")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Directory of the window and embedding caches")
+    parser.add_argument("--window", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=2, help="DataLoader worker processes")
+    parser.add_argument("--threads", type=int, default=None, help="torch compute threads")
+    parser.add_argument("--d-model", type=int, default=64)
+    parser.add_argument("--out", default=None, help="Save the model's state_dict here")
+    args = parser.parse_args()
+
+    if not (args.matches or args.team or args.all):
+        parser.error("give --matches, --team or --all")
+    with get_manager().connection() as conn:
+        match_ids = select_matches(conn, args.matches, args.team)
+        directory = build_sequence_cache(match_ids, lambda m: apply_spadl_schema(run(conn, "transition_actions", (m,))),
+                                         args.cache, args.window)
+    arrays, meta = load_sequences(directory)
+    print(f"{meta['windows']} windows of {len(meta['matches'])} matches, vocabulary of {len(VOCABULARY)}")
+    model, _ = train(arrays, args.window, args.epochs, args.batch_size, args.workers, args.threads,
+                     embeddings=event_embeddings(cache_dir=args.cache), d_model=args.d_model)
+    if args.out:
+        torch.save(model.state_dict(), args.out)
+        print(f"model -> {args.out}")
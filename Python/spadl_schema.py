@@ -0,0 +1,63 @@
+"""
+SPADL action columns as integer ids.
+
+The database model documents spadl_actions.action_type, result and bodypart
+as text, while actions written by socceraction hold the SPADL ids. The
+analyses compare ids (`result == 1`, `action_type.isin(SHOT_TYPES)`), so
+the columns are converted once, when the rows are loaded:
+
+    actions = apply_spadl_schema(run(conn, "match_actions", (match_id,)))
+
+Names are matched case-insensitively, with spaces or underscores ('throw in',
+'throw_in'); numbers stored as text ('11') are read as ids.
+"""
+import numpy as np
+import pandas as pd
+
+# SPADL ids are the positions in these lists (socceraction.spadl.config)
+ACTION_TYPES = [
+    "pass", "cross", "throw_in", "freekick_crossed", "freekick_short", "corner_crossed",
+    "corner_short", "take_on", "foul", "tackle", "interception", "shot", "shot_penalty",
+    "shot_freekick", "keeper_save", "keeper_claim", "keeper_punch", "keeper_pick_up",
+    "clearance", "bad_touch", "non_action", "dribble", "goalkick",
+]
+RESULTS = ["fail", "success", "offside", "owngoal", "yellow_card", "red_card"]
+BODYPARTS = ["foot", "head", "other", "head/other", "foot_left", "foot_right"]
+
+SPADL_COLUMNS = {"action_type": ACTION_TYPES, "result": RESULTS, "bodypart": BODYPARTS}
+
+
+def spadl_ids(values, names):
+    """
+    The SPADL ids of a column holding ids, names or a mix of both.
+
+    Args:
+        values (pd.Series): The column as loaded.
+        names (list): The SPADL names, in id order.
+
+    Returns:
+        pd.Series: int64 ids, or float64 with NaN where a value is missing or unknown.
+    """
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values
+    lookup = {name: i for i, name in enumerate(names)}
+    text = values.astype("string").str.strip().str.lower().str.replace(" ", "_", regex=False)
+    ids = pd.to_numeric(text, errors="coerce").fillna(text.map(lookup).astype("float64"))
+    ids = ids.astype(np.float64)
+    return ids.astype(np.int64) if ids.notna().all() else ids
+
+
+def apply_spadl_schema(actions):
+    """
+    Convert the action_type, result and bodypart columns of freshly loaded SPADL actions to ids.
+
+    Args:
+        actions (pd.DataFrame): Rows of the match_actions or transition_actions statements.
+
+    Returns:
+        pd.DataFrame: The same DataFrame with the columns converted.
+    """
+    for column, names in SPADL_COLUMNS.items():
+        if column in actions.columns:
+            actions[column] = spadl_ids(actions[column], names)
+    return actions
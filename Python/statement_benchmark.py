@@ -0,0 +1,111 @@
+"""
+Time many repeated fetches of one named statement, three ways.
+
+- literal: the values formatted into the SQL text, as the loaders used to
+  do; the database parses and plans every call from scratch
+- parameterized: the same SQL text every call with the values sent apart
+- prepared: PREPAREd once on the connection and run with EXECUTE
+
+    python statement_benchmark.py --repeat 1000 --match-id <match_id>
+    python statement_benchmark.py --synthetic
+
+With --synthetic the statements run against the in-memory SQLite copy of the
+synthetic match. SQLite has no PREPARE; there the parameterized run reuses
+the statement the sqlite3 module compiled for the first call, which is the
+same saving, and 'prepared' is the same code path.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from statements import STATEMENTS, _PLACEHOLDER, execute
+
+MODES = ("literal", "parameterized", "prepared")
+
+
+def literal_sql(name, params):
+    """The statement with its values pasted into the text, the way the old f-string loaders built it"""
+    def value(match):
+        v = params[int(match.group(1)) - 1]
+        if isinstance(v, str):
+            return "'" + v.replace("'", "''") + "'"
+        return str(v)
+    return _PLACEHOLDER.sub(value, STATEMENTS[name])
+
+
+def fetch_literal(conn, name, params):
+    return pd.read_sql_query(literal_sql(name, params), getattr(conn, "_conn", conn))
+
+
+def time_mode(conn, mode, name, param_sets, repeat):
+    """Per-call timings in seconds of `repeat` fetches, cycling through the parameter sets"""
+    if mode == "literal":
+        call = lambda params: fetch_literal(conn, name, params)
+    else:
+        prepared = mode == "prepared"
+        call = lambda params: execute(conn, name, params, prepared=prepared)
+    # The first call prepares, it is timed like every other call
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        params = param_sets[i % len(param_sets)]
+        start = time.perf_counter()
+        call(params)
+        timings[i] = time.perf_counter() - start
+    return timings
+
+
+def run_benchmark(conn, name, param_sets, repeat=1000, modes=MODES):
+    """
+    Returns:
+        dict: Per mode the calls, total and mean / p50 / p95 / max time per call in seconds.
+    """
+    results = {}
+    for mode in modes:
+        timings = time_mode(conn, mode, name, param_sets, repeat)
+        results[mode] = {
+            "calls": repeat,
+            "total_s": float(timings.sum()),
+            "mean_s": float(timings.mean()),
+            "p50_s": float(np.percentile(timings, 50)),
+            "p95_s": float(np.percentile(timings, 95)),
+            "max_s": float(timings.max()),
+        }
+    return results
+
+
+def print_results(name, results):
+    print(f"statement '{name}', {next(iter(results.values()))['calls']} calls per mode")
+    print(f"{'mode':<16}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'vs literal':>12}")
+    base = results.get("literal", {}).get("mean_s")
+    for mode, r in results.items():
+        ratio = f"{base / r['mean_s']:.2f}x" if base else ""
+        print(f"{mode:<16}{r['total_s']:>10.3f}{r['mean_s'] * 1000:>10.3f}{r['p50_s'] * 1000:>10.3f}"
+              f"{r['p95_s'] * 1000:>10.3f}{ratio:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare literal, parameterized and prepared statement fetches")
+    parser.add_argument("--statement", default="match_teams", choices=sorted(STATEMENTS))
+    parser.add_argument("--match-id", nargs="*", default=[], help="Match ids to cycle through")
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--synthetic", action="store_true", help="Run against the synthetic match in SQLite")
+    parser.add_argument("--minutes", type=float, default=2, help="Length of the synthetic match")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from synthetic_match import SYNTHETIC_MATCH_ID, generate_match, write_sqlite
+
+        conn = write_sqlite(generate_match(args.minutes))
+        param_sets = [(match_id,) for match_id in args.match_id or [SYNTHETIC_MATCH_ID]]
+        results = run_benchmark(conn, args.statement, param_sets, args.repeat)
+        conn.close()
+    else:
+        from connection_pool import get_manager
+
+        with get_manager().connection() as conn:
+            match_ids = args.match_id or execute(conn, "all_matches")["match_id"].head(10).tolist()
+            param_sets = [(match_id,) for match_id in match_ids]
+            results = run_benchmark(conn, args.statement, param_sets, args.repeat)
+    print_results(args.statement, results)
@@ -0,0 +1,406 @@
+"""
+Named, parameterized SQL statements for every loader.
+
+Values never end up in the SQL text: every statement takes positional $1, $2
+parameters. On PostgreSQL a statement is PREPAREd once per pooled connection
+and then run with EXECUTE, so the server parses and plans it once instead of
+on every call, and a match id can never be read as SQL.
+
+    from statements import run
+    tracking = run(conn, "tracking", (game_id,))
+
+Connections that do not speak PostgreSQL (the in-memory SQLite database of
+the synthetic match) run the same statements as ordinary parameterized
+queries.
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+STATEMENTS = {
+    # Tracking rows only; the team of every player comes from the cached roster
+    "tracking": """
+        SELECT pt.frame_id, pt.period_id, pt.timestamp, pt.player_id, pt.x, pt.y
+        FROM player_tracking pt
+        WHERE pt.game_id = $1
+    """,
+    "tracking_by_frame": """
+        SELECT pt.period_id, pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y
+        FROM player_tracking pt
+        WHERE pt.game_id = $1
+        ORDER BY pt.period_id, pt.frame_id
+    """,
+    "tracking_period_by_frame": """
+        SELECT pt.period_id, pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y
+        FROM player_tracking pt
+        WHERE pt.game_id = $1 AND pt.period_id = $2
+        ORDER BY pt.frame_id
+    """,
+    "tracking_window": """
+        SELECT pt.frame_id, pt.period_id, pt.timestamp, pt.player_id, pt.x, pt.y
+        FROM player_tracking pt
+        WHERE pt.game_id = $1 AND pt.timestamp >= $2 AND pt.timestamp < $3
+        ORDER BY pt.timestamp, pt.frame_id
+    """,
+    "tracking_window_period": """
+        SELECT pt.frame_id, pt.period_id, pt.timestamp, pt.player_id, pt.x, pt.y
+        FROM player_tracking pt
+        WHERE pt.game_id = $1 AND pt.timestamp >= $2 AND pt.timestamp < $3 AND pt.period_id = $4
+        ORDER BY pt.timestamp, pt.frame_id
+    """,
+    "roster": """
+        SELECT p.player_id, p.player_name, p.jersey_number, p.team_id
+        FROM players p
+    """,
+    "player_dimension": """
+        SELECT p.player_id, p.player_name, p.jersey_number, p.team_id
+        FROM players p
+        JOIN matches m ON p.team_id = m.home_team_id OR p.team_id = m.away_team_id
+        WHERE m.match_id = $1
+        ORDER BY p.team_id, p.jersey_number
+    """,
+    "match_teams": """
+        SELECT m.home_team_id, m.away_team_id
+        FROM matches m
+        WHERE m.match_id = $1
+    """,
+    "match": """
+        SELECT m.match_id, m.home_score, m.away_score, m.home_team_id, m.away_team_id,
+               CONCAT(t1.team_name, ' vs ', t2.team_name) AS matchup
+        FROM matches m
+        JOIN teams t1 ON m.home_team_id = t1.team_id
+        JOIN teams t2 ON m.away_team_id = t2.team_id
+        WHERE m.match_id = $1
+    """,
+    # Teams (with names), date and score of one match, see async_db.fetch_match
+    "match_details": """
+        SELECT m.match_id, m.match_date, m.home_team_id, ht.team_name AS home_team_name,
+               m.away_team_id, at.team_name AS away_team_name, m.home_score, m.away_score
+        FROM matches m
+        JOIN teams ht ON m.home_team_id = ht.team_id
+        JOIN teams at ON m.away_team_id = at.team_id
+        WHERE m.match_id = $1
+    """,
+    "all_matches": """
+        SELECT m.match_id, m.home_score, m.away_score, m.home_team_id, m.away_team_id,
+               CONCAT(t1.team_name, ' vs ', t2.team_name) AS matchup
+        FROM matches m
+        JOIN teams t1 ON m.home_team_id = t1.team_id
+        JOIN teams t2 ON m.away_team_id = t2.team_id
+        ORDER BY m.match_id
+    """,
+    # One catalog page after a match_id (the keyset cursor $1), $2 rows, see match_catalog.py
+    "match_page": """
+        SELECT m.match_id, m.home_score, m.away_score, m.home_team_id, m.away_team_id,
+               CONCAT(t1.team_name, ' vs ', t2.team_name) AS matchup
+        FROM matches m
+        JOIN teams t1 ON m.home_team_id = t1.team_id
+        JOIN teams t2 ON m.away_team_id = t2.team_id
+        WHERE m.match_id > $1
+        ORDER BY m.match_id
+        LIMIT $2
+    """,
+    # The same, restricted to teams whose name matches the ILIKE pattern $3
+    "match_page_search": """
+        WITH found AS (
+            SELECT team_id FROM teams WHERE team_name ILIKE $3
+        )
+        SELECT m.match_id, m.home_score, m.away_score, m.home_team_id, m.away_team_id,
+               CONCAT(t1.team_name, ' vs ', t2.team_name) AS matchup
+        FROM matches m
+        JOIN teams t1 ON m.home_team_id = t1.team_id
+        JOIN teams t2 ON m.away_team_id = t2.team_id
+        WHERE m.match_id > $1
+            AND (m.home_team_id IN (SELECT team_id FROM found) OR m.away_team_id IN (SELECT team_id FROM found))
+        ORDER BY m.match_id
+        LIMIT $2
+    """,
+    "match_events": """
+        SELECT me.match_id, me.event_id, me.eventtype_id, et.name AS eventtype_name, me.result, me.success,
+               me.period_id, me.timestamp, me.end_timestamp, me.ball_state, me.ball_owning_team,
+               me.team_id, me.player_id, me.x, me.y, me.end_coordinates_x,
+               me.end_coordinates_y, me.receiver_player_id, rp.team_id AS receiver_team_id
+        FROM matchevents me
+        LEFT JOIN players rp ON me.receiver_player_id = rp.player_id
+        LEFT JOIN eventtypes et ON me.eventtype_id = et.eventtype_id
+        WHERE me.match_id = $1
+        ORDER BY me.period_id ASC, me.timestamp ASC
+    """,
+    # The events of one match as the xT scripts (SoccerationV2) expect them
+    "xt_events": """
+        SELECT e.name AS event_type, me.player_id, me.team_id, me.x AS start_x, me.y AS start_y,
+               me.end_coordinates_x AS end_x, me.end_coordinates_y AS end_y,
+               me.match_id AS game_id, me.period_id, me.timestamp AS time, me.result AS outcome,
+               me.eventtype_id, me.ball_owning_team
+        FROM matchevents me
+        JOIN eventtypes e ON me.eventtype_id = e.eventtype_id
+        WHERE me.match_id = $1
+        ORDER BY me.period_id, me.timestamp
+    """,
+    # $1 is an array of match ids; the event count is the runner's measure of match size
+    "match_event_counts": """
+        SELECT me.match_id, COUNT(*) AS events
+        FROM matchevents me
+        WHERE me.match_id = ANY($1)
+        GROUP BY me.match_id
+    """,
+    # $1 is an ILIKE pattern, see match_catalog.team_name_pattern
+    "team_matches": """
+        SELECT m.match_id, m.match_date, m.home_team_id, ht.team_name AS home_team_name,
+               m.away_team_id, at.team_name AS away_team_name,
+               CASE WHEN ht.team_name ILIKE $1 THEN 1 ELSE 0 END AS home
+        FROM matches m
+        JOIN teams ht ON m.home_team_id = ht.team_id
+        JOIN teams at ON m.away_team_id = at.team_id
+        WHERE ht.team_name ILIKE $1 OR at.team_name ILIKE $1
+    """,
+    # SPADL actions and tracked frames per player, the inputs of leaderboard.py
+    "match_actions": """
+        SELECT a.id, a.game_id AS match_id, a.period_id, a.seconds, a.player_id, a.team_id,
+               a.start_x, a.start_y, a.end_x, a.end_y, a.action_type, a.result, a.bodypart
+        FROM spadl_actions a
+        WHERE a.game_id = $1
+        ORDER BY a.period_id, a.seconds, a.id
+    """,
+    # One row per action: the home side comes from matches, never from a join on teams
+    "transition_actions": """
+        SELECT a.id, a.game_id AS match_id, a.period_id, a.seconds, a.player_id, a.team_id,
+               a.start_x, a.start_y, a.end_x, a.end_y, a.action_type, a.result, a.bodypart,
+               m.home_team_id
+        FROM spadl_actions a
+        JOIN matches m ON m.match_id = a.game_id
+        WHERE a.game_id = $1
+        ORDER BY a.period_id, a.seconds, a.id
+    """,
+    # Matches a model version already has predictions for, see model_scoring.py
+    "scored_matches": """
+        SELECT DISTINCT p.match_id
+        FROM action_predictions p
+        WHERE p.model = $1 AND p.version = $2
+    """,
+    "tracking_presence": """
+        SELECT pt.player_id, p.team_id, COUNT(*) AS frames
+        FROM player_tracking pt
+        JOIN players p ON p.player_id = pt.player_id
+        WHERE pt.game_id = $1 AND p.team_id IS NOT NULL
+        GROUP BY pt.player_id, p.team_id
+    """,
+    # Materialized summaries, see match_summaries.py
+    "unsummarized_matches": """
+        SELECT m.match_id
+        FROM matches m
+        LEFT JOIN match_summary s ON s.match_id = m.match_id
+        WHERE s.match_id IS NULL
+        ORDER BY m.match_id
+    """,
+    "match_summary": """
+        SELECT s.match_id, s.home_team_id, s.away_team_id, s.frames, s.events, s.duration_s, s.refreshed_at
+        FROM match_summary s
+        WHERE s.match_id = $1
+    """,
+    "team_match_summaries": """
+        SELECT ts.match_id, ts.team_id, ts.possession_s, ts.possession_share, ts.events, ts.passes,
+               ts.passes_completed, ts.shots, ts.shots_successful, ts.xt, ts.distance_m
+        FROM team_match_summary ts
+        WHERE ts.match_id = $1
+        ORDER BY ts.team_id
+    """,
+    # $1 is an array of match ids, e.g. one page of the match menu
+    "team_match_summaries_for": """
+        SELECT ts.match_id, ts.team_id, ts.possession_share, ts.shots, ts.xt
+        FROM team_match_summary ts
+        WHERE ts.match_id = ANY($1)
+    """,
+    "player_match_summaries": """
+        SELECT ps.match_id, ps.player_id, ps.team_id, ps.minutes, ps.events, ps.passes,
+               ps.passes_completed, ps.shots, ps.xt, ps.distance_m
+        FROM player_match_summary ps
+        WHERE ps.match_id = $1
+        ORDER BY ps.team_id, ps.xt DESC
+    """,
+    "player_summaries": """
+        SELECT ps.match_id, ps.player_id, ps.team_id, ps.minutes, ps.events, ps.passes,
+               ps.passes_completed, ps.shots, ps.xt, ps.distance_m
+        FROM player_match_summary ps
+        WHERE ps.player_id = $1
+        ORDER BY ps.match_id
+    """,
+    # Possession changes after a spell of at least three actions
+    "possession_changes": """
+        WITH action_changes AS (
+            SELECT
+                a.*,
+                LAG(a.team_id) OVER (ORDER BY a.period_id, a.seconds, a.id) AS prev_team_id,
+                LEAD(a.team_id) OVER (ORDER BY a.period_id, a.seconds, a.id) AS next_team_id
+            FROM spadl_actions a
+            WHERE a.game_id = $1
+        ),
+        possession_markers AS (
+            SELECT
+                *,
+                CASE
+                    WHEN prev_team_id IS NULL OR team_id != prev_team_id
+                    THEN 1
+                    ELSE 0
+                END AS is_new_possession
+            FROM action_changes
+        ),
+        possession_sequences AS (
+            SELECT
+                *,
+                SUM(is_new_possession) OVER (ORDER BY period_id, seconds, id) AS possession_group
+            FROM possession_markers
+        ),
+        possession_stats AS (
+            SELECT
+                possession_group,
+                team_id,
+                COUNT(*) AS action_count,
+                MAX(id) AS last_action_id
+            FROM possession_sequences
+            GROUP BY possession_group, team_id
+        )
+        SELECT
+            s.id,
+            s.period_id,
+            s.seconds,
+            s.action_type,
+            s.team_id AS losing_team_id,
+            s.next_team_id AS gaining_team_id,
+            t1.team_name AS losing_team,
+            t2.team_name AS gaining_team,
+            s.start_x,
+            s.start_y,
+            s.end_x,
+            s.end_y,
+            ps.action_count
+        FROM possession_sequences s
+        JOIN possession_stats ps ON s.possession_group = ps.possession_group
+                                 AND s.team_id = ps.team_id
+                                 AND s.id = ps.last_action_id
+        JOIN teams t1 ON s.team_id = t1.team_id
+        JOIN teams t2 ON s.next_team_id = t2.team_id
+        WHERE ps.action_count >= 3
+            AND s.team_id != s.next_team_id
+            AND s.next_team_id IS NOT NULL
+        ORDER BY s.period_id, s.seconds
+    """,
+}
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+# Statements already prepared, per (connection, server process)
+_prepared = {}
+_lock = threading.Lock()
+
+
+def raw_connection(conn):
+    """The driver connection behind a pooled connection"""
+    return getattr(conn, "_conn", conn)
+
+
+def is_postgres(raw):
+    """Whether a driver connection (see raw_connection) is a psycopg2 PostgreSQL connection"""
+    return hasattr(raw, "get_backend_pid")
+
+
+def _session_key(raw):
+    return id(raw), raw.get_backend_pid()
+
+
+def _parameter_count(name):
+    return max((int(n) for n in _PLACEHOLDER.findall(STATEMENTS[name])), default=0)
+
+
+def prepare(conn, name):
+    """
+    PREPARE a statement on a PostgreSQL connection, once per session.
+
+    Statements prepared by an earlier checkout of the same pooled connection
+    are found in pg_prepared_statements and not prepared again.
+    """
+    raw = raw_connection(conn)
+    key = _session_key(raw)
+    with _lock:
+        if name in _prepared.get(key, ()):
+            return
+    with raw.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s;", (name,))
+        if cur.fetchone() is None:
+            cur.execute(f"PREPARE {name} AS {STATEMENTS[name]};")
+    with _lock:
+        _prepared.setdefault(key, set()).add(name)
+
+
+def _execute_prepared(raw, name, params):
+    placeholders = ", ".join(["%s"] * len(params))
+    with raw.cursor() as cur:
+        cur.execute(f"EXECUTE {name} ({placeholders});" if params else f"EXECUTE {name};", params)
+        columns = [column[0] for column in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+
+def pyformat(name, params=()):
+    """
+    A statement in the pyformat paramstyle of psycopg2 and psycopg 3.
+
+    Returns:
+        tuple: (query with %(p1)s, %(p2)s, ... placeholders, dict of the values).
+    """
+    query = _PLACEHOLDER.sub(lambda m: f"%(p{m.group(1)})s", STATEMENTS[name])
+    params = (p.item() if isinstance(p, np.generic) else p for p in params)
+    return query, {f"p{i + 1}": v for i, v in enumerate(params)}
+
+
+def execute(conn, name, params=(), prepared=True):
+    """
+    Run a named statement and return the rows.
+
+    Args:
+        conn: A psycopg2 (pooled) connection, or any DB-API connection using
+            the qmark paramstyle, like sqlite3.
+        name (str): A key of STATEMENTS.
+        params (tuple): The values of $1, $2, ...
+        prepared (bool): Use a server-side prepared statement (PostgreSQL only).
+
+    Returns:
+        pd.DataFrame: The result rows.
+    """
+    # The drivers do not adapt numpy scalars, e.g. ids taken from a DataFrame
+    params = tuple(p.item() if isinstance(p, np.generic) else p for p in params)
+    expected = _parameter_count(name)
+    if len(params) != expected:
+        raise ValueError(f"Statement '{name}' takes {expected} parameters, got {len(params)}")
+
+    raw = raw_connection(conn)
+    if not is_postgres(raw):
+        # SQLite understands numbered ?1, ?2 placeholders
+        return pd.read_sql_query(_PLACEHOLDER.sub(r"?\1", STATEMENTS[name]), raw, params=params)
+    if not prepared:
+        query, values = pyformat(name, params)
+        return pd.read_sql_query(query, raw, params=values)
+
+    import psycopg2.errors
+
+    prepare(raw, name)
+    try:
+        return _execute_prepared(raw, name, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # The session lost its prepared statements (DEALLOCATE ALL, pooler); prepare again
+        raw.rollback()
+        with _lock:
+            _prepared.pop(_session_key(raw), None)
+        prepare(raw, name)
+        return _execute_prepared(raw, name, params)
+
+
+def run(conn, name, params=(), prepared=True):
+    """`execute`, timed as a db.fetch span"""
+    with span("db.fetch", statement=name) as s:
+        df = execute(conn, name, params, prepared)
+        s["rows"] = len(df)
+    return df
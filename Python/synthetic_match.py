@@ -0,0 +1,303 @@
+"""
+Synthetic match generator for benchmarks and offline development.
+
+Produces the same tables as the hosted database (matches, teams, players,
+player_tracking, matchevents, eventtypes and spadl_actions) for a made-up
+match of configurable length: 22 players and the ball at 25 Hz, with the
+ball travelling between the players who make the on-ball events, so the
+tracking, events and SPADL actions tell the same story.
+
+    tables = generate_match(duration_minutes=10, seed=1)
+    conn = write_sqlite(tables)                 # in-memory SQLite stand-in
+    fetch_tracking_data(SYNTHETIC_MATCH_ID, conn)
+
+Tracking coordinates are percentages of the pitch like the real data, event
+and SPADL coordinates are in meters; timestamps restart every period.
+"""
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+PITCH_LENGTH = 105.0
+PITCH_WIDTH = 68.0
+FRAME_RATE = 25
+HALF_TIME_SECONDS = 15 * 60
+
+SYNTHETIC_MATCH_ID = "synthetic-match-0001"
+HOME_TEAM_ID = "synthetic-home"
+AWAY_TEAM_ID = "synthetic-away"
+
+# 4-4-2 for the team attacking towards x = 100, in pitch percentages
+FORMATION = np.array([
+    (5, 50),
+    (22, 15), (20, 38), (20, 62), (22, 85),
+    (45, 12), (42, 38), (42, 62), (45, 88),
+    (65, 40), (65, 60),
+], dtype=np.float64)
+
+# SPADL action type ids, also used as matchevents eventtype ids
+EVENT_TYPES = {0: "pass", 11: "shot", 21: "dribble", 9: "tackle", 10: "interception", 18: "clearance"}
+EVENT_WEIGHTS = {0: 0.72, 21: 0.12, 9: 0.05, 10: 0.05, 18: 0.04, 11: 0.02}
+SUCCESS_RATE = {0: 0.82, 11: 0.3, 21: 0.6, 9: 0.55, 10: 0.9, 18: 0.7}
+
+
+def _format_timestamps(seconds):
+    """Period-relative seconds -> 'HH:MM:SS.ffffff' strings as stored in the database"""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    micros = np.round(seconds * 1e6).astype(np.int64)
+    hours, rest = np.divmod(micros, 3600 * 10**6)
+    minutes, rest = np.divmod(rest, 60 * 10**6)
+    secs, micro = np.divmod(rest, 10**6)
+    return [f"{h:02d}:{m:02d}:{s:02d}.{u:06d}" for h, m, s, u in zip(hours, minutes, secs, micro)]
+
+
+def _smooth_walk(rng, shape, frame_rate, speed, reversion_seconds, velocity_seconds=2.0):
+    """Zero-mean random walk along axis 0 with a smooth (AR(1)) velocity"""
+    a_v = np.exp(-1.0 / (velocity_seconds * frame_rate))
+    a_p = np.exp(-1.0 / (reversion_seconds * frame_rate))
+    denominator = np.convolve([1.0, -a_v], [1.0, -a_p])
+    return lfilter([1.0], denominator, rng.normal(0, speed, shape), axis=0)
+
+
+def _player_paths(rng, n_frames, frame_rate, attack_right):
+    """Smooth (n_frames, 11) x and y paths around the formation, in pitch percentages"""
+    base = FORMATION if attack_right else np.column_stack([100 - FORMATION[:, 0], 100 - FORMATION[:, 1]])
+
+    # Team block sliding up and down the pitch, plus a per-player wander. Both
+    # are mean-reverting positions driven by a smoothly varying velocity, which
+    # keeps running speeds in a realistic range.
+    shift = _smooth_walk(rng, (n_frames,), frame_rate, speed=0.01, reversion_seconds=20)
+    wander = _smooth_walk(rng, (n_frames, 11, 2), frame_rate, speed=0.012, reversion_seconds=6)
+
+    x = base[:, 0] + shift[:, None] + wander[:, :, 0]
+    y = base[:, 1] + wander[:, :, 1]
+    return np.clip(x, 0.5, 99.5), np.clip(y, 0.5, 99.5)
+
+
+def _period_events(rng, period_id, seconds, frame_rate, positions, player_ids, team_ids, start_side):
+    """On-ball events of one period and the ball path between them"""
+    n_frames = len(seconds)
+
+    # Event times: roughly one touch every 2.5 seconds, never closer than 0.6 seconds
+    gaps = np.maximum(rng.exponential(2.5, int(seconds[-1] / 0.6) + 2), 0.6)
+    times = np.cumsum(gaps) - gaps[0]
+    times = times[times <= seconds[-1]]
+    frames = np.minimum(np.round(times * frame_rate).astype(int), n_frames - 1)
+
+    types = rng.choice(list(EVENT_WEIGHTS), size=len(frames), p=list(EVENT_WEIGHTS.values()))
+    success = rng.random(len(frames)) < np.vectorize(SUCCESS_RATE.get)(types)
+
+    # Who is on the ball: possession flips after failed actions and after shots.
+    # The ball goes to one of the nearest teammates, or to the opponent nearest
+    # to where it was lost, so ball speeds stay plausible.
+    xs, ys = positions
+    actor = np.empty(len(frames), dtype=int)
+    side = start_side
+    current = side * 11 + rng.integers(1, 11)
+    for i, frame in enumerate(frames):
+        if i > 0:
+            previous = frames[i - 1]
+            team = slice(side * 11, side * 11 + 11)
+            distance = np.hypot(xs[frame, team] - xs[previous, current], ys[frame, team] - ys[previous, current])
+            if side * 11 <= current < side * 11 + 11:
+                distance[current - side * 11] = np.inf
+                current = side * 11 + rng.choice(np.argsort(distance)[:4])
+            else:
+                current = side * 11 + np.argmin(distance)
+        actor[i] = current
+        if not success[i] or types[i] == 11:
+            side = 1 - side
+
+    ball_x = positions[0][frames, actor]
+    ball_y = positions[1][frames, actor]
+
+    # The ball travels in a straight line from one event to the next
+    ball_path_x = np.interp(np.arange(n_frames), frames, ball_x)
+    ball_path_y = np.interp(np.arange(n_frames), frames, ball_y)
+
+    next_actor = np.r_[actor[1:], actor[-1]]
+    receiver = np.where((types == 0) & success, next_actor, -1)
+    events = pd.DataFrame({
+        "period_id": period_id,
+        "seconds": times,
+        "end_seconds": np.r_[times[1:], times[-1]],
+        "eventtype_id": types,
+        "success": success,
+        "team_id": team_ids[actor],
+        "player_id": player_ids[actor],
+        "x": ball_x * PITCH_LENGTH / 100,
+        "y": ball_y * PITCH_WIDTH / 100,
+        "end_coordinates_x": np.r_[ball_x[1:], ball_x[-1]] * PITCH_LENGTH / 100,
+        "end_coordinates_y": np.r_[ball_y[1:], ball_y[-1]] * PITCH_WIDTH / 100,
+        "receiver_player_id": np.where(receiver >= 0, player_ids[np.maximum(receiver, 0)], None),
+    })
+    return events, ball_path_x, ball_path_y
+
+
+def generate_match(duration_minutes=90, frame_rate=FRAME_RATE, seed=0, match_id=SYNTHETIC_MATCH_ID,
+                   tracking_gaps=0):
+    """
+    Generate all tables of one synthetic match.
+
+    Args:
+        duration_minutes (float): Playing time, split over two periods.
+        frame_rate (int): Tracking frames per second.
+        seed (int): Seed of the random generator, the same seed gives the same match.
+        match_id (str): ID of the generated match.
+        tracking_gaps (int): Number of 0.5-2 second dropouts in the tracking per period.
+
+    Returns:
+        dict: DataFrames keyed by table name.
+    """
+    rng = np.random.default_rng(seed)
+    team_ids = np.array([HOME_TEAM_ID] * 11 + [AWAY_TEAM_ID] * 11, dtype=object)
+    player_ids = np.array([f"{team}-{n + 1}" for team in (HOME_TEAM_ID, AWAY_TEAM_ID) for n in range(11)],
+                          dtype=object)
+    tracked_ids = np.append(player_ids, "ball")
+
+    period_frames = int(duration_minutes * 60 / 2 * frame_rate)
+    tracking, events = [], []
+    frame_offset = 0
+    start_side = 0
+    for period_id in (1, 2):
+        seconds = np.arange(period_frames) / frame_rate
+        # Teams change ends at half time
+        home_x, home_y = _player_paths(rng, period_frames, frame_rate, attack_right=period_id == 1)
+        away_x, away_y = _player_paths(rng, period_frames, frame_rate, attack_right=period_id != 1)
+        positions = (np.hstack([home_x, away_x]), np.hstack([home_y, away_y]))
+
+        period_events, ball_x, ball_y = _period_events(
+            rng, period_id, seconds, frame_rate, positions, player_ids, team_ids, start_side)
+        start_side = 1 - start_side
+        events.append(period_events)
+
+        # Frame-major rows: every player and then the ball for each frame
+        x = np.column_stack([positions[0], ball_x])
+        y = np.column_stack([positions[1], ball_y])
+        keep = np.ones(period_frames, dtype=bool)
+        for _ in range(tracking_gaps):
+            start = rng.integers(0, max(1, period_frames - 2 * frame_rate))
+            keep[start:start + rng.integers(frame_rate // 2, 2 * frame_rate)] = False
+
+        frame_index = np.flatnonzero(keep)
+        timestamps = np.array(_format_timestamps(seconds[frame_index]), dtype=object)
+        tracking.append(pd.DataFrame({
+            "game_id": match_id,
+            "frame_id": np.repeat(frame_offset + frame_index, 23),
+            "timestamp": np.repeat(timestamps, 23),
+            "period_id": period_id,
+            "player_id": np.tile(tracked_ids, len(frame_index)),
+            "x": x[frame_index].ravel(),
+            "y": y[frame_index].ravel(),
+        }))
+        # Frame ids keep counting through the half-time break, like the real feed
+        frame_offset += period_frames + HALF_TIME_SECONDS * frame_rate
+
+    player_tracking = pd.concat(tracking, ignore_index=True)
+    player_tracking.insert(0, "id", np.arange(1, len(player_tracking) + 1))
+
+    events = pd.concat(events, ignore_index=True)
+    ball_owning_team = events["team_id"]
+    matchevents = pd.DataFrame({
+        "match_id": match_id,
+        "event_id": [f"{match_id}-{i + 1}" for i in range(len(events))],
+        "eventtype_id": events["eventtype_id"],
+        "result": events["success"].astype(int),
+        "success": events["success"],
+        "period_id": events["period_id"],
+        "timestamp": _format_timestamps(events["seconds"]),
+        "end_timestamp": _format_timestamps(events["end_seconds"]),
+        "ball_state": "alive",
+        "ball_owning_team": ball_owning_team,
+        "team_id": events["team_id"],
+        "player_id": events["player_id"],
+        "x": events["x"],
+        "y": events["y"],
+        "end_coordinates_x": events["end_coordinates_x"],
+        "end_coordinates_y": events["end_coordinates_y"],
+        "receiver_player_id": events["receiver_player_id"],
+    })
+
+    spadl_actions = pd.DataFrame({
+        "id": np.arange(1, len(events) + 1),
+        "game_id": match_id,
+        "period_id": events["period_id"],
+        "seconds": events["seconds"],
+        "player_id": events["player_id"],
+        "team_id": events["team_id"],
+        "start_x": events["x"],
+        "start_y": events["y"],
+        "end_x": events["end_coordinates_x"],
+        "end_y": events["end_coordinates_y"],
+        "action_type": events["eventtype_id"],
+        "result": events["success"].astype(int),
+        "bodypart": 0,
+    })
+
+    home_goals, away_goals = (
+        int(((events["eventtype_id"] == 11) & events["success"] & (events["team_id"] == team)).sum())
+        for team in (HOME_TEAM_ID, AWAY_TEAM_ID)
+    )
+    return {
+        "matches": pd.DataFrame([{
+            "match_id": match_id, "match_date": pd.Timestamp("2024-08-03 15:00"),
+            "home_team_id": HOME_TEAM_ID, "away_team_id": AWAY_TEAM_ID,
+            "home_score": home_goals, "away_score": away_goals,
+        }]),
+        "teams": pd.DataFrame({"team_id": [HOME_TEAM_ID, AWAY_TEAM_ID],
+                               "team_name": ["Synthetic Home FC", "Synthetic Away FC"]}),
+        "players": pd.DataFrame({
+            "player_id": tracked_ids,
+            "player_name": [f"Player {n % 11 + 1}" for n in range(22)] + ["ball"],
+            "team_id": np.append(team_ids, None),
+            "jersey_number": list(range(1, 12)) * 2 + [None],
+        }),
+        "player_tracking": player_tracking,
+        "eventtypes": pd.DataFrame({"eventtype_id": list(EVENT_TYPES), "name": list(EVENT_TYPES.values()),
+                                    "description": list(EVENT_TYPES.values())}),
+        "matchevents": matchevents,
+        "spadl_actions": spadl_actions,
+    }
+
+
+def write_sqlite(tables, path=":memory:"):
+    """
+    Load generated tables into SQLite, a network-free stand-in for the database.
+
+    The named statements of statements.py run unchanged against it, except
+    for those using PostgreSQL-only syntax (ILIKE, CONCAT on older SQLite).
+
+    Args:
+        tables (dict): Output of generate_match.
+        path (str): Database file, in memory by default.
+
+    Returns:
+        sqlite3.Connection: An open connection to the filled database.
+    """
+    conn = sqlite3.connect(path)
+    for name, df in tables.items():
+        df.to_sql(name, conn, if_exists="replace", index=False, chunksize=100_000)
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_tracking_game_frame ON player_tracking (game_id, frame_id);
+        CREATE INDEX IF NOT EXISTS idx_events_match ON matchevents (match_id);
+        CREATE INDEX IF NOT EXISTS idx_spadl_game ON spadl_actions (game_id);
+    """)
+    conn.commit()
+    return conn
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic match into a SQLite file")
+    parser.add_argument("output", help="SQLite database file")
+    parser.add_argument("--minutes", type=float, default=90, help="Playing time in minutes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gaps", type=int, default=0, help="Tracking dropouts per period")
+    args = parser.parse_args()
+
+    tables = generate_match(args.minutes, seed=args.seed, tracking_gaps=args.gaps)
+    write_sqlite(tables, args.output).close()
+    for name, df in tables.items():
+        print(f"{name}: {len(df)} rows")
@@ -0,0 +1,138 @@
+"""
+Per-team xT, possession and event rates over rolling windows.
+
+All matches and teams are binned in one grouped pass: every event adds its
+xT, its count and the possession time that follows it to a
+(match and team, time bin) cell with `np.add.at`, and a rolling window is a
+difference of cumulative sums along the bins. The cost is linear in the
+number of events and bins, not minutes x events, and a season of matches
+goes through the same call as a single one:
+
+    events = fetch_match_events(match_id, conn)
+    events["xt"] = event_xt(events, grid)
+    tl = xt_timeline(events, window=5)          # one row per match, team and minute
+
+Time is the match clock (see tracking_schema.PERIOD_OFFSETS), so the second
+half starts at minute 45 whatever the length of the first half's stoppage time.
+"""
+import numpy as np
+import pandas as pd
+
+from tracking_schema import match_clock
+
+TIMELINE_COLUMNS = [
+    "match_id", "team_id", "minute", "xt", "events", "possession_s",
+    "xt_rolling", "event_rate", "possession_share", "xt_momentum",
+]
+
+
+def _match_column(events):
+    """The xT scripts call the match id game_id"""
+    return "match_id" if "match_id" in events.columns else "game_id"
+
+
+def _clock(events):
+    if "match_clock" in events.columns:
+        return events["match_clock"].to_numpy(dtype=np.float64)
+    return match_clock(events["seconds"].astype(np.float64), events["period_id"]).to_numpy()
+
+
+def _held_seconds(events, match_codes, clock):
+    """Seconds until the next event of the same match and period, 0 for the last one"""
+    period_ids = events["period_id"].to_numpy()
+    order = np.lexsort((clock, period_ids, match_codes))
+    m, p, c = match_codes[order], period_ids[order], clock[order]
+    same_period = (m[1:] == m[:-1]) & (p[1:] == p[:-1])
+    held = np.zeros(len(order))
+    held[order[:-1]] = np.where(same_period, np.clip(c[1:] - c[:-1], 0.0, None), 0.0)
+    return held
+
+
+def xt_timeline(events, window=5, bin_seconds=60):
+    """
+    Per match, team and time bin: xT, events and possession, plus their rolling values.
+
+    Args:
+        events (pd.DataFrame): Events of one or many matches with a match_id
+            (or game_id), team_id, period_id, 'seconds' or 'match_clock', and
+            an 'xt' column (see match_summaries.event_xt). With a
+            ball_owning_team column possession time is counted as well.
+        window (int): Length of the trailing rolling window, in bins.
+        bin_seconds (float): Width of a time bin in seconds.
+
+    Returns:
+        pd.DataFrame: The columns of TIMELINE_COLUMNS, one row per match, team
+            and bin ('minute' is the start of the bin). 'xt_rolling' is the xT
+            of the last `window` bins, 'event_rate' the events per minute in
+            it, 'possession_share' the team's share of the possession in it
+            and 'xt_momentum' its rolling xT minus the opponents'.
+    """
+    if events.empty:
+        return pd.DataFrame(columns=TIMELINE_COLUMNS)
+
+    match_col = _match_column(events)
+    events = events[events["team_id"].notna()]
+    clock = _clock(events)
+    bins = np.maximum(clock // bin_seconds, 0).astype(np.int64)
+    n_bins = int(bins.max()) + 1
+
+    # One row of cells per (match, team); teams that only own the ball count too
+    match_codes, match_ids = pd.factorize(events[match_col])
+    team_ids = events["team_id"].astype(object).to_numpy()
+    has_owner = np.zeros(len(events), dtype=bool)
+    if "ball_owning_team" in events.columns:
+        has_owner = events["ball_owning_team"].notna().to_numpy()
+        owner_ids = events["ball_owning_team"].astype(object).to_numpy()[has_owner]
+    else:
+        owner_ids = np.empty(0, dtype=object)
+    pair_codes, pairs = pd.MultiIndex.from_arrays([
+        np.r_[match_codes, match_codes[has_owner]],
+        np.r_[team_ids, owner_ids],
+    ]).factorize()
+    acting, owning = pair_codes[:len(events)], pair_codes[len(events):]
+    n_pairs = len(pairs)
+
+    xt = np.zeros((n_pairs, n_bins))
+    counts = np.zeros((n_pairs, n_bins))
+    possession = np.zeros((n_pairs, n_bins))
+    np.add.at(xt, (acting, bins), events["xt"].fillna(0.0).to_numpy(dtype=np.float64))
+    np.add.at(counts, (acting, bins), 1.0)
+    held = _held_seconds(events, match_codes, clock)
+    np.add.at(possession, (owning, bins[has_owner]), held[has_owner])
+
+    def rolling(values):
+        cumulative = np.cumsum(values, axis=1)
+        shifted = np.zeros_like(cumulative)
+        shifted[:, window:] = cumulative[:, :-window]
+        return cumulative - shifted
+
+    xt_rolling = rolling(xt)
+    possession_rolling = rolling(possession)
+
+    # Totals of all teams of the same match, for the shares and the momentum
+    pair_match = np.asarray(pairs.get_level_values(0), dtype=np.int64)
+    match_xt = np.zeros((len(match_ids), n_bins))
+    match_possession = np.zeros((len(match_ids), n_bins))
+    np.add.at(match_xt, pair_match, xt_rolling)
+    np.add.at(match_possession, pair_match, possession_rolling)
+    total_possession = match_possession[pair_match]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.where(total_possession > 0, possession_rolling / total_possession, np.nan)
+
+    # Only the bins each match actually lasted
+    match_last_bin = pd.Series(bins).groupby(match_codes).max().to_numpy()
+    in_match = np.arange(n_bins)[None, :] <= match_last_bin[pair_match][:, None]
+    rows, cols = np.nonzero(in_match)
+    window_minutes = window * bin_seconds / 60
+    return pd.DataFrame({
+        "match_id": np.asarray(match_ids)[pair_match[rows]],
+        "team_id": np.asarray(pairs.get_level_values(1), dtype=object)[rows],
+        "minute": cols * bin_seconds / 60,
+        "xt": xt[rows, cols],
+        "events": counts[rows, cols].astype(np.int64),
+        "possession_s": possession[rows, cols],
+        "xt_rolling": xt_rolling[rows, cols],
+        "event_rate": rolling(counts)[rows, cols] / window_minutes,
+        "possession_share": share[rows, cols],
+        "xt_momentum": 2 * xt_rolling[rows, cols] - match_xt[pair_match[rows], cols],
+    }, columns=TIMELINE_COLUMNS)
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+# Offset (in seconds) of the start of each period on the global match clock.
+# Tracking and event timestamps restart at 00:00:00 every period.
+PERIOD_OFFSETS = {
+    1: 0.0,
+    2: 45 * 60.0,
+    3: 90 * 60.0,
+    4: 105 * 60.0,
+    5: 120 * 60.0,
+}
+
+
+def timestamp_to_seconds(timestamps):
+    """
+    Convert a column of timestamps to float64 seconds.
+
+    Args:
+        timestamps (pd.Series): Timestamps as 'HH:MM:SS[.fff]' strings,
+            datetime.time/timedelta objects or numbers (already seconds).
+
+    Returns:
+        pd.Series: The timestamps as float64 seconds, NaN where missing.
+    """
+    if pd.api.types.is_numeric_dtype(timestamps):
+        return timestamps.astype(np.float64)
+    if pd.api.types.is_timedelta64_dtype(timestamps):
+        return timestamps.dt.total_seconds().astype(np.float64)
+
+    # psycopg2 returns TIME columns as datetime.time, which to_timedelta
+    # does not understand, so go through the string representation.
+    as_text = timestamps.where(timestamps.isna(), timestamps.astype(str))
+    return pd.to_timedelta(as_text, errors="coerce").dt.total_seconds().astype(np.float64)
+
+
+def seconds_to_timestamp(seconds):
+    """
+    Format period-relative seconds as an 'HH:MM:SS.ffffff' timestamp.
+
+    The inverse of timestamp_to_seconds, for statements that compare against
+    the timestamp column, e.g. the tracking_window statements.
+    """
+    micros = int(round(max(float(seconds), 0.0) * 1e6))
+    hours, rest = divmod(micros, 3600 * 10**6)
+    minutes, rest = divmod(rest, 60 * 10**6)
+    secs, micro = divmod(rest, 10**6)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{micro:06d}"
+
+
+def match_clock(seconds, period_ids):
+    """
+    Map period-relative seconds onto the global match clock.
+
+    Args:
+        seconds (pd.Series): Period-relative seconds (float64).
+        period_ids (pd.Series): The period of every row.
+
+    Returns:
+        pd.Series: Seconds since kick-off of the first period.
+    """
+    offsets = period_ids.map(PERIOD_OFFSETS).astype(np.float64).fillna(0.0)
+    return seconds + offsets
+
+
+def apply_timestamp_schema(df, timestamp_col="timestamp", period_col="period_id"):
+    """
+    Parse the timestamp column of a freshly loaded DataFrame exactly once.
+
+    Adds a float64 ``seconds`` column (period-relative) and, when the period
+    is known, a float64 ``match_clock`` column (seconds since kick-off) so
+    downstream loops work on numbers instead of re-parsing strings per row.
+    The original ``timestamp`` column is left untouched for display.
+
+    Args:
+        df (pd.DataFrame): The DataFrame as returned by the database.
+        timestamp_col (str): Name of the timestamp column.
+        period_col (str): Name of the period column.
+
+    Returns:
+        pd.DataFrame: The same DataFrame with the numeric columns added.
+    """
+    if df.empty or timestamp_col not in df.columns:
+        return df
+
+    df["seconds"] = timestamp_to_seconds(df[timestamp_col])
+    if period_col in df.columns:
+        df["match_clock"] = match_clock(df["seconds"], df[period_col])
+    else:
+        df["match_clock"] = df["seconds"]
+    return df
+
+
+def format_clock(seconds):
+    """Format a number of seconds as 'MM:SS.s' for on-screen display."""
+    if seconds is None or np.isnan(seconds):
+        return "N/A"
+    minutes, rest = divmod(float(seconds), 60.0)
+    return f"{int(minutes):02d}:{rest:04.1f}"
+
+
+# Compact in-memory layout of tracking rows: repeated strings become
+# categoricals, coordinates float32 and frame ids int32.
+CATEGORICAL_COLUMNS = ("game_id", "player_id", "team_id", "timestamp")
+COMPACT_DTYPES = {
+    "frame_id": np.int32,
+    "period_id": np.int8,
+    "x": np.float32,
+    "y": np.float32,
+}
+# Per-player attributes that belong in the player dimension table, not on every row
+PLAYER_COLUMNS = ("player_name", "jersey_number")
+
+
+def player_dimension(df):
+    """
+    One row per player with the attributes repeated on every tracking row.
+
+    Args:
+        df (pd.DataFrame): Tracking data with player_id and any of team_id,
+            player_name and jersey_number.
+
+    Returns:
+        pd.DataFrame: player_id, team_id, player_name and jersey_number of every player.
+    """
+    columns = [c for c in ("player_id", "team_id") + PLAYER_COLUMNS if c in df.columns]
+    players = df[columns].drop_duplicates("player_id").reset_index(drop=True)
+    return players.astype({c: "object" for c in columns if isinstance(players[c].dtype, pd.CategoricalDtype)})
+
+
+def compact_tracking(df, drop_player_columns=True):
+    """
+    Convert tracking data to the compact layout.
+
+    Args:
+        df (pd.DataFrame): Tracking data as loaded from the database.
+        drop_player_columns (bool): Drop player_name and jersey_number, which
+            `player_dimension` keeps once per player instead of once per row.
+
+    Returns:
+        pd.DataFrame: A new DataFrame with categorical ids, float32 coordinates
+            and int32 frame ids. Missing values keep the column as it is.
+    """
+    if drop_player_columns:
+        df = df.drop(columns=[c for c in PLAYER_COLUMNS if c in df.columns])
+    else:
+        df = df.copy()
+
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype) \
+                and (df[column].dtype == object or pd.api.types.is_string_dtype(df[column])):
+            df[column] = df[column].astype("category")
+    for column, dtype in COMPACT_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if np.issubdtype(dtype, np.integer) and df[column].isna().any():
+            continue
+        df[column] = df[column].astype(dtype)
+    return df
+
+
+def memory_report(before, after, frame_col="frame_id"):
+    """
+    Memory use of a tracking DataFrame before and after compaction.
+
+    Args:
+        before (pd.DataFrame): The DataFrame as loaded.
+        after (pd.DataFrame): The compact DataFrame.
+        frame_col (str): Column identifying a frame.
+
+    Returns:
+        dict: Total bytes and bytes per frame before and after, and the reduction factor.
+    """
+    frames = max(before[frame_col].nunique(), 1) if frame_col in before.columns else max(len(before), 1)
+    bytes_before = int(before.memory_usage(deep=True).sum())
+    bytes_after = int(after.memory_usage(deep=True).sum())
+    return {
+        "rows": len(before),
+        "frames": frames,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_per_frame_before": bytes_before / frames,
+        "bytes_per_frame_after": bytes_after / frames,
+        "reduction": bytes_before / bytes_after if bytes_after else float("nan"),
+    }
@@ -0,0 +1,387 @@
+"""
+Features, labels and a RandomForest for fast and slow transitions.
+
+A transition starts when a defensive action (tackle, interception,
+clearance) wins the ball: the action before it is the opponents' and the
+next action of the period is by the same team.
+It is fast when the team carries the ball at least FAST_SPEED meters per
+second towards the opponents' goal in the first TRANSITION_SECONDS of the
+possession that follows.
+
+The notebooks in fleur/ and axl/ built these rows with a `teams t2 ON
+spadl.team_id != t2.team_id` join, one copy of every action per other team,
+and label-encoded match and player ids into the features. Here every action
+is one row (the opponent and home side come from matches), features only
+describe the situation, and the pipeline runs in three cached steps:
+
+1. build_feature_cache: fetch the actions match by match, compute the
+   features with array operations and stream them, a chunk of matches at a
+   time, into one Parquet file
+2. the same call copies the feature columns into X.npy and y.npy, which
+   experiments open memory-mapped instead of loading
+3. train_transition_model: a RandomForest fitted with `n_jobs` threads on
+   the memory-mapped arrays, tested on matches it has not seen
+
+The cache is keyed by the matches and the label parameters, so every
+experiment on the same matches reuses one feature matrix:
+
+    python transition_model.py --all --n-jobs 8
+    python transition_model.py --team ajax --estimators 500 --model transition_rf.joblib
+
+pyarrow (Parquet) and scikit-learn are only needed by this module.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from connection_pool import get_manager
+from leaderboard import normalize_direction
+from match_summaries import PITCH_LENGTH, PITCH_WIDTH, SHOT_TYPES
+from spadl_schema import apply_spadl_schema
+from statements import run
+from tracking_schema import match_clock
+
+# SPADL tackle, interception and clearance
+DEFENSIVE_TYPES = [9, 10, 18]
+TRANSITION_SECONDS = 10.0
+FAST_SPEED = 3.0
+
+DEFAULT_CACHE_DIR = "transition_features"
+# Bump when the features change, so old caches are not reused
+FEATURE_VERSION = 2
+
+FEATURE_COLUMNS = [
+    "period_id", "minute", "start_x", "start_y", "end_x", "end_y",
+    "goal_distance", "goal_angle", "action_type", "result", "bodypart", "home",
+    "goal_difference", "previous_action_type", "previous_start_x",
+    "seconds_since_previous",
+]
+ID_COLUMNS = ["match_id", "action_id", "seconds", "player_id", "team_id"]
+LABEL_COLUMNS = ["progress_m", "speed", "fast"]
+
+
+def _window_max(values, starts, ends):
+    """max(values[start:end]) for every (start, end) pair, with end > start"""
+    padded = np.append(values, -np.inf)
+    bounds = np.column_stack([starts, ends]).ravel()
+    return np.maximum.reduceat(padded, bounds)[::2]
+
+
+def transition_features(actions, transition_seconds=TRANSITION_SECONDS, fast_speed=FAST_SPEED):
+    """
+    One row of features and labels per ball-winning defensive action.
+
+    Args:
+        actions (pd.DataFrame): SPADL actions of one or many matches with a
+            match_id and home_team_id, as the 'transition_actions' statement
+            returns them.
+        transition_seconds (float): Length of the start of a transition that is measured.
+        fast_speed (float): Meters per second towards goal from which a transition is fast.
+
+    Returns:
+        pd.DataFrame: ID_COLUMNS, FEATURE_COLUMNS and LABEL_COLUMNS.
+    """
+    columns = ID_COLUMNS + FEATURE_COLUMNS + LABEL_COLUMNS
+    if actions.empty:
+        return pd.DataFrame(columns=columns)
+
+    actions = normalize_direction(actions)
+    actions = actions.sort_values(["match_id", "period_id", "seconds", "id"], kind="stable", ignore_index=True)
+    match_codes = pd.factorize(actions["match_id"])[0]
+    period_ids = actions["period_id"].to_numpy()
+    team_codes = pd.factorize(actions["team_id"])[0]
+    seconds = actions["seconds"].to_numpy(dtype=np.float64)
+    start_x = actions["start_x"].to_numpy(dtype=np.float64)
+
+    # Previous and next action of the same match and period
+    same_period = (match_codes[1:] == match_codes[:-1]) & (period_ids[1:] == period_ids[:-1])
+    has_previous = np.r_[False, same_period]
+    has_next = np.r_[same_period, False]
+    same_team_next = np.r_[team_codes[1:] == team_codes[:-1], False]
+    previous_same_team = np.r_[False, team_codes[1:] == team_codes[:-1]]
+
+    # Possessions: runs of actions of one team within a period
+    new_possession = ~has_previous | ~previous_same_team
+    possession = np.cumsum(new_possession) - 1
+
+    # Goals scored by each side before every action
+    is_goal = (actions["action_type"].isin(SHOT_TYPES) & (actions["result"] == 1)).astype(np.int64)
+    own_goals = is_goal.groupby([match_codes, team_codes]).cumsum() - is_goal
+    all_goals = is_goal.groupby(match_codes).cumsum() - is_goal
+
+    is_defensive = actions["action_type"].isin(DEFENSIVE_TYPES).to_numpy()
+    regains = np.flatnonzero(is_defensive & ~previous_same_team & has_next & same_team_next)
+
+    # Progress towards goal within the window: the furthest point the ball
+    # reaches in the possession, measured from where it was won
+    window_key = possession * (2 * transition_seconds + 1e5) + seconds
+    ends = np.searchsorted(window_key, window_key[regains] + transition_seconds, side="right")
+    furthest = _window_max(np.fmax(start_x, actions["end_x"].to_numpy(dtype=np.float64)), regains, ends)
+    progress = np.clip(np.nan_to_num(furthest - start_x[regains]), 0.0, None)
+    speed = progress / transition_seconds
+
+    rows = actions.iloc[regains]
+    previous = np.clip(regains - 1, 0, None)
+    # The opponents' previous action, seen from the side of the team winning the ball
+    previous_x = PITCH_LENGTH - start_x[previous]
+    goal_dx = PITCH_LENGTH - rows["start_x"].to_numpy(dtype=np.float64)
+    goal_dy = np.abs(PITCH_WIDTH / 2 - rows["start_y"].to_numpy(dtype=np.float64))
+    features = pd.DataFrame({
+        "match_id": rows["match_id"].to_numpy(),
+        "action_id": rows["id"].to_numpy(),
+        "seconds": rows["seconds"].to_numpy(dtype=np.float64),
+        "player_id": rows["player_id"].to_numpy(),
+        "team_id": rows["team_id"].to_numpy(),
+        "period_id": rows["period_id"].to_numpy(),
+        "minute": match_clock(rows["seconds"].astype(np.float64), rows["period_id"]).to_numpy() / 60,
+        "start_x": rows["start_x"].to_numpy(dtype=np.float64),
+        "start_y": rows["start_y"].to_numpy(dtype=np.float64),
+        "end_x": rows["end_x"].to_numpy(dtype=np.float64),
+        "end_y": rows["end_y"].to_numpy(dtype=np.float64),
+        "goal_distance": np.hypot(goal_dx, goal_dy),
+        "goal_angle": np.arctan2(goal_dy, goal_dx),
+        "action_type": rows["action_type"].to_numpy(),
+        "result": rows["result"].to_numpy(),
+        "bodypart": rows["bodypart"].to_numpy(),
+        "home": (rows["team_id"] == rows["home_team_id"]).to_numpy(),
+        "goal_difference": (2 * own_goals - all_goals).to_numpy()[regains],
+        "previous_action_type": np.where(has_previous[regains], actions["action_type"].to_numpy()[previous], -1),
+        "previous_start_x": np.where(has_previous[regains], previous_x, np.nan),
+        "seconds_since_previous": np.where(has_previous[regains], seconds[regains] - seconds[previous], np.nan),
+        "progress_m": progress,
+        "speed": speed,
+        "fast": speed >= fast_speed,
+    }, columns=columns)
+    return features.astype({c: np.float32 for c in FEATURE_COLUMNS})
+
+
+def cache_key(match_ids, transition_seconds=TRANSITION_SECONDS, fast_speed=FAST_SPEED):
+    """Name of the feature cache of these matches and label parameters"""
+    spec = json.dumps([FEATURE_VERSION, sorted(map(str, match_ids)), transition_seconds, fast_speed])
+    return hashlib.sha1(spec.encode()).hexdigest()[:16]
+
+
+def split_order(match_ids):
+    """
+    The matches in a fixed pseudo-random order.
+
+    The feature rows are stored in this order, so a hold-out set of whole
+    matches is a slice at the end of the memory-mapped arrays, not a copy.
+    """
+    return sorted(map(str, match_ids), key=lambda m: hashlib.sha1(m.encode()).hexdigest())
+
+
+def _parquet():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The transition feature cache is written as Parquet, install pyarrow") from e
+    return pa, pq
+
+
+def _write_parquet(path, match_ids, chunk_matches, db_config, params):
+    """Stream the features of all matches into one Parquet file, one row group per chunk"""
+    pa, pq = _parquet()
+    writer = None
+    offsets = {}
+    rows = 0
+    try:
+        with get_manager(db_config).connection() as conn:
+            for i in range(0, len(match_ids), chunk_matches):
+                chunk = match_ids[i:i + chunk_matches]
+                actions = apply_spadl_schema(pd.concat(
+                    [run(conn, "transition_actions", (match_id,)) for match_id in chunk], ignore_index=True))
+                features = transition_features(actions, **params)
+                # transition_features sorts by match; keep the split order instead
+                order = {match_id: n for n, match_id in enumerate(chunk)}
+                features = features.sort_values("match_id", key=lambda m: m.map(order), kind="stable",
+                                                ignore_index=True)
+                for match_id, n in features.groupby("match_id", sort=False).size().items():
+                    offsets[match_id] = (rows, rows + int(n))
+                    rows += int(n)
+                table = pa.Table.from_pandas(features.astype({"match_id": str, "player_id": str, "team_id": str}),
+                                             preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                print(f"features: {min(i + chunk_matches, len(match_ids))}/{len(match_ids)} matches, {rows} rows")
+    finally:
+        if writer is not None:
+            writer.close()
+    return offsets, rows
+
+
+def _write_arrays(directory, rows):
+    """Copy the feature and label columns from the Parquet file into .npy files, a row group at a time"""
+    _, pq = _parquet()
+    parquet = pq.ParquetFile(directory / "features.parquet")
+    X = np.lib.format.open_memmap(directory / "X.npy", mode="w+", dtype=np.float32,
+                                  shape=(rows, len(FEATURE_COLUMNS)))
+    y = np.lib.format.open_memmap(directory / "y.npy", mode="w+", dtype=np.int8, shape=(rows,))
+    start = 0
+    for i in range(parquet.num_row_groups):
+        group = parquet.read_row_group(i, columns=FEATURE_COLUMNS + ["fast"]).to_pandas()
+        X[start:start + len(group)] = group[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+        y[start:start + len(group)] = group["fast"].to_numpy(dtype=np.int8)
+        start += len(group)
+    X.flush()
+    y.flush()
+
+
+def build_feature_cache(match_ids, cache_dir=DEFAULT_CACHE_DIR, chunk_matches=25, db_config=None,
+                        force=False, transition_seconds=TRANSITION_SECONDS, fast_speed=FAST_SPEED):
+    """
+    Compute the transition features of a set of matches once and cache them.
+
+    Args:
+        match_ids (list): The matches to take transitions from.
+        cache_dir (str or Path): Parent directory of the caches.
+        chunk_matches (int): Matches fetched and written per Parquet row group.
+        db_config (dict, optional): Connection parameters, read from the environment when not given.
+        force (bool): Rebuild a cache that already exists.
+        transition_seconds (float): See transition_features.
+        fast_speed (float): See transition_features.
+
+    Returns:
+        Path: The cache directory with features.parquet, X.npy, y.npy and meta.json.
+    """
+    params = {"transition_seconds": transition_seconds, "fast_speed": fast_speed}
+    directory = Path(cache_dir) / cache_key(match_ids, **params)
+    if (directory / "meta.json").exists() and not force:
+        return directory
+
+    # Built in a temporary directory and renamed, so a cache is either complete or absent
+    tmp = directory.with_name(directory.name + f".{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    ordered = split_order(match_ids)
+    offsets, rows = _write_parquet(tmp / "features.parquet", ordered, chunk_matches, db_config, params)
+    if not rows:
+        shutil.rmtree(tmp)
+        raise ValueError("None of the matches has a transition")
+    _write_arrays(tmp, rows)
+    meta = {
+        "version": FEATURE_VERSION,
+        "features": FEATURE_COLUMNS,
+        "rows": rows,
+        "matches": [[match_id, *offsets[match_id]] for match_id in ordered if match_id in offsets],
+        **params,
+    }
+    with open(tmp / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return directory
+
+
+def load_feature_matrix(directory):
+    """
+    Open a feature cache without reading it into memory.
+
+    Returns:
+        tuple: (X, y, meta); X and y are read-only memory maps.
+    """
+    directory = Path(directory)
+    with open(directory / "meta.json") as f:
+        meta = json.load(f)
+    X = np.load(directory / "X.npy", mmap_mode="r")
+    y = np.load(directory / "y.npy", mmap_mode="r")
+    return X, y, meta
+
+
+def train_transition_model(X, y, meta, test_share=0.2, n_estimators=200, n_jobs=-1, random_state=42, **params):
+    """
+    Fit a RandomForest on the cached features, holding out whole matches.
+
+    The hold-out matches are the last `test_share` of the cache's split
+    order, so train and test set are slices of the memory maps. The trees
+    are grown in `n_jobs` threads that all read the same mapped arrays.
+
+    Args:
+        X (np.ndarray): Features, see load_feature_matrix.
+        y (np.ndarray): 1 for fast transitions.
+        meta (dict): The cache's meta.json.
+        test_share (float): Share of the matches held out.
+        n_estimators (int): Number of trees.
+        n_jobs (int): Threads to grow trees in, -1 for all CPUs.
+        random_state (int): Seed of the forest.
+        **params: Further RandomForestClassifier arguments.
+
+    Returns:
+        tuple: (fitted RandomForestClassifier, dict with accuracy, the
+            classification report and the feature importances).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, classification_report
+
+    matches = meta["matches"]
+    n_test = max(1, int(round(len(matches) * test_share))) if len(matches) > 1 else 0
+    cut = matches[-n_test][1] if n_test else len(y)
+    X_train, y_train, X_test, y_test = X[:cut], y[:cut], X[cut:], y[cut:]
+
+    model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state, **params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    report = {
+        "train_rows": len(y_train),
+        "test_rows": len(y_test),
+        "test_matches": n_test,
+        "fit_s": time.perf_counter() - start,
+        "importances": dict(zip(meta["features"], model.feature_importances_.round(4).tolist())),
+    }
+    if len(y_test):
+        predicted = model.predict(X_test)
+        report["accuracy"] = accuracy_score(y_test, predicted)
+        report["report"] = classification_report(y_test, predicted, labels=[0, 1],
+                                                 target_names=["slow", "fast"], zero_division=0)
+    return model, report
+
+
+if __name__ == "__main__":
+    from match_runner import select_matches
+
+    parser = argparse.ArgumentParser(description="Build the transition features and train the fast/slow classifier")
+    parser.add_argument("--matches", nargs="*", default=None, help="Match ids to train on")
+    parser.add_argument("--team", default=None, help="Every match of teams whose name contains this text")
+    parser.add_argument("--all", action="store_true", help="Every match in the database")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Parent directory of the feature caches")
+    parser.add_argument("--chunk-matches", type=int, default=25)
+    parser.add_argument("--force", action="store_true", help="Rebuild the feature cache")
+    parser.add_argument("--transition-seconds", type=float, default=TRANSITION_SECONDS)
+    parser.add_argument("--fast-speed", type=float, default=FAST_SPEED)
+    parser.add_argument("--estimators", type=int, default=200)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--test-share", type=float, default=0.2)
+    parser.add_argument("--model", default=None, help="Save the fitted model here, see model_scoring.py")
+    args = parser.parse_args()
+
+    if not (args.matches or args.team or args.all):
+        parser.error("give --matches, --team or --all")
+    with get_manager().connection() as conn:
+        match_ids = select_matches(conn, args.matches, args.team)
+
+    directory = build_feature_cache(match_ids, args.cache, args.chunk_matches, force=args.force,
+                                    transition_seconds=args.transition_seconds, fast_speed=args.fast_speed)
+    X, y, meta = load_feature_matrix(directory)
+    print(f"{meta['rows']} transitions of {len(meta['matches'])} matches in {directory}, {y.mean():.1%} fast")
+    model, report = train_transition_model(X, y, meta, args.test_share, args.estimators, args.n_jobs)
+    print(f"fitted on {report['train_rows']} rows in {report['fit_s']:.1f}s, "
+          f"tested on {report['test_rows']} rows of {report['test_matches']} matches")
+    if "accuracy" in report:
+        print(f"accuracy: {report['accuracy']:.3f}")
+        print(report["report"])
+    for name, importance in sorted(report["importances"].items(), key=lambda item: -item[1]):
+        print(f"{name:<24}{importance:.4f}")
+    if args.model:
+        from model_scoring import save_model
+
+        save_model(model, args.model, "transition", name="transition_rf")
+        print(f"model -> {args.model}")
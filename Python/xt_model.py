@@ -0,0 +1,115 @@
+"""
+The group's expected threat (xT) model over the match events.
+
+calculate_xt weighs every event by its type and result, accumulates the
+weights on a grid over the pitch and smooths the grid. SoccerationV2.py plots
+it and match_summaries.py values events with it:
+
+    events["result_name"] = events["outcome"].map(result_mapping)
+    grids = calculate_xt(events)        # 'total', 'pass' and 'shot' grids
+"""
+import numpy as np
+import pandas as pd
+from scipy.ndimage import gaussian_filter
+
+event_type_mapping = {
+    0: 'pass',
+    1: 'cross',
+    2: 'throw in',
+    3: 'freekick crossed',
+    4: 'freekick short',
+    5: 'corner crossed',
+    6: 'corner short',
+    7: 'take on',
+    8: 'foul',
+    9: 'tackle',
+    10: 'interception',
+    11: 'shot',
+    12: 'shot penalty',
+    13: 'shot freekick',
+    14: 'keeper save',
+    18: 'clearance',
+    21: 'dribble',
+    22: 'goalkick'
+}
+
+result_mapping = {
+    0: 'fail',
+    1: 'success'
+}
+
+
+def calculate_xt(df, grid_size=16):
+    pitch_length = 105
+    pitch_width = 68
+    
+    xt_grid = np.zeros((grid_size, grid_size))
+    pass_grid = np.zeros((grid_size, grid_size))
+    shot_grid = np.zeros((grid_size, grid_size))
+    
+    def coord_to_index(x, y):
+        x_idx = min(int((x / pitch_length) * grid_size), grid_size - 1)
+        y_idx = min(int((y / pitch_width) * grid_size), grid_size - 1)
+        return x_idx, y_idx
+
+    weights = {
+        0: {'success': 1.0, 'fail': 0.0},  
+        1: {'success': 1.5, 'fail': 0.5},  
+        11: {'success': 3.0, 'fail': 1.0}, 
+        21: {'success': 0.8, 'fail': 0.2}, 
+        2: {'success': 1.0, 'fail': 0.0}, 
+        3: {'success': 1.2, 'fail': 0.5},  
+        4: {'success': 1.0, 'fail': 0.5},  
+        5: {'success': 1.5, 'fail': 1.0},
+        6: {'success': 1.0, 'fail': 0.5},  
+        7: {'success': 1.0, 'fail': 0.5},  
+        8: {'success': 0.0, 'fail': 0.0},  
+        9: {'success': 0.0, 'fail': 0.0},  
+        10: {'success': 0.0, 'fail': 0.0}, 
+        12: {'success': 2.0, 'fail': 1.0}, 
+        13: {'success': 3.0, 'fail': 1.5},
+        14: {'success': 3.5, 'fail': 1.5}, 
+        18: {'success': 0.5, 'fail': 0.3}, 
+        22: {'success': 0.0, 'fail': 0.0}  
+    }
+
+    max_weight = 1.0  
+    
+    for _, row in df.iterrows():
+        if pd.isna(row['start_x']) or pd.isna(row['start_y']):
+            continue
+            
+        try:
+            x1, y1 = float(row['start_x']), float(row['start_y'])
+            x1_idx, y1_idx = coord_to_index(x1, y1)
+            
+            weight = weights.get(row['action_type'], {}).get(row['result_name'], 0)
+            
+            scaled_weight = min(weight, max_weight)
+            
+            xt_grid[x1_idx, y1_idx] += scaled_weight
+            
+            if row['action_type'] == 0:
+                pass_grid[x1_idx, y1_idx] += scaled_weight
+            elif row['action_type'] == 11:
+                shot_grid[x1_idx, y1_idx] += scaled_weight
+                
+        except (ValueError, TypeError):
+            continue
+    
+    def process_grid(grid):
+        grid = gaussian_filter(grid, sigma=1)
+        grid = np.sqrt(grid + np.abs(grid.min()) + 1)
+        if np.max(grid) > 0:
+            grid = grid / np.max(grid)
+        return grid
+    
+    xt_grid = process_grid(xt_grid)
+    pass_grid = process_grid(pass_grid)
+    shot_grid = process_grid(shot_grid)
+    
+    return {
+        'total': xt_grid.T,
+        'pass': pass_grid.T,
+        'shot': shot_grid.T
+    }
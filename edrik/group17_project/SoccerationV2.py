@@ -1,79 +1,33 @@
-import psycopg2
-import dotenv
-import os
+import sys
+from pathlib import Path
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from matplotlib.collections import LineCollection
 from matplotlib.patches import Rectangle, Arc, ConnectionPatch
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib import cm
-from scipy.ndimage import gaussian_filter
 
-dotenv.load_dotenv()
-
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_USER = os.getenv("PG_USER")
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_DATABASE = os.getenv("PG_DB")
-
-event_type_mapping = {
-    0: 'pass',
-    1: 'cross',
-    2: 'throw in',
-    3: 'freekick crossed',
-    4: 'freekick short',
-    5: 'corner crossed',
-    6: 'corner short',
-    7: 'take on',
-    8: 'foul',
-    9: 'tackle',
-    10: 'interception',
-    11: 'shot',
-    12: 'shot penalty',
-    13: 'shot freekick',
-    14: 'keeper save',
-    18: 'clearance',
-    21: 'dribble',
-    22: 'goalkick'
-}
-
-result_mapping = {
-    0: 'fail',
-    1: 'success'
-}
+# The shared connection pool lives in the top-level Python/ folder
+sys.path.append(str(Path(__file__).resolve().parents[2] / "Python"))
+from connection_pool import get_manager
+from match_summaries import event_xt
+from statements import run
+from timeline import xt_timeline
+from tracking_schema import apply_timestamp_schema
+from xt_model import calculate_xt, event_type_mapping, result_mapping
 
 def get_connection():
-    return psycopg2.connect(
-        host=PG_HOST,
-        database=PG_DATABASE,
-        user=PG_USER,
-        password=PG_PASSWORD,
-        port=PG_PORT,
-        sslmode="require",
-    )
+    # Pooled connection, connection.close() returns it to the pool
+    return get_manager().checkout()
 
 def get_event_data(game_id):
-    query = """
-    SELECT 
-    e.name AS event_type,
-    me.player_id, 
-    me.team_id, 
-    me.x AS start_x, 
-    me.y AS start_y, 
-    me.match_id AS game_id, 
-    me.timestamp AS time, 
-    me.result AS outcome,
-    me.eventtype_id
-    FROM matchevents me
-    JOIN eventtypes e ON me.eventtype_id = e.eventtype_id
-    """
-    connection = get_connection()
-    df = pd.read_sql(query, connection, params=(game_id,))
-    connection.close()
-
-    print("Columns in df:", df.columns)  # Debugging step
+    # Only the events of this match, the game_id is a parameter of the prepared statement
+    with get_manager().connection() as connection:
+        df = run(connection, "xt_events", (game_id,))
+    # Numeric period-relative 'seconds' and a 'match_clock', parsed once
+    df = apply_timestamp_schema(df, timestamp_col='time')
 
     # Rename eventtype_id to action_type for consistency with mapping
     df.rename(columns={'eventtype_id': 'action_type'}, inplace=True)
@@ -83,81 +37,6 @@ def get_event_data(game_id):
     return df
 
 
-def calculate_xt(df, grid_size=16):
-    pitch_length = 105
-    pitch_width = 68
-    
-    xt_grid = np.zeros((grid_size, grid_size))
-    pass_grid = np.zeros((grid_size, grid_size))
-    shot_grid = np.zeros((grid_size, grid_size))
-    
-    def coord_to_index(x, y):
-        x_idx = min(int((x / pitch_length) * grid_size), grid_size - 1)
-        y_idx = min(int((y / pitch_width) * grid_size), grid_size - 1)
-        return x_idx, y_idx
-
-    weights = {
-        0: {'success': 1.0, 'fail': 0.0},  
-        1: {'success': 1.5, 'fail': 0.5},  
-        11: {'success': 3.0, 'fail': 1.0}, 
-        21: {'success': 0.8, 'fail': 0.2}, 
-        2: {'success': 1.0, 'fail': 0.0}, 
-        3: {'success': 1.2, 'fail': 0.5},  
-        4: {'success': 1.0, 'fail': 0.5},  
-        5: {'success': 1.5, 'fail': 1.0},
-        6: {'success': 1.0, 'fail': 0.5},  
-        7: {'success': 1.0, 'fail': 0.5},  
-        8: {'success': 0.0, 'fail': 0.0},  
-        9: {'success': 0.0, 'fail': 0.0},  
-        10: {'success': 0.0, 'fail': 0.0}, 
-        12: {'success': 2.0, 'fail': 1.0}, 
-        13: {'success': 3.0, 'fail': 1.5},
-        14: {'success': 3.5, 'fail': 1.5}, 
-        18: {'success': 0.5, 'fail': 0.3}, 
-        22: {'success': 0.0, 'fail': 0.0}  
-    }
-
-    max_weight = 1.0  
-    
-    for _, row in df.iterrows():
-        if pd.isna(row['start_x']) or pd.isna(row['start_y']):
-            continue
-            
-        try:
-            x1, y1 = float(row['start_x']), float(row['start_y'])
-            x1_idx, y1_idx = coord_to_index(x1, y1)
-            
-            weight = weights.get(row['action_type'], {}).get(row['result_name'], 0)
-            
-            scaled_weight = min(weight, max_weight)
-            
-            xt_grid[x1_idx, y1_idx] += scaled_weight
-            
-            if row['action_type'] == 0:
-                pass_grid[x1_idx, y1_idx] += scaled_weight
-            elif row['action_type'] == 11:
-                shot_grid[x1_idx, y1_idx] += scaled_weight
-                
-        except (ValueError, TypeError):
-            continue
-    
-    def process_grid(grid):
-        grid = gaussian_filter(grid, sigma=1)
-        grid = np.sqrt(grid + np.abs(grid.min()) + 1)
-        if np.max(grid) > 0:
-            grid = grid / np.max(grid)
-        return grid
-    
-    xt_grid = process_grid(xt_grid)
-    pass_grid = process_grid(pass_grid)
-    shot_grid = process_grid(shot_grid)
-    
-    return {
-        'total': xt_grid.T,
-        'pass': pass_grid.T,
-        'shot': shot_grid.T
-    }
-
 def draw_pitch(ax):
     ax.set_xlim(0, 100)
     ax.set_ylim(0, 100)
@@ -181,97 +60,99 @@ def plot_xt_heatmap(xt_grid, title="Expected Threat (xT) Heatmap"):
     plt.tight_layout()
     plt.show()
 
-def plot_directional_xt(df):
-    fig, ax = plt.subplots(figsize=(12, 8))
+# Event coordinates (meters) to the 0-100 drawing coordinates of draw_pitch
+X_FACTOR = 100 / 105
+Y_FACTOR = 100 / 68
+
+def _scaled_segments(actions):
+    # Start and end of every action with an end location, scaled in one go
+    coords = actions[['start_x', 'start_y', 'end_x', 'end_y']].to_numpy(dtype=float)
+    coords = coords[~np.isnan(coords).any(axis=1)]
+    return coords * np.array([X_FACTOR, Y_FACTOR, X_FACTOR, Y_FACTOR])
+
+def zone_flows(segments, bins=(12, 8), min_count=1):
+    # Count the moves between every pair of zones of a bins[0] x bins[1] grid over
+    # the 0-100 pitch; returns start and end zone centers and counts, moves within a zone left out
+    nx, ny = bins
+    zone_x = np.clip((segments[:, [0, 2]] / 100 * nx).astype(int), 0, nx - 1)
+    zone_y = np.clip((segments[:, [1, 3]] / 100 * ny).astype(int), 0, ny - 1)
+    zones = zone_x * ny + zone_y
+    moving = zones[:, 0] != zones[:, 1]
+    pairs, counts = np.unique(zones[moving, 0] * nx * ny + zones[moving, 1], return_counts=True)
+    keep = counts >= min_count
+    pairs, counts = pairs[keep], counts[keep]
+    start, end = np.divmod(pairs, nx * ny)
+    centers = lambda zone: np.column_stack([(zone // ny + 0.5) * 100 / nx, (zone % ny + 0.5) * 100 / ny])
+    return centers(start), centers(end), counts
+
+def plot_directional_xt(df, mode='arrows', bins=(12, 8), min_count=1, ax=None):
+    # One quiver per category instead of an annotation per action. mode='flow'
+    # aggregates the passes into zone-to-zone arrows, for many matches at once
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(12, 8))
+    else:
+        fig = ax.figure
     draw_pitch(ax)
-    
-    x_factor = 100 / 105
-    y_factor = 100 / 68
-    
-    successful_passes = df[(df['action_type'] == 0) & (df['result'] == 1)]
-    for _, row in successful_passes.iterrows():
-        if pd.isna(row['end_x']) or pd.isna(row['end_y']):
-            continue
-            
-        start_x = row['start_x'] * x_factor
-        start_y = row['start_y'] * y_factor
-        end_x = row['end_x'] * x_factor
-        end_y = row['end_y'] * y_factor
-        
-        ax.annotate("", xy=(end_x, end_y), xytext=(start_x, start_y),
-                   arrowprops=dict(arrowstyle="->", color='green', alpha=0.5, lw=1))
 
-    shots = df[df['action_type'] == 11]
-    for _, row in shots.iterrows():
-        if pd.isna(row['end_x']) or pd.isna(row['end_y']):
-            continue
-            
-        start_x = row['start_x'] * x_factor
-        start_y = row['start_y'] * y_factor
-        end_x = row['end_x'] * x_factor
-        end_y = row['end_y'] * y_factor
-        
-        ax.plot(start_x, start_y, 'ro', markersize=8, alpha=0.7)
-        ax.annotate("", xy=(end_x, end_y), xytext=(start_x, start_y),
-                   arrowprops=dict(arrowstyle="->", color='red', alpha=0.7, lw=2))
-    
-    plt.title("Directional xT Flow (Passes and Shots)", pad=20)
-    plt.tight_layout()
+    passes = _scaled_segments(df[(df['action_type'] == 0) & (df['outcome'] == 1)])
+    shots = _scaled_segments(df[df['action_type'] == 11])
+
+    if mode == 'flow':
+        start, end, counts = zone_flows(passes, bins, min_count)
+        if len(counts):
+            # Width and color by the number of passes between the two zones
+            widths = 0.5 + 4.5 * counts / counts.max()
+            lines = LineCollection(np.stack([start, end], axis=1), linewidths=widths,
+                                   cmap='Greens', alpha=0.8)
+            lines.set_array(counts)
+            lines.set_clim(0, counts.max())
+            ax.add_collection(lines)
+            ax.quiver(start[:, 0] + 0.85 * (end[:, 0] - start[:, 0]), start[:, 1] + 0.85 * (end[:, 1] - start[:, 1]),
+                      0.15 * (end[:, 0] - start[:, 0]), 0.15 * (end[:, 1] - start[:, 1]), counts,
+                      cmap='Greens', clim=(0, counts.max()), angles='xy', scale_units='xy', scale=1,
+                      width=0.004, headwidth=4)
+            fig.colorbar(lines, ax=ax, label='Passes between zones')
+        title = f"Pass Flow Between Zones ({bins[0]}x{bins[1]})"
+    else:
+        ax.quiver(passes[:, 0], passes[:, 1], passes[:, 2] - passes[:, 0], passes[:, 3] - passes[:, 1],
+                  color='green', alpha=0.5, angles='xy', scale_units='xy', scale=1, width=0.0015)
+        title = "Directional xT Flow (Passes and Shots)"
+
+    ax.plot(shots[:, 0], shots[:, 1], 'ro', markersize=8, alpha=0.7)
+    ax.quiver(shots[:, 0], shots[:, 1], shots[:, 2] - shots[:, 0], shots[:, 3] - shots[:, 1],
+              color='red', alpha=0.7, angles='xy', scale_units='xy', scale=1, width=0.003)
+
+    ax.set_title(title, pad=20)
+    fig.tight_layout()
     plt.show()
+    return fig, ax
+
+def plot_xt_timeline(df, xt_grids, window=3):
+    # Rolling xT per team over `window` minutes, binned in one pass (see Python/timeline.py)
+    events = df.assign(xt=event_xt(df, xt_grids['total'], 'start_x', 'start_y'))
+    timeline = xt_timeline(events, window=window)
 
-def plot_xt_timeline(df, xt_grids):
     fig, ax = plt.subplots(figsize=(12, 6))
-    
-    df['game_minute'] = df['seconds'] // 60 + (df['period_id'] - 1) * 45
-    minute_xt = []
-    
-    for minute in range(0, int(df['game_minute'].max()) + 1):
-        minute_actions = df[df['game_minute'] == minute]
-        xt = 0
-        
-        for _, row in minute_actions.iterrows():
-            if pd.isna(row['start_x']) or pd.isna(row['start_y']):
-                continue
-                
-            x_idx = min(int((row['start_x'] / 105) * 16), 15)
-            y_idx = min(int((row['start_y'] / 68) * 16), 15)
-            xt += xt_grids['total'][x_idx, y_idx]
-        
-        minute_xt.append(xt)
-    
-    minute_xt = pd.Series(minute_xt).rolling(3, min_periods=1).mean()
-    
-    ax.plot(minute_xt.index, minute_xt, 'b-', lw=2)
-    ax.fill_between(minute_xt.index, 0, minute_xt, alpha=0.2)
-    
+    for team_id, team in timeline.groupby('team_id', sort=False):
+        line, = ax.plot(team['minute'], team['xt_rolling'], lw=2, label=str(team_id))
+        ax.fill_between(team['minute'], 0, team['xt_rolling'], color=line.get_color(), alpha=0.2)
+
     ax.set_xlabel("Game Minute")
-    ax.set_ylabel("Cumulative xT")
-    ax.set_title("xT Timeline (Fixed Time Handling)", pad=20)
+    ax.set_ylabel(f"xT over the last {window} minutes")
+    ax.set_title("xT Timeline", pad=20)
+    ax.legend()
     ax.grid(True, alpha=0.3)
     plt.tight_layout()
     plt.show()
+    return timeline
 
 def plot_player_xt_contributions(df, xt_grid):
-    player_contributions = {}
-    
-    for player_id in df['player_id'].unique():
-        player_actions = df[df['player_id'] == player_id]
-        xt = 0
-        
-        for _, row in player_actions.iterrows():
-            if pd.isna(row['start_x']) or pd.isna(row['start_y']):
-                continue
-                
-            x_idx = min(int((row['start_x'] / 105) * 16), 15)
-            y_idx = min(int((row['start_y'] / 68) * 16), 15)
-            xt += xt_grid[x_idx, y_idx]
-        
-        player_contributions[player_id] = xt
-    
-    top_players = sorted(player_contributions.items(), key=lambda x: x[1], reverse=True)[:5]
+    # One grid lookup and one groupby; season leaderboards: Python/leaderboard.py
+    xt = pd.Series(event_xt(df, xt_grid, 'start_x', 'start_y'), index=df.index)
+    top_players = list(xt.groupby(df['player_id']).sum().nlargest(5).items())
     
     fig, ax = plt.subplots(figsize=(10, 6))
-    players = [f"Player {pid[:6]}" for pid, _ in top_players]
+    players = [f"Player {str(pid)[:6]}" for pid, _ in top_players]
     values = [val for _, val in top_players]
     
     ax.barh(players, values, color='skyblue')
@@ -280,8 +161,10 @@ def plot_player_xt_contributions(df, xt_grid):
     plt.tight_layout()
     plt.show()
 
-def main():
-    game_id = "5oc8drrbruovbuiriyhdyiyok"
+DEFAULT_GAME_ID = "5oc8drrbruovbuiriyhdyiyok"
+
+def main(game_id=DEFAULT_GAME_ID):
+    # Many matches at once: python Python/match_runner.py --analyses xt_grid --all
     event_data = get_event_data(game_id)
     
     if event_data.empty:
@@ -298,4 +181,4 @@ def main():
     plot_player_xt_contributions(event_data, xt_grids['total'])
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_GAME_ID)
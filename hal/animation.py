@@ -1,104 +1,75 @@
-import numpy as np
-import pandas as pd
-import psycopg2
-import dotenv
-import os
-from matplotlib import animation
-from matplotlib import pyplot as plt
-from scipy.interpolate import interp1d
-from mplsoccer import Pitch
-import time
-
-dotenv.load_dotenv()
-
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_USER = os.getenv("PG_USER")
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_DATABASE = os.getenv("PG_DB")
-
-# Database connection parameters
-import psycopg2
-import os
-
-conn = psycopg2.connect(
-    host=PG_HOST,
-    database=PG_DATABASE,
-    user=PG_USER,
-    password=PG_PASSWORD,
-    port=PG_PORT,
-    sslmode="require",
-)
-
-ballquery="""
-SELECT pt.period_id, pt.frame_id, pt.timestamp, pt.x, pt.y, pt.player_id, p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id
-WHERE pt.game_id = '5uts2s7fl98clqz8uymaazehg' AND p.player_id = 'ball' AND pt.period_id = 1
-ORDER BY timestamp;
-"""
-# Differentiating teams logic
-team_query = """
-SELECT DISTINCT p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id AND p.player_id != 'ball'
-WHERE pt.game_id = '5uts2s7fl98clqz8uymaazehg';
-"""
-team_ids_df = pd.read_sql_query(team_query, conn)  # Fetch the query result as a DataFrame
-# Extract the team IDs as a list
-team_ids = team_ids_df['team_id'].tolist()
-
-
-
-
-teamqueries = """
-SELECT pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y, p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id
-WHERE pt.game_id = '5uts2s7fl98clqz8uymaazehg' AND p.player_id != 'ball' AND p.team_id = %s
-ORDER BY timestamp;
-"""
-
-
-
-df_ball = pd.read_sql_query(ballquery,conn)
-df_home = pd.read_sql_query(teamqueries, conn, params=(team_ids[0],))
-df_away = pd.read_sql_query(teamqueries, conn, params=(team_ids[1],))
-
-# First set up the figure, the axis
-pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
-fig, ax = pitch.draw(figsize=(16, 10.4))
-
-# then setup the pitch plot markers we want to animate
-marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
-ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
-away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)  # red/maroon
-home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)  # purple
-
-our_number = 1722798900000
-# animation function
-def animate(i):
-    # Get the frame id for the ith frame
-    frame = df_ball.loc[i, 'frame_id']
-
-    print('Current:',df_ball.loc[i, 'x'])
-    print('Next:',df_ball.loc[i+1, 'x'])
-    ball.set_data(df_ball.iloc[i, [3]]/100, df_ball.iloc[i, [4]]/100)
-    # set the player data using the frame id
-    away.set_data(df_away.loc[df_away.frame_id == frame, 'x']/100,
-                  df_away.loc[df_away.frame_id == frame, 'y']/100)
-    home.set_data(df_home.loc[df_home.frame_id == frame, 'x']/100,
-                  df_home.loc[df_home.frame_id == frame, 'y']/100)
-    print(ball,away,home)
-    return ball, away, home
-
-
-# call the animator, animate so 25 frames per second
-anim = animation.FuncAnimation(fig, animate,interval=1000, blit=True,repeat=False)
-plt.show()
+import sys
+from pathlib import Path
+
+# The shared connection pool lives in the top-level Python/ folder
+sys.path.append(str(Path(__file__).resolve().parents[1] / "Python"))
+from connection_pool import get_manager
+from roster import attach_team, get_roster
+from statements import run
+
+GAME_ID = '5uts2s7fl98clqz8uymaazehg'
+
+
+def load_match(game_id=GAME_ID):
+    """Load the first period ball data and both teams' player data of a game"""
+    with get_manager().connection() as conn:
+        # Tracking rows only; the team of every player comes from the cached roster
+        df = run(conn, "tracking_period_by_frame", (game_id, 1))
+        df = attach_team(df, get_roster(conn))
+
+    is_ball = df['player_id'] == 'ball'
+    # Differentiating teams logic
+    team_ids = df.loc[~is_ball, 'team_id'].dropna().unique().tolist()
+
+    df_ball = df[is_ball].reset_index(drop=True)
+    df_home = df[~is_ball & (df['team_id'] == team_ids[0])].reset_index(drop=True)
+    df_away = df[~is_ball & (df['team_id'] == team_ids[1])].reset_index(drop=True)
+    return df_ball, df_home, df_away
+
+
+def build_animation(df_ball, df_home, df_away):
+    """Set up the pitch figure and the animation; matplotlib is only imported here"""
+    from matplotlib import animation
+    from mplsoccer import Pitch
+
+    # First set up the figure, the axis
+    pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
+    fig, ax = pitch.draw(figsize=(16, 10.4))
+
+    # then setup the pitch plot markers we want to animate
+    marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
+    ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
+    away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)  # red/maroon
+    home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)  # purple
+
+    # animation function
+    def animate(i):
+        # Get the frame id for the ith frame
+        frame = df_ball.loc[i, 'frame_id']
+
+        ball.set_data(df_ball.loc[[i], 'x']/100, df_ball.loc[[i], 'y']/100)
+        # set the player data using the frame id
+        away.set_data(df_away.loc[df_away.frame_id == frame, 'x']/100,
+                      df_away.loc[df_away.frame_id == frame, 'y']/100)
+        home.set_data(df_home.loc[df_home.frame_id == frame, 'x']/100,
+                      df_home.loc[df_home.frame_id == frame, 'y']/100)
+        return ball, away, home
+
+    # call the animator, animate so 25 frames per second
+    anim = animation.FuncAnimation(fig, animate,interval=1000, blit=True,repeat=False)
+    return fig, anim
+
+
+def main():
+    from matplotlib import pyplot as plt
+
+    df_ball, df_home, df_away = load_match()
+    fig, anim = build_animation(df_ball, df_home, df_away)
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
 
 # note th<at its hard to get the ffmpeg requirements right.
 # I installed from conda-forge: see the environment.yml file in the docs folder
@@ -1,82 +1,18 @@
-from itertools import count
 import numpy as np
 import pandas as pd
-import psycopg2
-import dotenv
-import os
-from matplotlib import animation
-from matplotlib import pyplot as plt
-from mplsoccer import Pitch
-
-dotenv.load_dotenv()
-
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_USER = os.getenv("PG_USER")
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_DATABASE = os.getenv("PG_DB")
-
-# Database connection parameters
-import psycopg2
-import os
-from scipy.interpolate import interp1d
-from easing import easing
-
-conn = psycopg2.connect(
-    host=PG_HOST,
-    database=PG_DATABASE,
-    user=PG_USER,
-    password=PG_PASSWORD,
-    port=PG_PORT,
-    sslmode="require",
-)
-
-ballquery="""
-SELECT pt.period_id, pt.frame_id, pt.timestamp, pt.x, pt.y, pt.player_id, p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id
-WHERE pt.game_id = '5uts2s7fl98clqz8uymaazehg' AND p.player_id = 'ball' AND pt.period_id = 1
-ORDER BY timestamp;
-"""
-# Differentiating teams logic
-team_query = """
-SELECT DISTINCT p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id AND p.player_id != 'ball'
-WHERE pt.game_id = '5uts2s7fl98clqz8uymaazehg';
-"""
-team_ids_df = pd.read_sql_query(team_query, conn)  # Fetch the query result as a DataFrame
-# Extract the team IDs as a list
-team_ids = team_ids_df['team_id'].tolist()
-
-teamqueries = """
-SELECT pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y, p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id
-WHERE pt.game_id = '5uts2s7fl98clqz8uymaazehg' AND p.player_id != 'ball' AND p.team_id = %s
-ORDER BY timestamp;
-"""
-
-df_ball = pd.read_sql_query(ballquery,conn)
-df_home = pd.read_sql_query(teamqueries, conn, params=(team_ids[0],))
-df_away = pd.read_sql_query(teamqueries, conn, params=(team_ids[1],))
-
-# First set up the figure, the axis
-pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
-fig, ax = pitch.draw(figsize=(16, 10.4))
-
-# then setup the pitch plot markers we want to animate
-marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
-ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
-away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)  # red/maroon
-home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)  # purple
+
+# Same first period query as the plain animation; importing it has no side effects
+from animation import load_match
+
+# Interpolation of the ball data only - standard 24fps for video
+FRAMES_BETWEEN = 12  # Adjusted to match 24fps better, CHANGE THIS TO MAKE IT FASTER OR SLOWER
+
 
 # FIXED INTERPOLATION FUNCTION - Avoiding duplicate index issues
 def interpolate_ball_data(ball_df, frames_between=3):
     """Interpolate ball movement data to create smoother animation"""
+    from scipy.interpolate import interp1d
+
     # Create arrays for x and y coordinates
     x_values = ball_df['x'].values
     y_values = ball_df['y'].values
@@ -124,10 +60,6 @@ def interpolate_ball_data(ball_df, frames_between=3):
                     
     return result_df
 
-# Apply interpolation to the ball data only - standard 24fps for video
-frames_between = 12  # Adjusted to match 24fps better, CHANGE THIS TO MAKE IT FASTER OR SLOWER
-df_ball_interp = interpolate_ball_data(df_ball, frames_between)
-
 # Group players by frame_id to prepare player position interpolation
 def prepare_player_data(df, team):
     """Create a dictionary of player positions by frame for interpolation"""
@@ -146,10 +78,6 @@ def prepare_player_data(df, team):
     
     return frames, player_positions
 
-# Get sorted frames and positions dictionary for both teams
-home_frames, home_positions = prepare_player_data(df_home, "home")
-away_frames, away_positions = prepare_player_data(df_away, "away")
-
 # Create a function to interpolate player positions between frames
 def get_interpolated_positions(frame_id, frames, positions):
     """Get interpolated player positions for a specific frame"""
@@ -189,39 +117,72 @@ def get_interpolated_positions(frame_id, frames, positions):
     
     return result
 
-# Updated animation function
-def animate(i):
-    """Function to animate the data with interpolated frames for smoother movement."""
-    # Get the ball data
-    ball_x = df_ball_interp.iloc[i]['x']/100
-    ball_y = df_ball_interp.iloc[i]['y']/100
-    ball.set_data([ball_x], [ball_y])
-    
-    # Get the interpolated frame id
-    frame = df_ball_interp.iloc[i]['frame_id']
-    
-    # Get interpolated player positions - this will match the exact frame rate of the ball
-    home_pos = get_interpolated_positions(frame, home_frames, home_positions)
-    away_pos = get_interpolated_positions(frame, away_frames, away_positions)
-    
-    # Extract coordinates for plotting
-    home_x = [pos[0]/100 for pos in home_pos.values()]
-    home_y = [pos[1]/100 for pos in home_pos.values()]
-    away_x = [pos[0]/100 for pos in away_pos.values()]
-    away_y = [pos[1]/100 for pos in away_pos.values()]
-    
-    home.set_data(home_x, home_y)
-    away.set_data(away_x, away_y)
-    
-    return ball, home, away
-
-# Call the animator - set to 24fps
-anim = animation.FuncAnimation(fig, animate, frames=len(df_ball_interp), 
-                              interval=40,  # 24fps = 41.67ms per frame
-                              repeat_delay=1, blit=True, repeat=False)
-plt.show()
-
-# Save animation at exactly 24fps for proper playback speed
-#anim.save('smooth_soccer.mp4', dpi=150, fps=24, writer='ffmpeg',
-#         extra_args=['-vcodec', 'libx264'],
-#         savefig_kwargs={'pad_inches':0, 'facecolor':'#457E29'})
\ No newline at end of file
+def build_animation(df_ball, df_home, df_away, frames_between=FRAMES_BETWEEN):
+    """Set up the pitch figure and the interpolated animation; matplotlib is only imported here"""
+    from matplotlib import animation
+    from mplsoccer import Pitch
+
+    df_ball_interp = interpolate_ball_data(df_ball, frames_between)
+
+    # Get sorted frames and positions dictionary for both teams
+    home_frames, home_positions = prepare_player_data(df_home, "home")
+    away_frames, away_positions = prepare_player_data(df_away, "away")
+
+    # First set up the figure, the axis
+    pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
+    fig, ax = pitch.draw(figsize=(16, 10.4))
+
+    # then setup the pitch plot markers we want to animate
+    marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
+    ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
+    away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)  # red/maroon
+    home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)  # purple
+
+    # Updated animation function
+    def animate(i):
+        """Function to animate the data with interpolated frames for smoother movement."""
+        # Get the ball data
+        ball_x = df_ball_interp.iloc[i]['x']/100
+        ball_y = df_ball_interp.iloc[i]['y']/100
+        ball.set_data([ball_x], [ball_y])
+    
+        # Get the interpolated frame id
+        frame = df_ball_interp.iloc[i]['frame_id']
+    
+        # Get interpolated player positions - this will match the exact frame rate of the ball
+        home_pos = get_interpolated_positions(frame, home_frames, home_positions)
+        away_pos = get_interpolated_positions(frame, away_frames, away_positions)
+    
+        # Extract coordinates for plotting
+        home_x = [pos[0]/100 for pos in home_pos.values()]
+        home_y = [pos[1]/100 for pos in home_pos.values()]
+        away_x = [pos[0]/100 for pos in away_pos.values()]
+        away_y = [pos[1]/100 for pos in away_pos.values()]
+    
+        home.set_data(home_x, home_y)
+        away.set_data(away_x, away_y)
+    
+        return ball, home, away
+
+    # Call the animator - set to 24fps
+    anim = animation.FuncAnimation(fig, animate, frames=len(df_ball_interp), 
+                                  interval=40,  # 24fps = 41.67ms per frame
+                                  repeat_delay=1, blit=True, repeat=False)
+    return fig, anim
+
+
+def main():
+    from matplotlib import pyplot as plt
+
+    df_ball, df_home, df_away = load_match()
+    fig, anim = build_animation(df_ball, df_home, df_away)
+    plt.show()
+
+    # Save animation at exactly 24fps for proper playback speed
+    #anim.save('smooth_soccer.mp4', dpi=150, fps=24, writer='ffmpeg',
+    #         extra_args=['-vcodec', 'libx264'],
+    #         savefig_kwargs={'pad_inches':0, 'facecolor':'#457E29'})
+
+
+if __name__ == "__main__":
+    main()
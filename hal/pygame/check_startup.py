@@ -0,0 +1,85 @@
+"""
+Startup budget check for the viewer and the animation scripts.
+
+Imports a module in a fresh interpreter with `python -X importtime` and fails
+when importing it takes longer than the budget or pulls in one of the heavy
+libraries that should only be loaded on first use.
+
+    python check_startup.py                      # import game
+    python check_startup.py --module animation --path ..
+    python check_startup.py --budget 0.8 --top 15
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+# Libraries that must not be imported just by importing the viewer
+HEAVY_MODULES = ("torch", "matplotlib", "mplsoccer", "scipy")
+DEFAULT_BUDGET_SECONDS = 1.5
+
+
+def measure_imports(module, path):
+    """
+    Import a module in a subprocess with -X importtime.
+
+    Args:
+        module (str): The module to import.
+        path (str or Path): Directory the subprocess runs from.
+
+    Returns:
+        list: (module name, self seconds, cumulative seconds) per imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=path, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return timings
+
+
+def check_startup(module="game", path=None, budget=DEFAULT_BUDGET_SECONDS, heavy=HEAVY_MODULES, top=10):
+    """
+    Report the import cost of a module and check it against the budget.
+
+    Returns:
+        bool: True when the import stays within budget and loads none of `heavy`.
+    """
+    path = path or Path(__file__).resolve().parent
+    timings = measure_imports(module, path)
+    total = sum(self_s for _, self_s, _ in timings)
+
+    print(f"import {module}: {total:.3f}s for {len(timings)} modules (budget {budget:.3f}s)")
+    print("Slowest imports (cumulative):")
+    for name, _, cumulative in sorted(timings, key=lambda t: t[2], reverse=True)[:top]:
+        print(f"  {cumulative:8.3f}s  {name}")
+
+    loaded_heavy = sorted({name for name, _, _ in timings if name.split(".")[0] in heavy})
+    ok = total <= budget
+    if not ok:
+        print(f"FAIL: startup took {total:.3f}s, over the {budget:.3f}s budget")
+    if loaded_heavy:
+        ok = False
+        print(f"FAIL: heavy modules imported at startup: {', '.join(loaded_heavy)}")
+    if ok:
+        print("OK")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="game", help="Module to import")
+    parser.add_argument("--path", default=None, help="Directory to import it from")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="Budget in seconds")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to show")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_startup(args.module, args.path, args.budget, top=args.top) else 1)
@@ -1,9 +1,10 @@
 import numpy as np
 import pandas as pd
-from scipy.interpolate import interp1d
 
 # Interpolate ball data
 def interpolate_ball_data(ball_df, frames_between=3):
+    from scipy.interpolate import interp1d
+
     x_values = ball_df['x'].values
     y_values = ball_df['y'].values
     frame_ids = ball_df['frame_id'].values
@@ -1,107 +1,148 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import os
+import threading
 import pygame
 from pygame.locals import *
-from matplotlib import pyplot as plt
-from mplsoccer import Pitch
-import matplotlib.backends.backend_agg as agg
-from queries import get_all_matchups, load_data, load_highlight_data, load_possession_data
-from functions import interpolate_ball_data, prepare_player_data, get_interpolated_positions
+from queries import get_page_summaries, load_data, load_possession_data
+from playback import PlaybackEngine
+from prefetch import HighlightPrefetcher
+from resample import frame_positions
+from match_catalog import MatchCatalog
+from instrumentation import print_summary, span
 import numpy as np
 import multiprocessing as mp
-import torch
 
+# Importing this module must stay cheap: matplotlib, mplsoccer and torch are
+# only imported once they are actually needed (see check_startup.py)
+window_width, window_height = 1920, 1080 # Change it to relative value for different screens
+screen = None
+MATCHES_PER_PAGE = 10
+_pitch_figure = None
+_pitch_figure_lock = threading.Lock()
 
-# Import multiprocessing libraries
-# Try to use GPU acceleration if available
-try:
-    # For matplotlib, switch to a GPU-accelerated backend if possible
-    import matplotlib
-    # Try to use a hardware-accelerated backend
-    matplotlib.use("Agg")  # Agg is often faster than default backends
-    
-    # Set OpenGL attributes BEFORE pygame.init()
-    pygame.display.gl_set_attribute(pygame.GL_ACCELERATED_VISUAL, 1)
-    
-    # Check if CUDA is available for numpy operations
-    import torch
-    use_cuda = torch.cuda.is_available()
-    if use_cuda:
-        print("CUDA GPU acceleration available and enabled!")
-        device = torch.device("cuda")
-    else:
-        print("CUDA not available, using CPU for computations")
-        device = torch.device("cpu")
-except ImportError:
-    print("PyTorch not installed, using standard CPU rendering")
-    use_cuda = False
-except pygame.error:
-    print("Could not set PyGame OpenGL attributes, using standard rendering")
 
-# Initialize Pygame
-pygame.init()
-window_width, window_height = 1920, 1080 # Change it to relative value for different screens
-screen = pygame.display.set_mode((window_width, window_height))
-pygame.display.set_caption("Soccer Match Viewer")
+def get_torch_device():
+    """The torch device to compute on, only imported when SOCCER_VIEWER_GPU=1 is set"""
+    if os.getenv("SOCCER_VIEWER_GPU") != "1":
+        return None
+    try:
+        import torch
+    except ImportError:
+        print("PyTorch not installed, using standard CPU rendering")
+        return None
+    if torch.cuda.is_available():
+        print("CUDA GPU acceleration available and enabled!")
+        return torch.device("cuda")
+    print("CUDA not available, using CPU for computations")
+    return torch.device("cpu")
 
-# Create the matplotlib figure
-pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
-fig, ax = pitch.draw(figsize=(16, 10.4))
-marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
-ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
-away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)
-home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)
 
-# Animation function
-def animate(i, df_ball_interp, home_frames, home_positions, away_frames, away_positions):
+# Initialize Pygame and open the window
+def init_display():
+    global screen
     try:
-        ball_x = df_ball_interp.iloc[i]['x'] / 100
-        ball_y = df_ball_interp.iloc[i]['y'] / 100
-        ball.set_data([ball_x], [ball_y])
+        # Set OpenGL attributes BEFORE pygame.init()
+        pygame.display.gl_set_attribute(pygame.GL_ACCELERATED_VISUAL, 1)
+    except pygame.error:
+        print("Could not set PyGame OpenGL attributes, using standard rendering")
 
-        frame = df_ball_interp.iloc[i]['frame_id']
-        home_pos = get_interpolated_positions(frame, home_frames, home_positions)
-        away_pos = get_interpolated_positions(frame, away_frames, away_positions)
+    pygame.init()
+    screen = pygame.display.set_mode((window_width, window_height))
+    pygame.display.set_caption("Soccer Match Viewer")
+    return screen
 
-        home_x = [pos[0] / 100 for pos in home_pos.values()]
-        home_y = [pos[1] / 100 for pos in home_pos.values()]
-        away_x = [pos[0] / 100 for pos in away_pos.values()]
-        away_y = [pos[1] / 100 for pos in away_pos.values()]
 
-        home.set_data(home_x, home_y)
-        away.set_data(away_x, away_y)
-    except Exception as e:
-        print(f"Animation error: {e}")
-        ball.set_data([], [])
-        home.set_data([], [])
-        away.set_data([], [])
+# Create the matplotlib figure on first use
+def get_pitch_figure():
+    global _pitch_figure
+    with _pitch_figure_lock:
+        if _pitch_figure is None:
+            import matplotlib
+            matplotlib.use("Agg")  # Agg is often faster than default backends
+            from mplsoccer import Pitch
 
-# Draw frame
-def draw_frame(frame_idx, df_ball_interp, home_frames, home_positions, away_frames, away_positions):
-    try:
-        animate(frame_idx, df_ball_interp, home_frames, home_positions, away_frames, away_positions)
+            pitch = Pitch(pitch_type='metricasports', goal_type='line', pitch_width=68, pitch_length=105)
+            fig, ax = pitch.draw(figsize=(16, 10.4))
+            marker_kwargs = {'marker': 'o', 'markeredgecolor': 'black', 'linestyle': 'None'}
+            ball, = ax.plot([], [], ms=6, markerfacecolor='w', zorder=3, **marker_kwargs)
+            away, = ax.plot([], [], ms=10, markerfacecolor='#b94b75', **marker_kwargs)
+            home, = ax.plot([], [], ms=10, markerfacecolor='#7f63b8', **marker_kwargs)
+            _pitch_figure = (fig, ball, home, away)
+    return _pitch_figure
+
+# Render the current state of the matplotlib figure to a pygame surface
+def render_figure():
+    import matplotlib.backends.backend_agg as agg
+
+    fig = get_pitch_figure()[0]
+    with span("render.draw"):
         canvas = agg.FigureCanvasAgg(fig)
         canvas.draw()
         renderer = canvas.get_renderer()
-        
+    
+    # Converting the canvas to a pygame surface is this viewer's encode step
+    with span("encode"):
         raw_data = renderer.tostring_argb()
         canvas_width, canvas_height = canvas.get_width_height()
 
         argb_array = np.frombuffer(raw_data, dtype=np.uint8).reshape(canvas_height, canvas_width, 4)
         rgb_array = argb_array[:, :, 1:]
         return pygame.image.frombuffer(rgb_array.tobytes(), (canvas_width, canvas_height), "RGB")
+
+def blank_frame():
+    s = pygame.Surface((1600, 1040))
+    s.fill((0, 100, 0))  # Fill with green as a fallback
+    return s
+
+# Draw already interpolated (x, y) coordinate arrays, from the playback engine or the resampler
+def draw_positions(ball_xy, home_xy, away_xy):
+    _, ball, home, away = get_pitch_figure()
+    try:
+        with span("render.frame"):
+            ball.set_data(ball_xy[0] / 100, ball_xy[1] / 100)
+            home.set_data(home_xy[0] / 100, home_xy[1] / 100)
+            away.set_data(away_xy[0] / 100, away_xy[1] / 100)
+            return render_figure()
     except Exception as e:
         print(f"Frame rendering error: {e}")
-        # Return a blank surface if there's an error
-        s = pygame.Surface((1600, 1040))
-        s.fill((0, 100, 0))  # Fill with green as a fallback
-        return s
+        return blank_frame()
+
+# Rendered text surfaces, the menus draw the same labels on every frame
+@lru_cache(maxsize=1024)
+def render_text(font, text, color):
+    return font.render(text, True, color)
+
+# Shared by every visit of the match menu, so pages and searches stay cached
+_match_catalog = None
+
+def get_match_catalog():
+    global _match_catalog
+    if _match_catalog is None:
+        _match_catalog = MatchCatalog(page_size=MATCHES_PER_PAGE)
+    return _match_catalog
+
+def summary_label(summaries, match_id):
+    """Possession and shots of a match from the page's summaries, '' when not summarized"""
+    if summaries is None or match_id not in summaries.index:
+        return ""
+    summary = summaries.loc[match_id].reindex(
+        ["home_possession_share", "away_possession_share", "home_shots", "away_shots"])
+    if summary.isna().any():
+        return ""
+    return (f"   {summary['home_possession_share']:.0%} - {summary['away_possession_share']:.0%} possession,"
+            f" shots {summary['home_shots']:.0f} - {summary['away_shots']:.0f}")
 
 # Match selection menu
 def match_selection_menu():
-    # Load available matches
-    matches_df = get_all_matchups()
+    catalog = get_match_catalog()
     
-    if matches_df.empty:
+    # Load the first page of matches
+    search = ""
+    cursors = [None]  # Cursor of every page visited, to page back
+    page = catalog.page()
+    
+    if page['matches'].empty:
         print("No matches found in the database.")
         return None
         
@@ -110,28 +151,29 @@ def match_selection_menu():
     font_medium = pygame.font.SysFont("Arial", 28)
     font = pygame.font.SysFont("Arial", 24)
     
-    title_text = font_large.render("Select a Match to View", True, (255, 255, 255))
-    instruction_text = font_medium.render("Click on a match to watch or ESC to quit", True, (200, 200, 200))
+    title_text = render_text(font_large, "Select a Match to View", (255, 255, 255))
+    instruction_text = render_text(font_medium, "Click on a match to watch, type to search a team or ESC to quit", (200, 200, 200))
     
     # Colors
     bg_color = (20, 55, 20)  # Dark green background
     button_color = (40, 80, 40)  # Slightly lighter green
     hover_color = (60, 120, 60)  # Highlight color
     
-    # Maximum matches per page and scrolling
-    matches_per_page = 10
-    current_scroll = 0
-    max_scroll = max(0, len(matches_df) - matches_per_page)
-    
     # Create buttons for each match
     button_height = 50
     button_margin = 10
-    menu_y_start = 150  # Start position for the first button
+    menu_y_start = 200  # Start position for the first button
     
-    # Scroll buttons
+    # Search box and page buttons
+    search_box = pygame.Rect(window_width // 2 - 400, 140, 800, 40)
     scroll_up_button = pygame.Rect(window_width - 100, menu_y_start, 80, 40)
     scroll_down_button = pygame.Rect(window_width - 100, window_height - 100, 80, 40)
     
+    # Only search once typing pauses, not on every key
+    search_delay_ms = 250
+    search_typed_at = None
+    
+    clock = pygame.time.Clock()
     running = True
     selected_match_id = None
     
@@ -142,34 +184,43 @@ def match_selection_menu():
         screen.blit(title_text, (window_width // 2 - title_text.get_width() // 2, 50))
         screen.blit(instruction_text, (window_width // 2 - instruction_text.get_width() // 2, 100))
         
-        # Draw scroll buttons
+        # Draw the search box
+        pygame.draw.rect(screen, (10, 30, 10), search_box)
+        search_text = render_text(font, f"Search team: {search}_", (255, 255, 255))
+        screen.blit(search_text, (search_box.x + 10, search_box.centery - search_text.get_height() // 2))
+        
+        # Draw page buttons
         pygame.draw.rect(screen, (80, 80, 80), scroll_up_button)
         pygame.draw.rect(screen, (80, 80, 80), scroll_down_button)
-        up_text = font.render("▲", True, (255, 255, 255))
-        down_text = font.render("▼", True, (255, 255, 255))
+        up_text = render_text(font, "▲", (255, 255, 255))
+        down_text = render_text(font, "▼", (255, 255, 255))
         screen.blit(up_text, (scroll_up_button.centerx - up_text.get_width() // 2, 
                              scroll_up_button.centery - up_text.get_height() // 2))
         screen.blit(down_text, (scroll_down_button.centerx - down_text.get_width() // 2, 
                                scroll_down_button.centery - down_text.get_height() // 2))
+        page_text = render_text(font, f"Page {len(cursors)}", (200, 200, 200))
+        screen.blit(page_text, (scroll_up_button.centerx - page_text.get_width() // 2, scroll_up_button.bottom + 10))
         
-        # Draw match buttons
-        visible_matches = matches_df.iloc[current_scroll:current_scroll + matches_per_page]
+        # Draw match buttons, with the materialized summaries fetched once per (cached) page
         match_buttons = []
+        mouse_pos = pygame.mouse.get_pos()
+        if 'summaries' not in page:
+            page['summaries'] = get_page_summaries(page['matches']) if not page['matches'].empty else None
         
-        for i, (_, match) in enumerate(visible_matches.iterrows()):
+        for i, match in enumerate(page['matches'].itertuples(index=False)):
             button_y = menu_y_start + (button_height + button_margin) * i
             match_button = pygame.Rect(window_width // 2 - 400, button_y, 800, button_height)
-            match_buttons.append((match_button, match['match_id']))
+            match_buttons.append((match_button, match.match_id))
             
             # Check if mouse is hovering over this button
-            mouse_pos = pygame.mouse.get_pos()
             if match_button.collidepoint(mouse_pos):
                 pygame.draw.rect(screen, hover_color, match_button)
             else:
                 pygame.draw.rect(screen, button_color, match_button)
             
             # Draw match info - centered in the button
-            match_text = font.render(f"{match['matchup']}", True, (255, 255, 255))
+            match_text = render_text(font, match.matchup + summary_label(page['summaries'], match.match_id),
+                                     (255, 255, 255))
             
             # Calculate centered position
             text_x = match_button.x + (match_button.width - match_text.get_width()) // 2
@@ -178,6 +229,10 @@ def match_selection_menu():
             # Draw the text centered
             screen.blit(match_text, (text_x, text_y))
         
+        if page['matches'].empty:
+            empty_text = render_text(font_medium, f"No matches for '{search}'", (200, 200, 200))
+            screen.blit(empty_text, (window_width // 2 - empty_text.get_width() // 2, menu_y_start))
+        
         # Process events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -186,10 +241,20 @@ def match_selection_menu():
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
-                elif event.key == pygame.K_UP:
-                    current_scroll = max(0, current_scroll - 1)
-                elif event.key == pygame.K_DOWN:
-                    current_scroll = min(max_scroll, current_scroll + 1)
+                elif event.key in (pygame.K_UP, pygame.K_PAGEUP):
+                    if len(cursors) > 1:
+                        cursors.pop()
+                        page = catalog.page(cursors[-1], search)
+                elif event.key in (pygame.K_DOWN, pygame.K_PAGEDOWN):
+                    if page['next_cursor'] is not None:
+                        cursors.append(page['next_cursor'])
+                        page = catalog.page(cursors[-1], search)
+                elif event.key == pygame.K_BACKSPACE:
+                    search = search[:-1]
+                    search_typed_at = pygame.time.get_ticks()
+                elif event.unicode and event.unicode.isprintable():
+                    search += event.unicode
+                    search_typed_at = pygame.time.get_ticks()
             
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 # Check if a match was clicked
@@ -199,13 +264,22 @@ def match_selection_menu():
                         running = False
                         break
                 
-                # Check scroll buttons
-                if scroll_up_button.collidepoint(event.pos):
-                    current_scroll = max(0, current_scroll - 1)
-                elif scroll_down_button.collidepoint(event.pos):
-                    current_scroll = min(max_scroll, current_scroll + 1)
+                # Check page buttons
+                if scroll_up_button.collidepoint(event.pos) and len(cursors) > 1:
+                    cursors.pop()
+                    page = catalog.page(cursors[-1], search)
+                elif scroll_down_button.collidepoint(event.pos) and page['next_cursor'] is not None:
+                    cursors.append(page['next_cursor'])
+                    page = catalog.page(cursors[-1], search)
+        
+        # Start over at the first page of the new search once typing pauses
+        if search_typed_at is not None and pygame.time.get_ticks() - search_typed_at >= search_delay_ms:
+            search_typed_at = None
+            cursors = [None]
+            page = catalog.page(None, search)
         
         pygame.display.flip()
+        clock.tick(60)
     
     return selected_match_id
 def possession_selection_menu(match_id, df_possesion_first_period, df_possesion_second_period):
@@ -370,70 +444,27 @@ def possession_selection_menu(match_id, df_possesion_first_period, df_possesion_
         pygame.display.flip()
     
     return None  # Return None if user cancels
-def highlight_animation_screen(match_id, period, possession_idx):
-    # Get the possession data first to get the timestamp
-    _, _, _, df_possesion_first_period, df_possesion_second_period = load_possession_data(match_id)
-    
-    # Determine which period's data to use
-    period_df = df_possesion_first_period if period == "1st Period" else df_possesion_second_period
-    
-    # Get the specific possession
-    possession = period_df.iloc[possession_idx]
+def highlight_animation_screen(match_id, period, possession_idx, possession, prefetcher):
     timestamp = possession['seconds']
+    key = (period, possession_idx)
     
     print(f"Loading highlight data for match {match_id}, period {period}, at timestamp {timestamp}")
     
-    # Load data just for this time window
-    df_ball, df_home, df_away = load_highlight_data(match_id, timestamp)
+    # Loaded and interpolated in the background if it was prefetched, otherwise now
+    highlight = prefetcher.get(key)
+    # Start preparing the next highlights while this one plays
+    prefetcher.prefetch_after(key)
     
-    if df_ball is None or df_ball.empty:
+    if highlight is None:
         print(f"No data available for highlight at {timestamp} seconds")
         return "highlights"
     
-    print(f"Successfully loaded highlight data: {len(df_ball)} ball points, {len(df_home)} home player points, {len(df_away)} away player points")
-    
-<<<<<<< HEAD
-    # Calculate the real-time duration of the highlight
-    if len(df_ball) >= 2:
-        start_time = df_ball['timestamp'].min()
-        end_time = df_ball['timestamp'].max()
-        real_duration = end_time - start_time
-        print(f"Real-time highlight duration: {real_duration:.2f} seconds")
-    else:
-        real_duration = 10  # Default duration if we can't calculate
-    
-    # Set target framerate to 120 FPS
-    target_fps = 120
-    
-    # Calculate total frames needed for the animation at 120 FPS
-    total_target_frames = int(real_duration * target_fps)
-    
-    # Calculate interpolation factor based on original data and target frame count
-    original_points = len(df_ball)
-    
-    if original_points > 1:
-        # Calculate frames_between to achieve exactly 120 FPS
-        # Each original point becomes (frames_between + 1) frames after interpolation
-        # So (original_points) * (frames_between + 1) ≈ total_target_frames
-        frames_between = max(1, (total_target_frames // original_points) - 1)
-        print(f"Setting frames_between to {frames_between} to achieve {target_fps} FPS")
-    else:
-        frames_between = 119  # Default if insufficient data
-        print("Using default interpolation of 119 frames between points")
-    
-    # Interpolate highlight data with calculated frame count
-=======
-    # Interpolate highlight data
-    frames_between = 12
->>>>>>> parent of f82d795 (interpolation fixed)
-    df_ball_interp = interpolate_ball_data(df_ball, frames_between)
-    home_frames, home_positions = prepare_player_data(df_home, "home")
-    away_frames, away_positions = prepare_player_data(df_away, "away")
-    
-    total_frames = len(df_ball_interp)
-    print(f"Interpolated to {total_frames} frames for {real_duration:.2f} seconds = {total_frames/real_duration:.2f} FPS")
-    
-<<<<<<< HEAD
+    grid = highlight['grid']
+    real_duration = highlight['real_duration']
+    
+    total_frames = highlight['total_frames']
+    print(f"Resampled to {total_frames} frames for {real_duration:.2f} seconds = {grid['fps']} FPS")
+    
     # PERFORMANCE OPTIMIZATION: Pre-render all frames with GPU acceleration
     print("Pre-rendering frames with GPU acceleration...")
     pre_rendered_frames = []
@@ -451,7 +482,9 @@ def highlight_animation_screen(match_id, period, possession_idx):
                 print(f"Process rendering frames {start_idx}-{end_idx}: {i}/{end_idx - start_idx} complete")
             
             # Render the frame
-            frame = draw_frame(i, df_ball_interp, home_frames, home_positions, away_frames, away_positions)
+            frame = draw_positions(frame_positions(grid, 'ball', i),
+                                   frame_positions(grid, 'home', i),
+                                   frame_positions(grid, 'away', i))
             chunk_frames.append(frame)
         return chunk_frames
     
@@ -497,11 +530,6 @@ def highlight_animation_screen(match_id, period, possession_idx):
     start_time_ms = pygame.time.get_ticks()
     pause_offset = 0  # Track paused time
     last_pause_time = 0
-=======
-    # Game loop settings
-    clock = pygame.time.Clock()
-    fps = 24
->>>>>>> parent of f82d795 (interpolation fixed)
     current_frame = 0
     playing = True  # Start in a playing state for highlights
     
@@ -638,22 +666,15 @@ def highlight_animation_screen(match_id, period, possession_idx):
         
         # Update the display
         pygame.display.flip()
-<<<<<<< HEAD
         
         # Use a consistent high FPS for smooth rendering
         # The actual animation speed is controlled by our time-based calculations
         clock.tick(120)  # Aim for 120 FPS rendering
-=======
-        clock.tick(fps)
->>>>>>> parent of f82d795 (interpolation fixed)
     
     return "highlights"  # Return to highlight selection by default
 # Animation screen
-def highlight_selection_menu(match_id):
+def highlight_selection_menu(match_id, df_possesion_first_period, df_possesion_second_period):
     """Display a menu to select a specific highlight to view."""
-    # Load only possession change data for the highlights
-    _, _, _, df_possesion_first_period, df_possesion_second_period = load_possession_data(match_id)
-    
     # Menu settings
     font_large = pygame.font.SysFont("Arial", 36)
     font_medium = pygame.font.SysFont("Arial", 28)
@@ -697,6 +718,9 @@ def highlight_selection_menu(match_id):
     scroll_up_button = pygame.Rect(window_width - 100, menu_y_start, 80, 40)
     scroll_down_button = pygame.Rect(window_width - 100, window_height - 100, 80, 40)
     
+    # Button to watch the whole match instead of a single highlight
+    full_match_button = pygame.Rect(window_width - 260, 140, 200, period_button_height)
+    
     running = True
     selected_possession_idx = None
     
@@ -719,6 +743,12 @@ def highlight_selection_menu(match_id):
             screen.blit(button_text, (button.centerx - button_text.get_width() // 2, 
                                      button.centery - button_text.get_height() // 2))
         
+        # Draw full match button
+        pygame.draw.rect(screen, (200, 100, 0), full_match_button)
+        full_match_text = font.render("Full Match", True, (255, 255, 255))
+        screen.blit(full_match_text, (full_match_button.centerx - full_match_text.get_width() // 2, 
+                                      full_match_button.centery - full_match_text.get_height() // 2))
+        
         # Draw scroll buttons if needed
         if len(current_df) > possessions_per_page:
             pygame.draw.rect(screen, (80, 80, 80), scroll_up_button)
@@ -784,6 +814,9 @@ def highlight_selection_menu(match_id):
                     current_scroll = min(max_scroll, current_scroll + 1)
             
             elif event.type == pygame.MOUSEBUTTONDOWN:
+                if full_match_button.collidepoint(event.pos):
+                    return "full_match"
+                
                 # Check if a period button was clicked
                 for button, label in period_buttons:
                     if button.collidepoint(event.pos) and label != current_period:
@@ -814,37 +847,27 @@ def highlight_selection_menu(match_id):
         pygame.display.flip()
     
     return None  # Return None if user cancels
-<<<<<<< HEAD
-=======
 def animation_screen(match_id):
+    """Play back a full match (both periods) with a seekable timeline."""
     # Load data for the selected match
     df_ball, df_home, df_away, df_possesion_first_period, df_possesion_second_period = load_data(match_id)
     
     if df_ball is None or df_ball.empty:
         print(f"No data available for match {match_id}")
-        return
-    
-    # Interpolate full match data
-    frames_between = 12
-    df_ball_interp = interpolate_ball_data(df_ball, frames_between)
-    home_frames, home_positions = prepare_player_data(df_home, "home")
-    away_frames, away_positions = prepare_player_data(df_away, "away")
-    
-    # Variables to track if we're viewing a specific possession change
-    viewing_possession = False
-    possession_ball_interp = None
-    possession_home_frames = None
-    possession_home_positions = None
-    possession_away_frames = None
-    possession_away_positions = None
-    possession_info = ""
+        return "menu"
     
-    # Game loop settings
+    # Build the playback engine once; frames are interpolated on demand while playing
+    with span("interpolate", match_id=match_id, rows=len(df_ball)):
+        engine = PlaybackEngine(df_ball, df_home, df_away)
+    
+    # Playback state, position is in seconds on the match timeline
     clock = pygame.time.Clock()
-    fps = 24
-    current_frame = 0
-    total_frames = len(df_ball_interp)
+    render_fps = 30
+    speeds = [0.25, 0.5, 1.0, 2.0, 4.0, 8.0]
+    speed_idx = speeds.index(1.0)
+    position = 0.0
     playing = False  # Start in a paused state
+    dragging = False
     
     # Button dimensions
     button_width = 100
@@ -858,29 +881,56 @@ def animation_screen(match_id):
     restart_button = pygame.Rect(button_margin + 220, controls_y, button_width, button_height)
     possession_button = pygame.Rect(button_margin + 330, controls_y, button_width + 60, button_height)
     back_button = pygame.Rect(button_margin + 500, controls_y, button_width, button_height)
+    slower_button = pygame.Rect(button_margin + 610, controls_y, 40, button_height)
+    faster_button = pygame.Rect(button_margin + 660, controls_y, 40, button_height)
+    
+    # Scrub bar spanning the whole match, just above the controls
+    scrub_bar = pygame.Rect(button_margin, controls_y - 40, window_width - 2 * button_margin, 16)
     
     font = pygame.font.SysFont("Arial", 24)
     
-    running = True
-    while running:
+    def seek_to_mouse(mouse_x):
+        fraction = (mouse_x - scrub_bar.x) / scrub_bar.width
+        return min(max(fraction, 0.0), 1.0) * engine.duration
+    
+    while True:
+        # Real time since the last tick, playback speed is independent of the render rate
+        elapsed_s = clock.tick(render_fps) / 1000
+        
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False
+                return "quit"
             
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
-                    running = False
+                    # Back to the highlight menu, like ESC everywhere else
+                    return "back"
                 elif event.key == pygame.K_SPACE:
                     playing = not playing
+                elif event.key == pygame.K_LEFT:
+                    position = max(0.0, position - 5)
+                elif event.key == pygame.K_RIGHT:
+                    position = min(engine.duration, position + 5)
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    speed_idx = min(len(speeds) - 1, speed_idx + 1)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    speed_idx = max(0, speed_idx - 1)
             
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if start_button.collidepoint(event.pos):
+                if scrub_bar.inflate(0, 20).collidepoint(event.pos):
+                    dragging = True
+                    position = seek_to_mouse(event.pos[0])
+                elif start_button.collidepoint(event.pos):
                     playing = True
                 elif stop_button.collidepoint(event.pos):
                     playing = False
                 elif restart_button.collidepoint(event.pos):
-                    current_frame = 0
+                    position = 0.0
                     playing = False
+                elif slower_button.collidepoint(event.pos):
+                    speed_idx = max(0, speed_idx - 1)
+                elif faster_button.collidepoint(event.pos):
+                    speed_idx = min(len(speeds) - 1, speed_idx + 1)
                 elif possession_button.collidepoint(event.pos):
                     # Pause animation
                     playing = False
@@ -890,77 +940,57 @@ def animation_screen(match_id):
                     
                     if result:
                         period, possession_idx = result
-                        # Set the flag for viewing a possession
-                        viewing_possession = True
-                        
-                        # Get the appropriate dataframe based on period
                         period_df = df_possesion_first_period if period == "1st Period" else df_possesion_second_period
+                        possession = period_df.loc[possession_idx]
                         
-                        # Prepare possession data
-                        possession = period_df.iloc[possession_idx]
-                        timestamp = possession['seconds']
-                        
-                        # Filter data for the time window
-                        window_start = timestamp - 3  # 3 seconds before\\
-                        window_end = timestamp + 7    # 7 seconds after
-                        
-                        df_team_home = df_home[(df_home['timestamp'] >= window_start) & (df_home['timestamp'] <= window_end)]
-                        df_team_away = df_away[(df_away['timestamp'] >= window_start) & (df_away['timestamp'] <= window_end)]
-                        df_ball_event = df_ball[(df_ball['timestamp'] >= window_start) & (df_ball['timestamp'] <= window_end)]
-                        
-                        if not df_team_home.empty and not df_team_away.empty and not df_ball_event.empty:
-                            # Process data
-                            possession_ball_interp = interpolate_ball_data(df_ball_event, frames_between)
-                            possession_home_frames, possession_home_positions = prepare_player_data(df_team_home, "home")
-                            possession_away_frames, possession_away_positions = prepare_player_data(df_team_away, "away")
-                            
-                            # Set active data to the possession data
-                            df_ball_interp = possession_ball_interp
-                            home_frames = possession_home_frames
-                            home_positions = possession_home_positions
-                            away_frames = possession_away_frames
-                            away_positions = possession_away_positions
-                            
-                            # Reset frame counter
-                            current_frame = 0
-                            total_frames = len(df_ball_interp)
-                            
-                            # Update info text
-                            possession_info = f"{period} - {possession['losing_team']} lost to {possession['gaining_team']}"
+                        # Jump to 3 seconds before the possession change
+                        period_id = 1 if period == "1st Period" else 2
+                        position = engine.position_of(period_id, possession['seconds'] - 3)
+                        playing = True
                 
                 elif back_button.collidepoint(event.pos):
-                    if viewing_possession:
-                        # If we're viewing a possession, go back to full match view
-                        viewing_possession = False
-                        # Reset to full match data
-                        df_ball_interp = interpolate_ball_data(df_ball, frames_between)
-                        home_frames, home_positions = prepare_player_data(df_home, "home")
-                        away_frames, away_positions = prepare_player_data(df_away, "away")
-                        current_frame = 0
-                        total_frames = len(df_ball_interp)
-                        possession_info = ""
-                    else:
-                        # Otherwise go back to match selection
-                        return "menu"
+                    return "menu"
+            
+            elif event.type == pygame.MOUSEBUTTONUP:
+                dragging = False
+            
+            elif event.type == pygame.MOUSEMOTION and dragging:
+                position = seek_to_mouse(event.pos[0])
         
-        # Update frame if playing
-        if playing and total_frames > 0:
-            current_frame = (current_frame + 1) % total_frames
+        # Advance the match clock by the real elapsed time times the playback speed
+        if playing and not dragging:
+            position += elapsed_s * speeds[speed_idx]
+            if position >= engine.duration:
+                position = engine.duration
+                playing = False
         
         # Draw the current frame
-        frame_surface = draw_frame(current_frame, df_ball_interp, home_frames, home_positions, away_frames, away_positions)
+        ball_xy, home_xy, away_xy = engine.positions_at(position)
+        frame_surface = draw_positions(ball_xy, home_xy, away_xy)
         screen.blit(frame_surface, (0, 0))
         
         # Draw background for controls
-        controls_bg = pygame.Rect(0, controls_y - 10, window_width, button_height + 20)
+        controls_bg = pygame.Rect(0, scrub_bar.y - 10, window_width, window_height - scrub_bar.y + 10)
         pygame.draw.rect(screen, (0, 0, 0, 180), controls_bg)  # Semi-transparent black
         
+        # Draw the scrub bar with period boundaries and the play head
+        pygame.draw.rect(screen, (80, 80, 80), scrub_bar)
+        if engine.duration > 0:
+            progress_width = int(scrub_bar.width * position / engine.duration)
+            pygame.draw.rect(screen, (0, 160, 0), (scrub_bar.x, scrub_bar.y, progress_width, scrub_bar.height))
+            for period in engine.periods[1:]:
+                marker_x = scrub_bar.x + int(scrub_bar.width * period['offset'] / engine.duration)
+                pygame.draw.line(screen, (255, 255, 255), (marker_x, scrub_bar.y - 4), (marker_x, scrub_bar.bottom + 4), 2)
+            pygame.draw.circle(screen, (255, 255, 255), (scrub_bar.x + progress_width, scrub_bar.centery), 10)
+        
         # Draw buttons
         pygame.draw.rect(screen, (0, 200, 0), start_button)  # Green for Start
         pygame.draw.rect(screen, (200, 0, 0), stop_button)   # Red for Stop
         pygame.draw.rect(screen, (0, 0, 200), restart_button)  # Blue for Restart
         pygame.draw.rect(screen, (200, 100, 0), possession_button)  # Orange for Possession
         pygame.draw.rect(screen, (100, 100, 100), back_button)  # Gray for Back
+        pygame.draw.rect(screen, (80, 80, 80), slower_button)
+        pygame.draw.rect(screen, (80, 80, 80), faster_button)
         
         # Add button labels
         start_text = font.render("Start", True, (255, 255, 255))
@@ -968,30 +998,31 @@ def animation_screen(match_id):
         restart_text = font.render("Restart", True, (255, 255, 255))
         possession_text = font.render("Possessions", True, (255, 255, 255))
         back_text = font.render("Back", True, (255, 255, 255))
+        slower_text = font.render("-", True, (255, 255, 255))
+        faster_text = font.render("+", True, (255, 255, 255))
         
         screen.blit(start_text, (start_button.x + 20, start_button.y + 5))
         screen.blit(stop_text, (stop_button.x + 20, stop_button.y + 5))
         screen.blit(restart_text, (restart_button.x + 10, restart_button.y + 5))
         screen.blit(possession_text, (possession_button.x + 10, possession_button.y + 5))
         screen.blit(back_text, (back_button.x + 20, back_button.y + 5))
+        screen.blit(slower_text, (slower_button.x + 15, slower_button.y + 5))
+        screen.blit(faster_text, (faster_button.x + 12, faster_button.y + 5))
         
-        # Add match and frame info
-        if viewing_possession:
-            match_info = font.render(f"Possession Change: {possession_info} - Frame: {current_frame}/{total_frames}", True, (255, 255, 255))
-        else:
-            match_info = font.render(f"Match ID: {match_id} - Frame: {current_frame}/{total_frames}", True, (255, 255, 255))
+        # Add match clock and playback speed info
+        period_id, seconds = engine.clock_at(position)
+        minutes, secs = divmod(int(seconds), 60)
+        match_info = font.render(f"Match ID: {match_id} - Period {period_id} {minutes:02d}:{secs:02d} - Speed: {speeds[speed_idx]}x", True, (255, 255, 255))
         
-        screen.blit(match_info, (window_width - 500, controls_y + 5))
+        screen.blit(match_info, (window_width - 700, controls_y + 5))
         
         # Update the display
         pygame.display.flip()
-        clock.tick(fps)
-    
-    return "quit"
 
->>>>>>> parent of f82d795 (interpolation fixed)
 
 def main():
+    init_display()
+    get_torch_device()
     while True:
         # Show the match selection menu
         match_id = match_selection_menu()
@@ -999,22 +1030,43 @@ def main():
         if match_id is None:
             break  # Exit if no match was selected
         
+        # Load the possession changes once per match and prepare highlights in the background
+        _, _, _, df_possesion_first_period, df_possesion_second_period = load_possession_data(match_id)
+        prefetcher = HighlightPrefetcher(match_id, df_possesion_first_period, df_possesion_second_period)
+        
         # Show the highlight selection menu instead of animation screen
         while True:
-            highlight = highlight_selection_menu(match_id)
+            highlight = highlight_selection_menu(match_id, df_possesion_first_period, df_possesion_second_period)
             
             if highlight is None:
                 break  # Go back to match selection
             
+            if highlight == "full_match":
+                # Watch the whole match with the seekable playback screen,
+                # only closing the window quits, ESC and Back return here
+                if animation_screen(match_id) == "quit":
+                    prefetcher.shutdown()
+                    pygame.quit()
+                    return
+                continue
+            
             # Show the animation for the selected highlight
             period, possession_idx = highlight
-            result = highlight_animation_screen(match_id, period, possession_idx)
+            period_df = df_possesion_first_period if period == "1st Period" else df_possesion_second_period
+            possession = period_df.loc[possession_idx]
+            result = highlight_animation_screen(match_id, period, possession_idx, possession, prefetcher)
             
             # If the result is not "highlights", go back to match selection
             if result != "highlights":
                 break
+        
+        prefetcher.shutdown()
     
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        # Where the time went: db.fetch, deserialize, interpolate, render.*, encode
+        print_summary()
@@ -0,0 +1,82 @@
+import numpy as np
+
+from resample import TRACKING_FPS, MAX_GAP_SECONDS, resample
+
+
+class PlaybackEngine:
+    """Seekable full-match playback over both periods.
+
+    The tracking rows are resampled once onto a uniform grid at the native
+    25 Hz (see resample.py, the same resampler the highlights and the video
+    export use), with the periods laid out back to back on one timeline.
+    Seeking is a single array lookup and only the frame that is actually
+    shown gets interpolated, between its two neighbouring grid frames.
+    """
+
+    def __init__(self, df_ball, df_home, df_away, fps=TRACKING_FPS, max_gap=MAX_GAP_SECONDS):
+        self.fps = fps
+        grid = resample({'ball': df_ball, 'home': df_home, 'away': df_away}, fps=fps, max_gap=max_gap)
+
+        self.period_ids = grid['period_id']
+        # float32 keeps a full match of dense (frames, players) arrays small
+        self.ball_x, self.ball_y = (grid['ball'][c].astype(np.float32) for c in ('x', 'y'))
+        self.home_x, self.home_y = (grid['home'][c].astype(np.float32) for c in ('x', 'y'))
+        self.away_x, self.away_y = (grid['away'][c].astype(np.float32) for c in ('x', 'y'))
+
+        # Every period is a contiguous run of grid frames, so its offset on the timeline is its first frame
+        self.periods = []
+        for period_id in np.unique(self.period_ids):
+            rows = np.flatnonzero(self.period_ids == period_id)
+            self.periods.append({
+                'period_id': int(period_id), 'offset': float(rows[0] / fps),
+                'start': float(grid['seconds'][rows[0]]), 'end': float(grid['seconds'][rows[-1]]),
+            })
+        self.duration = len(self.period_ids) / fps
+
+    def _period_at(self, position):
+        for period in reversed(self.periods):
+            if position >= period['offset']:
+                return period
+        return self.periods[0]
+
+    def position_of(self, period_id, seconds):
+        """Timeline position of a period-relative time, e.g. a possession change"""
+        for period in self.periods:
+            if period['period_id'] == period_id:
+                seconds = min(max(seconds, period['start']), period['end'])
+                return period['offset'] + seconds - period['start']
+        return 0.0
+
+    def clock_at(self, position):
+        """Period and period-relative seconds shown at a timeline position"""
+        period = self._period_at(position)
+        return period['period_id'], period['start'] + position - period['offset']
+
+    def positions_at(self, position):
+        """Interpolated ball, home and away coordinates at a timeline position.
+
+        Returns a tuple of (x, y) array pairs for the ball, home and away team.
+        Players that are not tracked at that moment, e.g. during a dropout
+        in the tracking data, are left out.
+        """
+        if len(self.period_ids) == 0:
+            empty = (np.zeros(0), np.zeros(0))
+            return empty, empty, empty
+
+        position = min(max(position, 0.0), self.duration)
+        frame = position * self.fps
+        row = min(int(frame), len(self.period_ids) - 1)
+        next_row = row + 1
+        factor = frame - row
+        if next_row >= len(self.period_ids) or self.period_ids[next_row] != self.period_ids[row]:
+            next_row, factor = row, 0.0
+
+        def lerp(xs, ys):
+            x = xs[row] + factor * (xs[next_row] - xs[row])
+            y = ys[row] + factor * (ys[next_row] - ys[row])
+            visible = ~(np.isnan(x) | np.isnan(y))
+            return x[visible], y[visible]
+
+        return (lerp(self.ball_x, self.ball_y),
+                lerp(self.home_x, self.home_y),
+                lerp(self.away_x, self.away_y))
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from queries import load_highlight_data
+from resample import resample
+from instrumentation import span
+
+# Target playback rate of the highlight screen
+HIGHLIGHT_FPS = 120
+
+
+def prepare_highlight(match_id, period_id, timestamp, target_fps=HIGHLIGHT_FPS):
+    """Load the tracking window around one possession change and resample it.
+
+    Returns a dict with the positions resampled onto a uniform `target_fps`
+    time grid (see resample.py), the number of frames and the real duration
+    of the window, or None when there is no tracking data for it.
+    """
+    df_ball, df_home, df_away = load_highlight_data(match_id, timestamp, period_id=period_id)
+
+    if df_ball is None or df_ball.empty:
+        return None
+
+    with span("interpolate", match_id=match_id, period_id=period_id, rows=len(df_ball)):
+        grid = resample({'ball': df_ball, 'home': df_home, 'away': df_away}, fps=target_fps)
+
+    total_frames = len(grid['seconds'])
+    return {
+        'grid': grid,
+        'total_frames': total_frames,
+        # Frames are 1 / target_fps apart in real time
+        'real_duration': total_frames / target_fps,
+    }
+
+
+class HighlightPrefetcher:
+    """Prepare upcoming highlights in background threads.
+
+    Highlights are identified by (period_label, possession_idx) keys in menu
+    order. While one highlight plays, the next `lookahead` highlights are
+    loaded and interpolated by worker threads into a bounded LRU cache, so
+    opening them does not wait for the database.
+    """
+
+    def __init__(self, match_id, df_possesion_first_period, df_possesion_second_period,
+                 lookahead=3, max_cached=8, workers=2):
+        self.match_id = match_id
+        self.lookahead = lookahead
+        self.max_cached = max(max_cached, lookahead + 1)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="highlight-prefetch")
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Every highlight in menu order with what is needed to load it
+        self.order = []
+        self.highlights = {}
+        for label, period_id, df in (("1st Period", 1, df_possesion_first_period),
+                                     ("2nd Period", 2, df_possesion_second_period)):
+            for idx, possession in df.iterrows():
+                key = (label, idx)
+                self.order.append(key)
+                self.highlights[key] = (period_id, possession['seconds'])
+
+    def _submit(self, key):
+        """Start preparing a highlight unless it is already cached or in flight"""
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            period_id, timestamp = self.highlights[key]
+            future = self.executor.submit(prepare_highlight, self.match_id, period_id, timestamp)
+            self.cache[key] = future
+            # Evict the least recently used highlights beyond the cache size
+            while len(self.cache) > self.max_cached:
+                _, evicted = self.cache.popitem(last=False)
+                evicted.cancel()
+            return future
+
+    def get(self, key):
+        """Prepared data for a highlight, waiting only if it is still being loaded"""
+        future = self._submit(key)
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error preparing highlight {key}: {e}")
+            with self.lock:
+                self.cache.pop(key, None)
+            return None
+
+    def prefetch_after(self, key):
+        """Schedule the highlights following `key` in menu order"""
+        if key not in self.highlights:
+            return
+        position = self.order.index(key)
+        for next_key in self.order[position + 1:position + 1 + self.lookahead]:
+            self._submit(next_key)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,267 +1,135 @@
-import psycopg2
-import dotenv
-import os
-import pandas as pd
+import sys
+from pathlib import Path
 
-# Load environment variables
-dotenv.load_dotenv()
+# The shared connection pool lives in the top-level Python/ folder
+sys.path.append(str(Path(__file__).resolve().parents[2] / "Python"))
+from connection_pool import get_manager
+from instrumentation import timed
+from tracking_schema import apply_timestamp_schema, compact_tracking, seconds_to_timestamp
+from roster import attach_team, get_roster
+from statements import run
 
-# Database connection parameters
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_USER = os.getenv("PG_USER")
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_DATABASE = os.getenv("PG_DB")
-
-# Connect to the database
+# Check out a pooled database connection, conn.close() returns it to the pool
 def get_connection():
-    return psycopg2.connect(
-        host=PG_HOST,
-        database=PG_DATABASE,
-        user=PG_USER,
-        password=PG_PASSWORD,
-        port=PG_PORT,
-        sslmode="require",
-    )
-
-# SQL queries
-# PLEASE MAKE IT CUSTOMIZABLE SOON HAL THIS IS BAD
-BALL_QUERY = """
-SELECT pt.period_id, pt.frame_id, pt.timestamp, pt.x, pt.y, pt.player_id, p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id
-WHERE pt.game_id = %s AND p.player_id = 'ball' AND pt.period_id = 1
-ORDER BY timestamp;
-"""
+    return get_manager().checkout()
 
-TEAM_QUERY = """
-SELECT DISTINCT p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id AND p.player_id != 'ball'
-WHERE pt.game_id = %s
-"""
+@timed("deserialize")
+def parse_timestamps(df, time_col='timestamp'):
+    """Parse timestamps once, on load, into numeric 'seconds' and 'match_clock' columns"""
+    return apply_timestamp_schema(df, timestamp_col=time_col)
 
-TEAM_QUERIES = """
-SELECT pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y, p.team_id
-FROM player_tracking pt
-JOIN players p ON pt.player_id = p.player_id
-JOIN teams t ON p.team_id = t.team_id
-WHERE pt.game_id = %s AND p.player_id != 'ball' AND p.team_id = %s
-ORDER BY timestamp;
-"""
-LIST_OF_ALL_MATCHES = """
-SELECT 
-    m.match_id,
-    m.home_score, 
-    m.away_score, 
-    m.home_team_id,
-    m.away_team_id,
-    CONCAT(t1.team_name, ' vs ', t2.team_name) AS matchup
-FROM matches m
-JOIN teams t1 ON m.home_team_id = t1.team_id
-JOIN teams t2 ON m.away_team_id = t2.team_id
-ORDER BY m.match_id;
-"""
-GET_SPECIFIC_MATCH = """
-SELECT 
-    m.match_id,
-    m.home_score, 
-    m.away_score, 
-    m.home_team_id,
-    m.away_team_id,
-    CONCAT(t1.team_name, ' vs ', t2.team_name) AS matchup
-FROM matches m
-JOIN teams t1 ON m.home_team_id = t1.team_id
-JOIN teams t2 ON m.away_team_id = t2.team_id
-WHERE m.match_id = '%s'
-ORDER BY m.match_id;
-"""
-POSSESSION_QUERY = """
-    WITH action_changes AS (
-        SELECT
-            a.*,
-            LAG(a.team_id) OVER (ORDER BY a.period_id, a.seconds, a.id) AS prev_team_id,
-            LEAD(a.team_id) OVER (ORDER BY a.period_id, a.seconds, a.id) AS next_team_id
-        FROM
-            spadl_actions a
-        WHERE
-            a.game_id = %s
-    ),
-    possession_markers AS (
-        SELECT
-            *,
-            CASE 
-                WHEN prev_team_id IS NULL OR team_id != prev_team_id 
-                THEN 1 
-                ELSE 0 
-            END AS is_new_possession
-        FROM
-            action_changes
-    ),
-    possession_sequences AS (
-        SELECT
-            *,
-            SUM(is_new_possession) OVER (ORDER BY period_id, seconds, id) AS possession_group
-        FROM
-            possession_markers
-    ),
-    possession_stats AS (
-        SELECT
-            possession_group,
-            team_id,
-            COUNT(*) AS action_count,
-            MAX(id) AS last_action_id
-        FROM
-            possession_sequences
-        GROUP BY
-            possession_group, team_id
-    )
-    SELECT 
-        s.id,
-        s.period_id,
-        s.seconds,
-        s.action_type,
-        s.team_id AS losing_team_id,
-        s.next_team_id AS gaining_team_id,
-        t1.team_name AS losing_team,
-        t2.team_name AS gaining_team,
-        s.start_x,
-        s.start_y,
-        s.end_x,
-        s.end_y,
-        ps.action_count
-    FROM
-        possession_sequences s
-    JOIN
-        possession_stats ps ON s.possession_group = ps.possession_group 
-                             AND s.team_id = ps.team_id
-                             AND s.id = ps.last_action_id
-    JOIN teams t1 ON s.team_id = t1.team_id
-    JOIN teams t2 ON s.next_team_id = t2.team_id
-    WHERE
-        ps.action_count >= 3
-        AND s.team_id != s.next_team_id
-        AND s.next_team_id IS NOT NULL
-    ORDER BY
-        s.period_id, s.seconds
-    """
+# The SQL lives in statements.STATEMENTS: named, parameterized and prepared
+# once per pooled connection
 
 # Function to get all available matches
 def get_all_matchups():
-    conn = get_connection()
-    matches_df = pd.read_sql_query(LIST_OF_ALL_MATCHES, conn)
-    conn.close()
+    with get_manager().connection() as conn:
+        matches_df = run(conn, "all_matches")
     return matches_df
-# Add this new function to queries.py
+
+def get_match(match_id):
+    """The score and matchup of one match"""
+    with get_manager().connection() as conn:
+        return run(conn, "match", (match_id,))
+
+def get_page_summaries(matches):
+    """Possession share, shots and xT of the matches of a menu page, from the summary tables"""
+    # Imported here, match_summaries pulls in scipy through kinematics
+    from psycopg2.errors import UndefinedTable
+    from match_summaries import get_page_summaries as page_summaries
+
+    try:
+        with get_manager().connection() as conn:
+            return page_summaries(matches, conn)
+    except UndefinedTable as e:
+        # Summary tables not materialized yet (python match_summaries.py)
+        print(f"No match summaries available: {e}")
+        return None
 def load_possession_data(match_id):
     """Load only possession change data for highlights menu"""
-    conn = get_connection()
-    df_possesion = pd.read_sql_query(POSSESSION_QUERY, conn, params=(match_id,))
+    with get_manager().connection() as conn:
+        df_possesion = run(conn, "possession_changes", (match_id,))
+    df_possesion = parse_timestamps(df_possesion, time_col='seconds')
     
     df_possesion_first_period = df_possesion[df_possesion['period_id'] == 1]
     df_possesion_second_period = df_possesion[df_possesion['period_id'] == 2]
     
-    conn.close()
     return None, None, None, df_possesion_first_period, df_possesion_second_period
 
-def load_highlight_data(match_id, timestamp, window_seconds=10):
+def load_highlight_data(match_id, timestamp, window_seconds=10, period_id=None):
     """Load data for a specific highlight window"""
-    conn = get_connection()
-    
-    # Calculate time window
-    window_start = timestamp - 3  # 3 seconds before
-    window_end = timestamp + 7    # 7 seconds after
+    with get_manager().connection() as conn:
+        return _load_highlight_data(conn, match_id, timestamp, window_seconds, period_id)
+
+# Highlights start this many seconds before the possession change
+HIGHLIGHT_LEAD_SECONDS = 3
+
+def _load_highlight_data(conn, match_id, timestamp, window_seconds, period_id):
+    # Calculate time window, e.g. 3 seconds before to 7 seconds after
+    window_start = max(timestamp - HIGHLIGHT_LEAD_SECONDS, 0.0)
+    window_end = timestamp - HIGHLIGHT_LEAD_SECONDS + window_seconds
     
     print(f"Loading highlight data for time window: {window_start} to {window_end} seconds")
     
-    # Get team IDs first
-    team_ids_df = pd.read_sql_query(TEAM_QUERY, conn, params=(match_id,))
-    team_ids = team_ids_df['team_id'].tolist()
-    
-    if len(team_ids) < 2:
-        print("Not enough teams found for this match")
-        conn.close()
-        return None, None, None  # No data available for this match
-    
-    # Get period ID from timestamp
-    period_id = 1
-    if timestamp > 45*60:  # If timestamp is after 45 minutes, it's second period
-        period_id = 2
-    
-    # Modified queries that filter by using pattern matching on the timestamp string
-    # instead of EXTRACT() function which is causing problems
-    ball_query_highlight = """
-    SELECT pt.period_id, pt.frame_id, pt.timestamp, pt.x, pt.y, pt.player_id, p.team_id
-    FROM player_tracking pt
-    JOIN players p ON pt.player_id = p.player_id
-    JOIN teams t ON p.team_id = t.team_id
-    WHERE pt.game_id = %s 
-      AND p.player_id = 'ball'
-      AND pt.period_id = %s
-    ORDER BY timestamp;
-    """
-    
-    team_query_highlight = """
-    SELECT pt.frame_id, pt.timestamp, pt.player_id, pt.x, pt.y, p.team_id
-    FROM player_tracking pt
-    JOIN players p ON pt.player_id = p.player_id
-    JOIN teams t ON p.team_id = t.team_id
-    WHERE pt.game_id = %s 
-      AND p.player_id != 'ball' 
-      AND p.team_id = %s
-      AND pt.period_id = %s
-    ORDER BY timestamp;
-    """
+    # Get period ID from timestamp when the caller does not know it
+    if period_id is None:
+        period_id = 1
+        if timestamp > 45*60:  # If timestamp is after 45 minutes, it's second period
+            period_id = 2
     
     try:
-        # Execute queries without time filtering
-        df_ball = pd.read_sql_query(ball_query_highlight, conn, params=(match_id, period_id))
-        df_home = pd.read_sql_query(team_query_highlight, conn, params=(match_id, team_ids[0], period_id))
-        df_away = pd.read_sql_query(team_query_highlight, conn, params=(match_id, team_ids[1], period_id))
-        
-        # Convert timestamps to seconds
-        df_home['timestamp'] = pd.to_timedelta(df_home['timestamp']).dt.total_seconds().astype(float)
-        df_away['timestamp'] = pd.to_timedelta(df_away['timestamp']).dt.total_seconds().astype(float)
-        df_ball['timestamp'] = pd.to_timedelta(df_ball['timestamp']).dt.total_seconds().astype(float)
-        
-        # Now filter in Python instead of SQL
-        df_ball = df_ball[(df_ball['timestamp'] >= window_start) & (df_ball['timestamp'] <= window_end)]
-        df_home = df_home[(df_home['timestamp'] >= window_start) & (df_home['timestamp'] <= window_end)]
-        df_away = df_away[(df_away['timestamp'] >= window_start) & (df_away['timestamp'] <= window_end)]
+        # Only the rows of the window come from the database
+        df_ball, df_home, df_away = _load_tracking(conn, match_id, period_id, (window_start, window_end))
+        if df_ball is None:
+            print("Not enough teams found for this match")
+            return None, None, None  # No data available for this match
         
         print(f"Data retrieved: {len(df_ball)} ball records, {len(df_home)} home team records, {len(df_away)} away team records")
         
     except Exception as e:
         print(f"Error loading highlight data: {e}")
-        conn.close()
         return None, None, None
     
-    conn.close()
     return df_ball, df_home, df_away
-# Load data from the database
-def load_data(match_id):
-    conn = get_connection()
-    # Add the tuple parentheses around match_id - this is what's missing
-    team_ids_df = pd.read_sql_query(TEAM_QUERY, conn, params=(match_id,))
-    team_ids = team_ids_df['team_id'].tolist()
+
+def _load_tracking(conn, match_id, period_id=None, window=None):
+    """Ball, home and away tracking rows of a match, one period or a (start, end) seconds window of it, split client-side"""
+    if window is not None:
+        start, end = (seconds_to_timestamp(t) for t in window)
+        df = run(conn, "tracking_window_period", (match_id, start, end, period_id))
+    elif period_id is None:
+        df = run(conn, "tracking_by_frame", (match_id,))
+    else:
+        df = run(conn, "tracking_period_by_frame", (match_id, period_id))
+    
+    # Convert timestamps to seconds, once, keep the rows compact and look up the teams
+    df = attach_team(compact_tracking(parse_timestamps(df)), get_roster(conn))
+    
+    is_ball = df['player_id'] == 'ball'
+    teams = run(conn, "match_teams", (match_id,))
+    if not teams.empty:
+        team_ids = [teams['home_team_id'].iloc[0], teams['away_team_id'].iloc[0]]
+    else:
+        team_ids = list(df.loc[~is_ball, 'team_id'].dropna().unique())
     if len(team_ids) < 2:
-        conn.close()
-        return None, None, None  # No data available for this match
+        return None, None, None
     
-
-    df_ball = pd.read_sql_query(BALL_QUERY, conn, params=(match_id,))
-    df_home = pd.read_sql_query(TEAM_QUERIES, conn, params=(match_id, team_ids[0],))
-    df_away = pd.read_sql_query(TEAM_QUERIES, conn, params=(match_id, team_ids[1],))
+    df_ball = df[is_ball].reset_index(drop=True)
+    df_home = df[~is_ball & (df['team_id'] == team_ids[0])].reset_index(drop=True)
+    df_away = df[~is_ball & (df['team_id'] == team_ids[1])].reset_index(drop=True)
+    return df_ball, df_home, df_away
+# Load data from the database
+def load_data(match_id):
+    with get_manager().connection() as conn:
+        df_ball, df_home, df_away = _load_tracking(conn, match_id)
+        if df_ball is None:
+            return None, None, None, None, None  # No data available for this match
+        
+        df_possesion = run(conn, "possession_changes", (match_id,))
     
-    df_possesion = pd.read_sql_query(POSSESSION_QUERY, conn, params=(match_id,))
+    df_possesion = parse_timestamps(df_possesion, time_col='seconds')
     
     df_possesion_first_period = df_possesion[df_possesion['period_id'] == 1]
     df_possesion_second_period = df_possesion[df_possesion['period_id'] == 2]
-    df_home['timestamp'] = pd.to_timedelta(df_home['timestamp']).dt.total_seconds().astype(float)
-    df_away['timestamp'] = pd.to_timedelta(df_away['timestamp']).dt.total_seconds().astype(float)
-    df_ball['timestamp'] = pd.to_timedelta(df_ball['timestamp']).dt.total_seconds().astype(float)
 
-    conn.close()
-    return df_ball, df_home, df_away,df_possesion_first_period,df_possesion_second_period
\ No newline at end of file
+    return df_ball, df_home, df_away,df_possesion_first_period,df_possesion_second_period